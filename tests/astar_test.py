@@ -63,6 +63,60 @@ class TestCommon(unittest.TestCase):
         shortest_path = astar.PathFinder().find(test_map, [0, 0], [19, 19])
         self.assertTrue(_equal(path_data, numpy.array(shortest_path)))
 
+    def test_max_iterations(self):
+        test_map = numpy.zeros((30, 30))
+        test_map[15, :] = 1000.0
+        test_map[15, 28] = 0.0
+        self.assertEqual([], astar.PathFinder().find(test_map, [0, 0], [29, 29], max_iterations=10))
+        self.assertEqual([29, 29], astar.PathFinder().find(test_map, [0, 0], [29, 29])[-1])
+        self.assertEqual([], astar.PathFinder().find(test_map, [0, 0], [30, 29]))  # outside of the map
+
+    def test_pathfinding_context(self):
+        test_map = numpy.ones((3, 5))
+        test_map[1, 1:4] = 9.0
+        context = astar.PathfindingContext(test_map)
+        expected = [[0, 0], [1, 0], [2, 0], [3, 0], [4, 0], [4, 1]]
+        self.assertEqual(expected, context.find([0, 1], [4, 1]))
+        self.assertEqual(astar.PathFinder().find(test_map, [0, 1], [4, 1]), context.find([0, 1], [4, 1]))
+        self.assertEqual([expected, [[4, 2]]], context.find_many([([0, 1], [4, 1]), ([4, 1], [4, 2])]))
+
+        context.set_cost(2, 0, 20.0)  # the path now goes around the other side
+        self.assertEqual([[0, 2], [1, 2], [2, 2], [3, 2], [4, 2], [4, 1]], context.find([0, 1], [4, 1]))
+
+        wrapping = astar.PathfindingContext(test_map, wrap=True)
+        self.assertEqual([[4, 1]], wrapping.find([0, 1], [4, 1]))
+        diagonal = astar.PathfindingContext(test_map, diagonal=True)
+        self.assertEqual([[1, 0], [2, 0], [3, 0], [4, 1], [4, 2]], diagonal.find([0, 0], [4, 2]))
+
+    def test_cost_field(self):
+        test_map = numpy.ones((3, 5))
+        test_map[1, 1:4] = 9.0
+        context = astar.PathfindingContext(test_map)
+        costs, toward = context.cost_field([4, 1])
+        expected = [[6, 5, 4, 3, 2], [7, 14, 13, 10, 1], [6, 5, 4, 3, 2]]
+        self.assertTrue(numpy.array_equal(expected, costs))
+        self.assertEqual(-1, toward[1, 4])
+        self.assertEqual([[3, 0], [4, 0], [4, 1]], context.path_from_field(toward, [2, 0]))
+        self.assertEqual(
+            [[[0, 0], [1, 0], [2, 0], [3, 0], [4, 0], [4, 1]], []], context.paths_to([4, 1], [[0, 1], [4, 1]])
+        )
+
+        costs, _ = astar.PathfindingContext(test_map, wrap=True).cost_field([0, 0])
+        self.assertEqual(2.0, costs[0, 4])
+
+    def test_noisy_map(self):
+        """Long paths over a noisy map cost as much as the cheapest ones"""
+        rng = numpy.random.RandomState(0)
+        for size in (64, 128, 256):
+            test_map = rng.uniform(1.0, 3.0, (size, size))
+            path = astar.PathFinder().find(test_map, [0, 0], [size - 1, size - 1])
+            self.assertEqual([size - 1, size - 1], path[-1])
+            steps = numpy.abs(numpy.diff(numpy.array([[0, 0]] + path), axis=0)).sum(axis=1)
+            self.assertTrue((steps == 1).all())
+
+            costs, _ = astar.PathfindingContext(test_map).cost_field([size - 1, size - 1])
+            self.assertAlmostEqual(costs[0, 0] - test_map[0, 0], sum(test_map[y, x] for x, y in path))
+
 
 if __name__ == "__main__":
     unittest.main()
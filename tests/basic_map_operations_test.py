@@ -1,6 +1,6 @@
 import unittest
 
-from worldengine.basic_map_operations import distance, index_of_nearest
+from worldengine.basic_map_operations import SpatialIndex, distance, index_of_nearest
 
 
 class TestBasicMapOperations(unittest.TestCase):
@@ -20,6 +20,38 @@ class TestBasicMapOperations(unittest.TestCase):
         self.assertEqual(3, index_of_nearest((-100, -100), [(0, 0), (10, 10), (7, 7), (-5, -5), (-2, 7)]))
         self.assertEqual(3, index_of_nearest((-100.0, -100.0), [(0, 0), (10, 10), (7, 7), (-5, -5), (-2, 7)]))
 
+        # the first of the nearest points wins
+        self.assertEqual(1, index_of_nearest((0, 0), [(5, 5), (3, 4), (4, 3), (-3, 4)]))
+        self.assertEqual(0, index_of_nearest((0, 0), [(0, 0), (0, 0)], lambda a, b: 1.0))
+
+        # an index built once answers the same
+        hot_points = [(0, 0), (10, 10), (7, 7), (-5, -5), (-2, 7), (3, 4), (4, 3)]
+        index = SpatialIndex.of_points(hot_points)
+        for p in [(0, 0), (-4, -4), (-100.0, -100.0), (5, 5), (3, 6), (20, -3)]:
+            self.assertEqual(index_of_nearest(p, hot_points), index_of_nearest(p, index))
+        self.assertTrue(index_of_nearest((0, 0), SpatialIndex.of_points([])) is None)
+        self.assertRaises(ValueError, index_of_nearest, (0, 0), index, lambda a, b: 1.0)
+
+    def test_spatial_index(self):
+        index = SpatialIndex(9)
+        self.assertEqual(0, len(index))
+        self.assertFalse(index.any_within((0, 0), 9))
+        self.assertTrue(index.nearest((0, 0)) is None)
+
+        for i, p in enumerate([(0, 0), (9, 0), (10, 10), (-30, 4), (100, 100)]):
+            index.insert(p, i)
+        self.assertEqual(5, len(index))
+
+        # the radius is inclusive
+        self.assertTrue(index.any_within((0, 9), 9))
+        self.assertFalse(index.any_within((-20, -20), 9))
+        self.assertEqual([0, 1], sorted(value for _, _, value in index.within((2, 2), 9)))
+        self.assertEqual([], index.within((50, 50), 20))
+
+        self.assertEqual(2, index.nearest((12, 12)))
+        self.assertEqual(3, index.nearest((-1000, 0)))
+        self.assertEqual(4, index.nearest((1000, 1000)))
+
 
 if __name__ == "__main__":
     unittest.main()
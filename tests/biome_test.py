@@ -1,7 +1,10 @@
 import os
 import unittest
 
+import numpy
+
 from worldengine.biome import (
+    BIOME_NAMES,
     Biome,
     CoolTemperateMoistForest,
     Ocean,
@@ -10,7 +13,7 @@ from worldengine.biome import (
     biome_index_to_name,
     biome_name_to_index,
 )
-from worldengine.model.world import World
+from worldengine.model.world import GenerationParameters, Size, World
 from worldengine.simulations.biome import BiomeSimulation
 
 
@@ -125,6 +128,47 @@ class TestBiome(unittest.TestCase):
         self.assertEqual("warm temperate thorn scrub", biome_index_to_name(39))
         self.assertEqual("warm temperate wet forest", biome_index_to_name(40))
 
+    def test_biome_simulation(self):
+        w = World("biomes", Size(4, 2), 1, GenerationParameters(0, 1.0, 0))
+        w.ocean = numpy.array([[False, False, False, False], [False, False, False, True]])
+        bands = ["polar", "alpine", "boreal", "cool", "warm", "subtropical", "tropical"]
+        w.temperature = (
+            numpy.array([[0.5, 1.0, 3.0, 6.5], [6.0, 7.0, 2.0, 0.0]]),
+            [(band, float(i + 1) if i < 6 else None) for i, band in enumerate(bands)],
+        )
+        quantiles = {q: float(i + 1) for i, q in enumerate(["87", "75", "62", "50", "37", "25", "12"])}
+        w.humidity = (numpy.array([[0.0, 7.0, 3.5, 9.0], [5.0, 3.0, 1.0, 0.0]]), quantiles)
+
+        cm, biome_cm = BiomeSimulation().execute(w, 1)
+        expected = [
+            ["polar desert", "subpolar rain tundra", "cool temperate moist forest", "tropical rain forest"],
+            ["tropical moist forest", "tropical very dry forest", "boreal dry scrub", "ocean"],
+        ]
+        self.assertTrue(numpy.array_equal(numpy.array(expected, dtype=object), w.biome))
+        self.assertEqual(numpy.uint8, w.layers["biome"].data.dtype)
+        self.assertEqual(BIOME_NAMES, w.layers["biome"].names)
+        self.assertEqual("tropical moist forest", w.biome_at((0, 1)).name())
+        self.assertEqual({name: 1 for row in expected for name in row}, biome_cm)
+
+        # the biomes can be set by name or by index
+        w.biome = numpy.array(expected, dtype=object)
+        self.assertEqual(biome_name_to_index("ocean"), w.layers["biome"].data[1, 3])
+        self.assertRaises(Exception, setattr, w, "biome", numpy.full((2, 4), len(BIOME_NAMES)))
+
+    def test_biome_simulation_unsorted_thresholds(self):
+        # boreal and arid start below the bands before them: the first band wins
+        w = World("biomes", Size(3, 1), 1, GenerationParameters(0, 1.0, 0))
+        w.ocean = numpy.array([[False, False, True]])
+        thresholds = [("polar", 1.0), ("alpine", 3.0), ("boreal", 2.0), ("cool", 4.0)]
+        thresholds += [("warm", 5.0), ("subtropical", 6.0), ("tropical", None)]
+        w.temperature = (numpy.array([[2.5, 3.5, 0.0]]), thresholds)
+        quantiles = {"87": 1.0, "75": 3.0, "62": 2.0, "50": 4.0, "37": 5.0, "25": 6.0, "12": 7.0}
+        w.humidity = (numpy.array([[2.5, 3.5, 0.0]]), quantiles)
+
+        BiomeSimulation().execute(w, 1)
+        expected = [["subpolar moist tundra", "cool temperate moist forest", "ocean"]]
+        self.assertTrue(numpy.array_equal(numpy.array(expected, dtype=object), w.biome))
+
     def test_locate_biomes(self):
         w = World.open_protobuf("%s/seed_28070.world" % self.tests_data_dir)
         # TODO: do something to the result
@@ -82,6 +82,7 @@ class TestCLI(TestBase):
             "-v",
             "--gs",
             "--scatter",
+            "--routes",
             "--temps",
             ".126/.235/.406/.561/.634/.876",
             "--humidity",
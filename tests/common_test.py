@@ -2,7 +2,17 @@ import unittest
 
 import numpy
 
-from worldengine.common import Counter, _equal, anti_alias, get_verbose, set_verbose
+from worldengine.common import (
+    Counter,
+    _equal,
+    anti_alias,
+    distance_transform,
+    flood_fill,
+    get_verbose,
+    label_regions,
+    neighbour_table,
+    set_verbose,
+)
 
 
 class TestCommon(unittest.TestCase):
@@ -37,6 +47,120 @@ class TestCommon(unittest.TestCase):
         antialiased = anti_alias(original, 10)
         self.assertAlmostEqual(0.8, antialiased[0][0])
 
+    def test_antialias_fft(self):
+        original = numpy.random.RandomState(0).uniform(-1.0, 1.0, (9, 14))
+        for steps in (0, 1, 10):
+            expected = anti_alias(original, steps)
+            antialiased = anti_alias(original, steps, method="fft")
+            self.assertTrue(numpy.allclose(expected, antialiased, rtol=0.0, atol=1e-12))
+        self.assertRaises(ValueError, anti_alias, original, 1, method="unknown")
+
+    def test_antialias_out(self):
+        original = numpy.array([[0.5, 0.12, 0.7, 0.15, 0.0], [0.0, 0.12, 0.7, 0.7, 8.0], [0.2, 0.12, 0.7, 0.7, 4.0]])
+        out = numpy.zeros(original.shape)
+        antialiased = anti_alias(original, 1, out=out)
+        self.assertTrue(antialiased is out)
+        self.assertAlmostEqual(1.2781818181818183, out[0][0])
+
+        # the map itself can be used as output buffer
+        expected = anti_alias(original, 3)
+        anti_alias(original, 3, out=original)
+        self.assertTrue(numpy.array_equal(expected, original))
+
+        self.assertRaises(Exception, anti_alias, original, 1, out=numpy.zeros((5, 3)))
+
+    def test_label_regions(self):
+        mask = numpy.array(
+            [
+                [1, 1, 0, 0, 1],
+                [0, 0, 1, 0, 1],
+                [0, 0, 0, 0, 0],
+                [1, 0, 0, 1, 1],
+            ],
+            dtype=bool,
+        )
+        labels, count = label_regions(mask)
+        self.assertEqual(4, count)
+        expected = [[1, 1, 0, 0, 2], [0, 0, 1, 0, 2], [0, 0, 0, 0, 0], [3, 0, 0, 4, 4]]
+        self.assertTrue(numpy.array_equal(expected, labels))
+
+        labels, count = label_regions(mask, diagonal=False)
+        self.assertEqual(5, count)
+        self.assertEqual(labels[0, 0], labels[0, 1])
+        self.assertNotEqual(labels[0, 1], labels[1, 2])
+
+        # wrapping joins the west border to the east border and the top to the bottom
+        labels, count = label_regions(mask, wrap=True)
+        self.assertEqual(1, count)
+        labels, count = label_regions(mask, diagonal=False, wrap=True)
+        self.assertEqual(2, count)
+        self.assertEqual(labels[0, 0], labels[3, 0])
+        self.assertEqual(labels[0, 4], labels[0, 0])
+
+        labels, count = label_regions(numpy.zeros((3, 3), dtype=bool))
+        self.assertEqual(0, count)
+        self.assertFalse(labels.any())
+
+    def test_flood_fill(self):
+        mask = numpy.array([[1, 0, 1, 1], [1, 0, 0, 0], [0, 0, 1, 1]], dtype=bool)
+        seeds = numpy.zeros(mask.shape, dtype=bool)
+        seeds[1, 0] = True
+        seeds[1, 2] = True  # not in the mask, ignored
+        expected = [[1, 0, 0, 0], [1, 0, 0, 0], [0, 0, 0, 0]]
+        self.assertTrue(numpy.array_equal(expected, flood_fill(mask, seeds)))
+
+    def test_distance_transform(self):
+        mask = numpy.zeros((5, 7), dtype=bool)
+        mask[1, 1] = True
+        distance = distance_transform(mask)
+        self.assertEqual(0, distance[1, 1])
+        self.assertEqual(1, distance[0, 0])
+        self.assertEqual(3, distance[4, 4])
+        self.assertEqual(5, distance[2, 6])
+
+        distance = distance_transform(mask, diagonal=False)
+        self.assertEqual(2, distance[0, 0])
+        self.assertEqual(6, distance[4, 4])
+
+        distance = distance_transform(mask, max_radius=2)
+        self.assertEqual(2, distance[3, 3])
+        self.assertEqual(-1, distance[4, 4])
+
+        distance = distance_transform(mask, wrap=True)
+        self.assertEqual(2, distance[2, 6])
+        self.assertEqual(3, distance[4, 5])
+
+        self.assertTrue((distance_transform(numpy.zeros((2, 2), dtype=bool)) == -1).all())
+
+        # straight steps weigh 3, diagonal ones 4, rounded to whole steps
+        distance = distance_transform(mask, metric="chamfer")
+        self.assertEqual(0, distance[1, 1])
+        self.assertEqual(1, distance[0, 0])
+        self.assertEqual(4, distance[4, 4])
+        self.assertEqual(5, distance[2, 6])
+        self.assertEqual(2, distance[3, 2])
+        distance = distance_transform(mask, max_radius=3, metric="chamfer")
+        self.assertEqual(3, distance[4, 2])
+        self.assertEqual(-1, distance[4, 4])
+        self.assertTrue(
+            numpy.array_equal(distance_transform(mask, metric="cityblock"), distance_transform(mask, diagonal=False))
+        )
+        self.assertRaises(ValueError, distance_transform, mask, metric="euclidean")
+
+    def test_neighbour_table(self):
+        offsets, indices = neighbour_table(4, 3, diagonal=False)
+        self.assertEqual(numpy.int32, indices.dtype)
+        self.assertEqual([4, 1], indices[offsets[0] : offsets[1]].tolist())
+        self.assertEqual([4, 1, 9, 6], indices[offsets[5] : offsets[6]].tolist())
+
+        offsets, indices = neighbour_table(4, 3, wrap=True)
+        self.assertTrue((numpy.diff(offsets) == 8).all())
+        self.assertEqual([11, 3, 7, 8, 4, 9, 1, 5], indices[offsets[0] : offsets[1]].tolist())
+
+        # on a map two cells wide the west and the east neighbour are the same
+        offsets, indices = neighbour_table(2, 3, diagonal=False, wrap=True)
+        self.assertEqual([1, 4, 2], indices[offsets[0] : offsets[1]].tolist())
+
     def test_dictionary_equality(self):
         a = {}
         b = {}
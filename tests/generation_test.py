@@ -6,7 +6,7 @@ import pytest
 
 from tests.draw_test import TestBase
 from worldengine.common import anti_alias
-from worldengine.generation import sea_depth
+from worldengine.generation import fill_ocean, sea_depth
 from worldengine.model.world import GenerationParameters, Size, World
 from worldengine.plates import Step, center_land, world_gen
 
@@ -40,6 +40,25 @@ class TestGeneration(TestBase):
         el_after = TestGeneration._mean_elevation_at_borders(w)
         self.assertTrue(el_after <= el_before)
 
+    def test_fill_ocean(self):
+        elevation = numpy.array(
+            [
+                [0.5, 2.0, 2.0, 2.0, 2.0],
+                [2.0, 0.5, 2.0, 0.5, 2.0],
+                [2.0, 2.0, 2.0, 2.0, 2.0],
+                [2.0, 2.0, 2.0, 2.0, 1.0],
+            ]
+        )
+        ocean = fill_ocean(elevation, 1.0)
+        # the lake at (3, 1) is not connected to the border
+        expected = [
+            [True, False, False, False, False],
+            [False, True, False, False, False],
+            [False, False, False, False, False],
+            [False, False, False, False, True],
+        ]
+        self.assertTrue(numpy.array_equal(expected, ocean))
+
     def test_sea_depth(self):
         ocean_level = 1.0
         extent = 11
@@ -0,0 +1,102 @@
+import unittest
+
+import numpy
+from noise import snoise2
+
+from worldengine.noise_field import (
+    get_compatibility_mode,
+    seamless_snoise2_field,
+    set_compatibility_mode,
+    snoise2_field,
+)
+
+
+class TestNoiseField(unittest.TestCase):
+    def _assert_same_as_snoise2(self, xs, ys, octaves, base, field):
+        for r, y in enumerate(ys):
+            for c, x in enumerate(xs):
+                expected = snoise2(x, y, octaves, base=base)
+                # compare the bits, not just the values
+                self.assertEqual(
+                    numpy.float64(expected).tobytes(), field[r, c].tobytes(), "Cell %i, %i differs" % (c, r)
+                )
+
+    def test_field_is_bit_identical_to_snoise2(self):
+        rng = numpy.random.RandomState(0)
+        for octaves, base, scale in ((8, 0, 1.0), (6, 4095, 50.0), (1, 17, 3000.0)):
+            xs = rng.uniform(-scale, scale, 23)
+            ys = rng.uniform(-scale, scale, 17)
+            field = snoise2_field(xs, ys, octaves, base=base)
+            self.assertEqual((17, 23), field.shape)
+            self._assert_same_as_snoise2(xs, ys, octaves, base, field)
+
+    def test_map_sized_field(self):
+        # coordinates as used by the generation steps, spanning several row-blocks
+        octaves = 8
+        freq = 16.0 * octaves
+        xs = numpy.arange(3000) / freq * 2
+        ys = numpy.arange(40) / freq * 2
+        field = snoise2_field(xs, ys, octaves, base=1234)
+        compatible = snoise2_field(xs, ys, octaves, base=1234, compatible=True)
+        self.assertTrue(numpy.array_equal(compatible.view(numpy.int64), field.view(numpy.int64)))
+
+    def test_out(self):
+        xs = numpy.arange(5) / 10.0
+        ys = numpy.arange(3) / 10.0
+        out = numpy.zeros((3, 5))
+        field = snoise2_field(xs, ys, 4, base=3, out=out)
+        self.assertTrue(field is out)
+        self._assert_same_as_snoise2(xs, ys, 4, 3, out)
+
+        self.assertRaises(Exception, snoise2_field, xs, ys, 4, out=numpy.zeros((5, 3)))
+        self.assertRaises(ValueError, snoise2_field, xs, ys, 0)
+
+    def test_get_and_set_compatibility_mode(self):
+        self.assertEqual(False, get_compatibility_mode(), "By default the compatibility mode should be off")
+        try:
+            set_compatibility_mode(True)
+            self.assertEqual(True, get_compatibility_mode())
+            xs = numpy.arange(4) / 7.0
+            field = snoise2_field(xs, xs, 2, base=9)
+            self._assert_same_as_snoise2(xs, xs, 2, 9, field)
+        finally:
+            set_compatibility_mode(False)
+        self.assertEqual(False, get_compatibility_mode())
+
+    @staticmethod
+    def _legacy_seamless(width, height, octaves, n_scale, freq, base, inclusive):
+        # the per-cell loop the temperature and precipitation simulations used to run
+        border = width / 4
+        field = numpy.zeros((height, width))
+        for y in range(height):
+            for x in range(width):
+                n = snoise2((x * n_scale) / freq, (y * n_scale) / freq, octaves, base=base)
+                if (x <= border) if inclusive else (x < border):
+                    n = (snoise2((x * n_scale) / freq, (y * n_scale) / freq, octaves, base=base) * x / border) + (
+                        snoise2(((x * n_scale) + width) / freq, (y * n_scale) / freq, octaves, base=base)
+                        * (border - x)
+                        / border
+                    )
+                field[y, x] = n
+        return field
+
+    def test_seamless_field_matches_legacy_loop(self):
+        cases = (
+            (32, 16, 6, 384.0, True),
+            (30, 20, 6, 384.0, False),
+            (37, 11, 6, 384.0, True),
+            (37, 11, 6, 384.0, False),
+        )
+        # the settings of the temperature simulation
+        cases += ((64, 32, 8, 128.0, True),)
+        for width, height, octaves, freq, inclusive in cases:
+            n_scale = 1024 / float(height)
+            expected = self._legacy_seamless(width, height, octaves, n_scale, freq, 123, inclusive)
+            field = seamless_snoise2_field(
+                width, height, octaves, n_scale=n_scale, freq=freq, base=123, inclusive=inclusive
+            )
+            self.assertTrue(numpy.array_equal(expected.view(numpy.int64), field.view(numpy.int64)))
+
+
+if __name__ == "__main__":
+    unittest.main()
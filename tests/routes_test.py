@@ -0,0 +1,80 @@
+import os
+import tempfile
+import unittest
+
+import numpy
+
+from worldengine.astar import PathfindingContext
+from worldengine.routes import CONTEXT_CACHE_SIZE, RouteIndex
+
+
+class TestRoutes(unittest.TestCase):
+    def setUp(self):
+        rng = numpy.random.RandomState(0)
+        self.costs = rng.uniform(0.5, 2.0, (24, 30))
+        self.ocean = numpy.zeros(self.costs.shape, dtype=bool)
+        self.ocean[4:20, 10] = True  # a strait with a single crossing ...
+        self.ocean[:, 20] = True  # ... and a coast that cannot be crossed
+
+    def _assert_route(self, source, destination, path):
+        self.assertEqual(destination, path[-1])
+        steps = numpy.abs(numpy.diff(numpy.array([source] + path), axis=0)).sum(axis=1)
+        self.assertTrue((steps == 1).all())
+        self.assertFalse(any(self.ocean[y, x] for x, y in path))
+
+    def test_find(self):
+        index = RouteIndex(self.costs, self.ocean, cluster_size=8)
+        path = index.find([0, 12], [19, 12])
+        self._assert_route([0, 12], [19, 12], path)
+        cost = sum(self.costs[y, x] for x, y in path)
+        self.assertAlmostEqual(cost, index.cost([0, 12], [19, 12]))
+
+        # never cheaper than the best route over the whole map
+        costs, _ = PathfindingContext(self.costs, blocked=self.ocean).cost_field([19, 12])
+        self.assertTrue(cost >= costs[12, 0] - self.costs[12, 0] - 1e-9)
+
+        # the last pass never makes the route more expensive
+        unsmoothed = index.find([0, 12], [19, 12], smooth=False)
+        self._assert_route([0, 12], [19, 12], unsmoothed)
+        self.assertAlmostEqual(
+            sum(self.costs[y, x] for x, y in unsmoothed), index.cost([0, 12], [19, 12], smooth=False)
+        )
+        self.assertTrue(cost <= index.cost([0, 12], [19, 12], smooth=False) + 1e-9)
+
+        waypoints = index.find([0, 12], [19, 12], refine=False)
+        self.assertEqual([19, 12], waypoints[-1])
+        self.assertTrue(all(waypoint in path for waypoint in waypoints))
+
+        # within a single cluster
+        self._assert_route([1, 1], [6, 5], index.find([1, 1], [6, 5]))
+
+    def test_contexts(self):
+        # no context is kept once the index is built, a few after queries
+        index = RouteIndex(self.costs, self.ocean, cluster_size=2)
+        self.assertEqual(0, len(index._contexts))
+        index.find([0, 0], [19, 23])
+        self.assertEqual(CONTEXT_CACHE_SIZE, len(index._contexts))
+
+    def test_unreachable(self):
+        index = RouteIndex(self.costs, self.ocean, cluster_size=8)
+        self.assertEqual([], index.find([0, 12], [25, 12]))
+        self.assertEqual(None, index.cost([0, 12], [25, 12]))
+        self.assertEqual([], index.find([0, 12], [20, 12]))  # in the ocean
+        self.assertEqual([], index.find([0, 12], [0, 12]))
+        self.assertEqual(0.0, index.cost([0, 12], [0, 12]))
+
+    def test_save_and_load(self):
+        index = RouteIndex(self.costs, self.ocean, cluster_size=8)
+        filename = os.path.join(tempfile.mkdtemp(), "test.routes")
+        index.save(filename)
+        loaded = RouteIndex.load(filename, self.costs, self.ocean)
+        self.assertEqual(index.nodes, loaded.nodes)
+        self.assertEqual(index.edges, loaded.edges)
+        self.assertEqual(index.find([0, 0], [19, 23]), loaded.find([0, 0], [19, 23]))
+
+        self.assertRaises(Exception, RouteIndex.load, filename, self.costs + 1.0, self.ocean)
+        self.assertRaises(Exception, RouteIndex.load, filename, self.costs[1:], self.ocean[1:])
+
+
+if __name__ == "__main__":
+    unittest.main()
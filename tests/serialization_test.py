@@ -1,13 +1,17 @@
 import os
+import struct
 import sys
 import tempfile
 import unittest
 
 import pytest
 
+from worldengine.cli.main import load_world
 from worldengine.common import _equal
+from worldengine.generation import distance_to_coast
 from worldengine.hdf5_serialization import load_world_to_hdf5, save_world_to_hdf5
 from worldengine.model.world import World
+from worldengine.npy_serialization import load_world_from_npy, save_world_to_npy
 from worldengine.plates import Step, world_gen
 
 
@@ -30,6 +34,38 @@ class TestSerialization(unittest.TestCase):
         self.assertEqual(sorted(dir(w)), sorted(dir(unserialized)))
         self.assertEqual(w, unserialized)
 
+    @pytest.mark.skipif(sys.platform == "win32", reason="PyPlatec has known issues on Windows")
+    def test_protobuf_format_versions(self):
+        w = world_gen("Dummy", 32, 16, 1, step=Step.get_by_name("full"))
+        packed = w.protobuf_serialize(format_version=2)
+        rows = w.protobuf_serialize()
+        self.assertEqual(rows, w.protobuf_serialize(format_version=1))
+        self.assertLess(len(packed), len(rows))
+        from_packed = World.protobuf_unserialize(packed)
+        from_rows = World.protobuf_unserialize(rows)
+        self.assertEqual(w, from_packed)
+        self.assertEqual(w, from_rows)
+        for layer in w.layers.keys():
+            self.assertEqual(w.layers[layer].data.dtype, from_packed.layers[layer].data.dtype, "Comparing %s" % layer)
+        self.assertRaises(ValueError, w.protobuf_serialize, 3)
+
+    @pytest.mark.skipif(sys.platform == "win32", reason="PyPlatec has known issues on Windows")
+    def test_protobuf_lazy_unserialize(self):
+        w = world_gen("Dummy", 32, 16, 1, step=Step.get_by_name("full"))
+        for format_version in (1, 2):
+            lazy = World.protobuf_unserialize(w.protobuf_serialize(format_version), lazy=True)
+            self.assertEqual(w.name, lazy.name)
+            self.assertEqual((w.width, w.height, w.seed), (lazy.width, lazy.height, lazy.seed))
+            self.assertEqual(len(w.layers), len(lazy.layers))
+            self.assertTrue(lazy.has_biome())
+            self.assertEqual(sorted(w.layers.keys()), sorted(lazy.layers.pending()))
+
+            self.assertEqual(w.layers["temperature"], lazy.layers["temperature"])
+            self.assertNotIn("temperature", lazy.layers.pending())
+            self.assertEqual(w.biome_at((3, 4)).name(), lazy.biome_at((3, 4)).name())
+            self.assertEqual(w, lazy)
+            self.assertEqual([], lazy.layers.pending())
+
     @pytest.mark.skipif(sys.platform == "win32", reason="PyPlatec has known issues on Windows")
     def test_hdf5_serialize_unserialize(self):
         filename = None
@@ -54,6 +90,61 @@ class TestSerialization(unittest.TestCase):
             if filename:
                 os.remove(filename)
 
+    @pytest.mark.skipif(sys.platform == "win32", reason="PyPlatec has known issues on Windows")
+    def test_npy_serialize_unserialize(self):
+        w = world_gen("Dummy", 32, 16, 1, step=Step.get_by_name("full"))
+        w.distance_to_coast = distance_to_coast(w)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for path, archive in (
+                (os.path.join(tmp_dir, "layers"), False),
+                (os.path.join(tmp_dir, "Dummy.world"), True),
+            ):
+                save_world_to_npy(w, path, archive=archive)
+                unserialized = load_world_from_npy(path)
+                self.assertEqual(set(w.layers.keys()), set(unserialized.layers.keys()))
+                for layer in w.layers.keys():
+                    self.assertEqual(w.layers[layer], unserialized.layers[layer], "Comparing %s" % layer)
+                    self.assertEqual(w.layers[layer].data.dtype, unserialized.layers[layer].data.dtype)
+                self.assertEqual(w, unserialized)
+                self.assertFalse(unserialized.elevation.flags.writeable)
+                del unserialized
+
+    @pytest.mark.skipif(sys.platform == "win32", reason="PyPlatec has known issues on Windows")
+    def test_load_world(self):
+        w = world_gen("Dummy", 32, 16, 1, step=Step.get_by_name("full"))
+        # the end of central directory signature of a zip file, in a protobuf world
+        w.layers["elevation"].data[15, 31] = struct.unpack("<d", b"PK\x05\x06\x00\x00\x00\x00")[0]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for format_version in (1, 2):
+                filename = os.path.join(tmp_dir, "Dummy_%i.world" % format_version)
+                with open(filename, "wb") as f:
+                    f.write(w.protobuf_serialize(format_version))
+                self.assertEqual(w, load_world(filename))
+            for path, archive in ((os.path.join(tmp_dir, "layers"), False), (os.path.join(tmp_dir, "Dummy.npz"), True)):
+                save_world_to_npy(w, path, archive=archive)
+                self.assertEqual(w, load_world(path))
+
+    @pytest.mark.skipif(sys.platform == "win32", reason="PyPlatec has known issues on Windows")
+    def test_distance_to_coast_serialize_unserialize(self):
+        w = world_gen("Dummy", 32, 16, 1, step=Step.get_by_name("plates"))
+        self.assertFalse(w.has_distance_to_coast())
+        w.distance_to_coast = distance_to_coast(w)
+        unserialized = World.protobuf_unserialize(w.protobuf_serialize())
+        self.assertTrue(unserialized.has_distance_to_coast())
+        self.assertEqual(w.layers["distance_to_coast"], unserialized.layers["distance_to_coast"])
+
+        filename = None
+        try:
+            f = tempfile.NamedTemporaryFile(delete=False)
+            f.close()
+            filename = f.name
+            save_world_to_hdf5(w, filename)
+            unserialized = load_world_to_hdf5(filename)
+            self.assertEqual(w.layers["distance_to_coast"], unserialized.layers["distance_to_coast"])
+        finally:
+            if filename:
+                os.remove(filename)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -3,7 +3,17 @@ import unittest
 import numpy
 
 from worldengine.model.world import GenerationParameters, Size, World
-from worldengine.simulations.hydrology import WatermapSimulation
+from worldengine.simulations.basic import find_threshold_f, find_thresholds
+from worldengine.simulations.erosion import (
+    ErosionSimulation,
+    RiverRaster,
+    flow_accumulation,
+    flow_directions,
+    priority_flood,
+)
+from worldengine.simulations.hydrology import WatermapSimulation, downhill_weights
+from worldengine.simulations.icecap import IcecapSimulation
+from worldengine.simulations.irrigation import IrrigationSimulation, irrigation_kernel
 
 
 class TestSimulation(unittest.TestCase):
@@ -62,6 +72,145 @@ class TestSimulation(unittest.TestCase):
 
         WatermapSimulation._watermap(w, 200)
 
+    def test_watermap_long_slope(self):
+        # a droplet running down 3000 cells, far deeper than the default
+        # recursion limit would allow
+        numpy.random.seed(0)
+        size = Size(3000, 1)
+        w = World("watermap", size, 0, GenerationParameters(0, 1.0, 0))
+        w.ocean = numpy.zeros((1, 3000), dtype=bool)
+        w.precipitation = (numpy.ones((1, 3000)), [])
+        w.elevation = (numpy.arange(3000, 0, -1, dtype=float).reshape((1, 3000)), [])
+
+        data, _ = WatermapSimulation._watermap(w, 1)
+        numpy.random.seed(0)
+        start = numpy.random.randint(0, 3000)
+        self.assertTrue((data[0, : start + 1] == 0.0).all())
+        self.assertTrue((data[0, start + 1 : -1] == 1.0).all())  # the water passed each cell on the way
+        self.assertEqual(2.0, data[0, -1])  # and stays in the lowest one
+
+    def test_watermap_waves(self):
+        size = Size(300, 1)
+        w = World("watermap", size, 0, GenerationParameters(0, 1.0, 0))
+        w.ocean = numpy.zeros((1, 300), dtype=bool)
+        w.precipitation = (numpy.ones((1, 300)), [])
+        w.elevation = (numpy.arange(600, 0, -2, dtype=float).reshape((1, 300)), [])
+
+        # a single droplet is not diverted by the water it left on its way
+        numpy.random.seed(1)
+        expected, _ = WatermapSimulation._watermap(w, 1)
+        after_droplets = numpy.random.randint(0, 100)
+        numpy.random.seed(1)
+        data, _ = WatermapSimulation._watermap_waves(w, 1)
+        self.assertTrue(numpy.allclose(expected, data))
+        self.assertEqual(after_droplets, numpy.random.randint(0, 100))  # the same samples were drawn
+
+        simulation = WatermapSimulation()
+        simulation.mode = "waves"
+        simulation.samples = 50
+        simulation.execute(w, 0)
+        self.assertTrue(w.has_watermap())
+        simulation.mode = "unknown"
+        self.assertRaises(ValueError, simulation.execute, w, 0)
+
+    def test_watermap_flow(self):
+        w = World("watermap", Size(5, 1), 0, GenerationParameters(0, 1.0, 0))
+        w.ocean = numpy.array([[False, False, False, False, True]])
+        w.precipitation = (numpy.array([[1.0, 1.0, -1.0, 1.0, 1.0]]), [])
+        w.elevation = (numpy.array([[4.0, 3.0, 2.0, 1.0, 5.0]]), [])
+
+        numpy.random.seed(0)
+        data, thresholds = WatermapSimulation._watermap_flow(w, 8)
+        # two droplets start on each land cell, none where it does not rain;
+        # the water stays in the lowest cell, which counts it twice
+        self.assertTrue(numpy.allclose([[0.0, 2.0, 4.0, 4.0 + 6.0, 0.0]], data))
+        self.assertEqual(["creek", "river", "main river"], list(thresholds.keys()))
+
+    def test_downhill_weights(self):
+        elevation = numpy.array([[5.0, 3.0, 4.0], [1.0, 6.0, 5.5], [9.0, 5.9, 2.0]])
+        ocean = numpy.zeros((3, 3), dtype=bool)
+        ocean[0, 0] = True
+        (offsets, targets, weights), sinks = downhill_weights(elevation, ocean)
+        self.assertEqual([[False, False, False], [True, False, False], [False, False, True]], sinks.tolist())
+
+        # the center: the cell in the ocean gets nothing, 5.9 is not the
+        # lowest neighbour so far and gets no share
+        center = slice(offsets[4], offsets[5])
+        self.assertEqual([3, 1, 7, 2, 5, 8], targets[center].tolist())
+        expected = numpy.array([20, 12, 0, 8, 0, 16]) / 60.0
+        self.assertTrue(numpy.allclose(expected, weights[center]))
+
+        # a cell whose only lower neighbour is a little lower still gets all of it
+        self.assertEqual([1], targets[offsets[2] : offsets[3]].tolist())
+        self.assertEqual([1.0], weights[offsets[2] : offsets[3]].tolist())
+
+    def test_neighbour_table(self):
+        w = World("neighbours", Size(5, 3), 0, GenerationParameters(0, 1.0, 0))
+        offsets, indices = w.neighbour_table()
+        for y in range(3):
+            for x in range(5):
+                i = y * 5 + x
+                expected = [ny * 5 + nx for nx, ny in w.tiles_around((x, y))]
+                self.assertEqual(expected, indices[offsets[i] : offsets[i + 1]].tolist())
+
+        # built once for each kind of table, and again when the size changes
+        self.assertTrue(w.neighbour_table()[1] is indices)
+        self.assertEqual(2 * (3 * 4 + 2 * 5), w.neighbour_table(diagonal=False)[0][-1])
+        self.assertEqual(w, World("neighbours", Size(5, 3), 0, GenerationParameters(0, 1.0, 0)))
+        w.width = 4
+        self.assertFalse(w.neighbour_table()[1] is indices)
+        self.assertEqual(4 * 3 + 1, len(w.neighbour_table()[0]))
+
+    def test_class_maps(self):
+        w = World("classes", Size(4, 2), 0, GenerationParameters(0, 1.0, 0))
+        elevation = numpy.array([[0.5, 2.0, 5.0, 6.0], [7.5, 9.0, 12.0, 4.0]])
+        w.elevation = (elevation, [("sea", 1.0), ("plain", 4.0), ("hill", 6.0), ("mountain", None)])
+        w.ocean = elevation < 1.0
+        bands = [("polar", 1.0), ("alpine", 2.0), ("boreal", 3.0), ("cool", 4.0)]
+        bands += [("warm", 5.0), ("subtropical", 6.0), ("tropical", None)]
+        w.temperature = (numpy.array([[0.0, 1.0, 2.5, 3.0], [4.0, 5.5, 6.0, 9.0]]), bands)
+        w.watermap = (
+            numpy.array([[0.0, 1.0, 2.0, 3.0], [0.5, 2.5, 9.0, 0.0]]),
+            {"creek": 1.0, "river": 2.0, "main river": 3.0},
+        )
+
+        self.assertEqual([[0, 1, 2, 1], [3, 4, 5, 1]], w.elevation_class_map().tolist())
+        self.assertEqual([[0, 1, 2, 3], [4, 5, 6, 6]], w.temperature_class_map().tolist())
+        self.assertEqual([[0, 1, 2, 3], [0, 2, 3, 0]], w.watermap_class_map().tolist())
+        self.assertTrue(w.is_low_mountain((0, 1)) and w.is_mountain((1, 1)) and w.is_high_mountain((2, 1)))
+        self.assertTrue(w.is_hill((2, 0)) and not w.is_hill((3, 0)) and not w.is_mountain((0, 0)))
+        self.assertTrue(w.is_temperature_cool((3, 0)) and w.is_temperature_tropical((3, 1)))
+        self.assertTrue(w.contains_creek((1, 0)) and w.contains_river((1, 1)) and w.contains_main_river((2, 1)))
+        self.assertFalse(w.contains_stream((0, 1)))
+
+        # computed once, again when a layer or its thresholds are replaced
+        classes = w.temperature_class_map()
+        self.assertIs(classes, w.temperature_class_map())
+        w.layers["temperature"].thresholds = [(name, None if th is None else th + 10.0) for name, th in bands]
+        self.assertTrue(w.is_temperature_polar((3, 1)))
+        w.temperature = (numpy.full((2, 4), 9.0), bands)
+        self.assertTrue(w.is_temperature_tropical((0, 0)))
+
+        # changes within the data have to be announced
+        w.layers["temperature"].data[0, 0] = 0.0
+        self.assertTrue(w.is_temperature_tropical((0, 0)))
+        w.invalidate_class_maps()
+        self.assertTrue(w.is_temperature_polar((0, 0)))
+
+    def test_class_maps_unsorted_thresholds(self):
+        # thresholds out of order, as --temps accepts them: the bands overlap
+        w = World("classes", Size(6, 1), 0, GenerationParameters(0, 1.0, 0))
+        bands = [("polar", 0.126), ("alpine", 0.5), ("boreal", 0.406), ("cool", 0.561)]
+        bands += [("warm", 0.634), ("subtropical", 0.876), ("tropical", None)]
+        w.temperature = (numpy.array([[0.1, 0.45, 0.5, 0.6, 0.7, 0.9]]), bands)
+
+        # each cell gets the first class it is in
+        self.assertEqual([[0, 1, 3, 4, 5, 6]], w.temperature_class_map().tolist())
+        # the predicates still test their own band
+        self.assertTrue(w.is_temperature_alpine((1, 0)) and w.is_temperature_cool((1, 0)))
+        self.assertFalse(w.is_temperature_boreal((1, 0)) or w.is_temperature_alpine((2, 0)))
+        self.assertTrue(w.is_temperature_cool((2, 0)) and w.is_temperature_tropical((5, 0)))
+
     def test_random_land_returns_only_land(self):
         size = Size(100, 90)
 
@@ -77,6 +226,217 @@ class TestSimulation(unittest.TestCase):
         for i in range(0, num_samples * 2, 2):
             self.assertFalse(ocean[land_indices[i + 1], land_indices[i]])
 
+    @staticmethod
+    def _bisect_threshold(data, percentage, ocean, max=1000.0, mindist=0.005):
+        # the search find_threshold_f used to do, counting on the masked map at each step
+        mask = numpy.ma.array(data, mask=ocean, keep_mask=True)
+
+        def count(e):
+            return numpy.ma.masked_less_equal(mask, e).count()
+
+        a, b = -max, max
+        desired = mask.count() * percentage
+        while a != b and abs(b - a) >= mindist:
+            m = (a + b) / 2.0
+            if desired < count(m):
+                a = m
+            else:
+                b = m
+        if a != b and abs(desired - count(a)) < abs(desired - count(b)):
+            return a
+        return b
+
+    def test_find_thresholds(self):
+        rng = numpy.random.RandomState(7)
+        data = rng.normal(scale=50.0, size=(30, 40))
+        ocean = rng.uniform(size=(30, 40)) < 0.3
+        percentages = [0.874, 0.765, 0.594, 0.439, 0.366, 0.124, 0.0, 1.0]
+
+        thresholds = find_thresholds(data, percentages, ocean)
+        expected = [self._bisect_threshold(data, p, ocean) for p in percentages]
+        self.assertEqual(expected, thresholds)
+        self.assertEqual(expected[2], find_threshold_f(data, percentages[2], ocean))
+        self.assertEqual(find_threshold_f(data, 0.3), find_thresholds(data, [0.3])[0])
+
+        # picking the thresholds among the values
+        land = data[numpy.logical_not(ocean)]
+        thresholds = find_thresholds(data, percentages, ocean, mindist=None)
+        for p, th in zip(percentages, thresholds):
+            self.assertEqual(int(round(len(land) * p)), numpy.count_nonzero(land > th))
+
+        self.assertRaises(Exception, find_thresholds, data, [0.5], ocean[:10])
+
+    def test_flow_directions(self):
+        elevation = numpy.array(
+            [
+                [5.0, 4.0, 6.0, 0.5],
+                [3.0, 2.0, 7.0, 8.0],
+                [9.0, 2.0, 1.0, 9.0],
+            ]
+        )
+        # 0: no lower neighbour, 1: north, 2: east, 3: south, 4: west
+        expected = [
+            [4, 1, 2, 0],
+            [2, 0, 3, 1],
+            [2, 2, 0, 3],
+        ]
+        self.assertTrue(numpy.array_equal(expected, flow_directions(elevation)))
+
+        expected = [
+            [3, 3, 2, 0],
+            [2, 0, 3, 1],
+            [2, 2, 0, 4],
+        ]
+        self.assertTrue(numpy.array_equal(expected, flow_directions(elevation, wrap=False)))
+
+        # flowing across the north and the west border is not kept in the water path
+        w = World("flow", Size(4, 3), 0, GenerationParameters(0, 1.0, 0))
+        w.elevation = (elevation, [])
+        water_path = numpy.zeros((3, 4), dtype=int)
+        ErosionSimulation().find_water_flow(w, water_path)
+        expected = [
+            [0, 0, 2, 0],
+            [2, 0, 3, 0],
+            [0, 0, 0, 0],
+        ]
+        self.assertTrue(numpy.array_equal(expected, water_path))
+
+    def test_flow_accumulation(self):
+        # 0: no flow, 1: north, 2: east, 3: south, 4: west
+        directions = numpy.array(
+            [
+                [2, 3, 4, 4],
+                [0, 3, 0, 1],
+                [1, 4, 4, 4],
+            ]
+        )
+        rain = numpy.arange(12, dtype=float).reshape(3, 4)
+        expected = [
+            [0.0, 13.0, 12.0, 10.0],
+            [60.0, 18.0, 6.0, 7.0],
+            [56.0, 48.0, 21.0, 11.0],
+        ]
+        self.assertTrue(numpy.allclose(expected, flow_accumulation(directions, rain)))
+
+    def test_river_sources(self):
+        size = Size(40, 30)
+        elevation = numpy.fromfunction(lambda y, x: 10.0 - abs(x - 20) / 4.0 - abs(y - 15) / 3.0, (30, 40))
+        elevation_th = [("sea", 0.0), ("plain", 4.0), ("hill", 6.0), ("mountain", None)]
+        w = World("sources", size, 0, GenerationParameters(0, 0.0, 0))
+        w.elevation = (elevation, elevation_th)
+        w.ocean = numpy.zeros((30, 40), dtype=bool)
+        w.precipitation = (numpy.full((30, 40), 0.01), [])
+
+        water_path = numpy.zeros((30, 40), dtype=int)
+        ErosionSimulation().find_water_flow(w, water_path)
+        walked, accumulated = ErosionSimulation.compare_river_sources(w, water_path)
+        for sources in (walked, accumulated):
+            self.assertTrue(len(sources) > 0)
+            for i, (x, y) in enumerate(sources):
+                self.assertTrue(w.is_mountain((x, y)))
+                for sx, sy in sources[:i]:
+                    self.assertTrue((x - sx) ** 2 + (y - sy) ** 2 > 81)
+
+        self.assertRaises(ValueError, ErosionSimulation.river_sources, w, numpy.zeros((30, 40)), water_path, "x")
+
+    def test_river_raster(self):
+        rivers = RiverRaster(6, 4)
+        self.assertEqual(-1, rivers.river_at(0, 0))
+        rivers.add([[0, 0], [1, 0], [1, 1], [2, 1], [1, 1], [1, 2]])
+        rivers.add([[4, 3], [3, 2], [2, 1], [2, 2]])
+        self.assertEqual(0, rivers.river_at(1, 1))
+        self.assertEqual(0, rivers.river_at(2, 1))  # the first river to get there
+        self.assertEqual(1, rivers.river_at(3, 2))
+        self.assertEqual(-1, rivers.river_at(5, 0))
+        self.assertEqual(-1, rivers.river_at(-1, 0))
+        self.assertEqual(2, rivers.position(0, 1, 1))  # the first time the river gets there
+        self.assertEqual(2, rivers.position(1, 2, 1))
+        self.assertTrue(rivers.position(1, 0, 0) is None)
+
+        # a river reaching another one joins it from there
+        elevation = numpy.fromfunction(lambda y, x: 10.0 - x, (4, 6))
+        w = World("rivers", Size(6, 4), 0, GenerationParameters(0, 1.0, 0))
+        w.elevation = (elevation, [])
+        w.ocean = numpy.zeros((4, 6), dtype=bool)
+        river_list = [[[3, 0], [3, 1], [4, 1], [5, 1]]]
+        river = ErosionSimulation().river_flow([1, 2], w, river_list, [])
+        self.assertEqual([[1, 2], [2, 2], [3, 2], [3, 1], [4, 1], [5, 1]], river)
+
+    def test_icecap(self):
+        rng = numpy.random.RandomState(0)
+        size = Size(41, 29)
+        w = World("icecap", size, 0, GenerationParameters(0, 1.0, 0))
+        w.ocean = rng.uniform(size=(size.height, size.width)) < 0.8
+        temperature = numpy.fromfunction(lambda y, x: -abs(y - 14.0), (size.height, size.width))
+        temperature += rng.uniform(0.0, 3.0, temperature.shape)
+        w.temperature = (temperature, [("polar", numpy.median(temperature)), ("subpolar", None)])
+
+        sequential = IcecapSimulation._calculate(w, 7)
+        self.assertTrue(numpy.array_equal(sequential, IcecapSimulation._calculate_wavefront(w, 7)))
+        self.assertTrue(sequential.any())
+        self.assertFalse(sequential[~w.layers["ocean"].data].any())
+
+        simulation = IcecapSimulation()
+        simulation.mode = "sequential"
+        simulation.execute(w, 7)
+        self.assertTrue(numpy.array_equal(sequential, w.layers["icecap"].data))
+
+    def test_irrigation(self):
+        rng = numpy.random.RandomState(0)
+        size = Size(37, 23)
+        w = World("irrigation", size, 0, GenerationParameters(0, 1.0, 0))
+        w.ocean = rng.uniform(size=(size.height, size.width)) < 0.4
+        w.watermap = (rng.uniform(0.0, 10.0, (size.height, size.width)), {})
+
+        # every ocean cell adds its water over the logs around it, clipped at the borders
+        logs = irrigation_kernel(10)
+        padded = numpy.zeros((size.height + 20, size.width + 20))
+        for y in range(size.height):
+            for x in range(size.width):
+                if w.is_ocean((x, y)):
+                    padded[y : y + 21, x : x + 21] += w.layers["watermap"].data[y, x] / logs
+        expected = padded[10:-10, 10:-10]
+
+        self.assertTrue(numpy.array_equal(expected, IrrigationSimulation._calculate(w)))  # exactly
+        # tiles smaller than the map and the kernel, their results overlap
+        self.assertTrue(numpy.allclose(expected, IrrigationSimulation._calculate_fft(w, 8), rtol=1e-12, atol=1e-12))
+        self.assertTrue(numpy.allclose(expected, IrrigationSimulation._calculate_fft(w), rtol=1e-12, atol=1e-12))
+
+        # without water in the ocean nothing is irrigated
+        w.watermap = (numpy.where(w.layers["ocean"].data, 0.0, 1.0), {})
+        self.assertFalse(IrrigationSimulation._calculate(w).any())
+        self.assertFalse(IrrigationSimulation._calculate_fft(w).any())
+
+    def test_priority_flood(self):
+        elevation = numpy.array(
+            [
+                [0.0, 0.0, 0.0, 0.0, 0.0],
+                [0.0, 5.0, 5.0, 5.0, 0.0],
+                [0.0, 5.0, 1.0, 3.0, 0.0],
+                [0.0, 5.0, 5.0, 5.0, 0.0],
+            ]
+        )
+        ocean = elevation == 0.0
+        filled, spill = priority_flood(elevation, ocean, wrap=False)
+        expected = elevation.copy()
+        expected[2, 2] = 3.0  # the pit fills up to its rim
+        self.assertTrue(numpy.array_equal(expected, filled))
+        self.assertEqual(-1, spill[0, 0])
+        self.assertEqual(2 * 5 + 3, spill[2, 2])  # out of the pit over the lowest rim ...
+        self.assertEqual(2 * 5 + 4, spill[2, 3])  # ... and into the ocean
+
+        # without outlets the map border is used
+        filled, _ = priority_flood(elevation[1:, 1:], numpy.zeros((3, 4), dtype=bool), wrap=False)
+        self.assertEqual(3.0, filled[1, 1])
+
+        w = World("pit", Size(5, 4), 0, GenerationParameters(0, 1.0, 0))
+        w.elevation = (elevation, [])
+        w.ocean = ocean
+        erosion = ErosionSimulation()
+        erosion.depression_mode = "priority_flood"
+        river = erosion.river_flow([2, 2], w, [], [])
+        self.assertEqual([[2, 2], [3, 2], [4, 2]], river)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -12,11 +12,21 @@ find path through mountain/hills between villages.
 
 usage: You can use the PathFinder.find(height_map, source, destination)
 where height_map is any 2D array while source and destination are both
-lists of two values [x, y].
+lists of two values [x, y]. To ask many questions about the same map create
+a PathfindingContext(world_or_array) once and use its find, find_many,
+paths_to and cost_field methods.
 
 author:  Bret Curtis
 """
 
+import heapq
+
+import numpy
+
+# the steps to the neighbours of a location, in the order they are visited
+STEPS_4 = ((1, 0), (-1, 0), (0, 1), (0, -1))
+STEPS_8 = STEPS_4 + ((1, 1), (1, -1), (-1, 1), (-1, -1))
+
 
 class Path:
     """A path object, containing the nodes and total cost."""
@@ -35,6 +45,8 @@ class Path:
 class Node:
     """The basic unit/pixel/location is a Node."""
 
+    __slots__ = ("location", "mCost", "parent", "score", "lid")
+
     def __init__(self, location, movement_cost, lid, parent=None):
         self.location = location  # where is this node located
         self.mCost = movement_cost  # total move cost to reach this node
@@ -54,91 +66,137 @@ class AStar:
 
     Have a read:
     https://en.wikipedia.org/wiki/A*_search_algorithm
-    """
 
-    def __init__(self, map_handler):
-        self.mh = map_handler
-        self.o = []
-        self.on = []
-        self.c = []
-
-    def _get_best_open_node(self):
-        best_node = None
-        for n in self.on:
-            if not best_node:
-                best_node = n
-            else:
-                if n.score <= best_node.score:
-                    best_node = n
-        return best_node
+    The open set is a binary heap, the best scores (and the cells reached
+    through them) are kept in flat arrays indexed by the location id and the
+    closed set is a bitmap, so a search costs O(n log n) in the number of
+    expanded cells. Among nodes with the same score the one added last is
+    expanded first, which is the order the original list-based search used.
 
-    @staticmethod
-    def _trace_path(n):
-        nodes = []
-        total_cost = n.mCost
-        p = n.parent
-        nodes.insert(0, n)
-
-        while 1:
-            if p.parent is None:
-                break
+    The arrays are stamped with the number of the search that wrote them, so
+    one instance answers any number of searches without clearing them.
+    Optionally the map wraps around its borders and diagonal steps are
+    allowed.
+    """
 
-            nodes.insert(0, p)
-            p = p.parent
+    def __init__(self, map_data, width, height, wrap=False, diagonal=False, blocked=None):
+        self.m = map_data  # flat (row-major) sequence of movement costs
+        self.blocked = blocked  # flat sequence, true where a location cannot be entered
+        self.w = width
+        self.h = height
+        self.wrap = wrap
+        self.diagonal = diagonal
+        self.steps = STEPS_8 if diagonal else STEPS_4
+
+        size = width * height
+        self._g_score = [0.0] * size  # cost of the best way found so far
+        self._parents = [-1] * size
+        self._seen = [0] * size  # search that last set the score of a cell
+        self._closed = [0] * size  # search that last expanded a cell
+        self._search = 0
+
+    def _trace_path(self, last, end, total_cost):
+        ex, ey = end
+        parents = self._parents
+        lids = []
+        while parents[last] != -1:  # the starting location is not part of the path
+            lids.append(last)
+            last = parents[last]
+        lids.reverse()
 
+        nodes = []
+        parent = None
+        for lid in lids:
+            y, x = divmod(lid, self.w)
+            parent = Node(SQLocation(x, y), self._g_score[lid], lid, parent)
+            nodes.append(parent)
+        nodes.append(Node(SQLocation(ex, ey), total_cost, ey * self.w + ex, parent))
         return Path(nodes, total_cost)
 
-    def _handle_node(self, node, end):
-        i = self.o.index(node.lid)
-        self.on.pop(i)
-        self.o.pop(i)
-        self.c.append(node.lid)
-
-        nodes = self.mh.get_adjacent_nodes(node, end)
+    def find_path(self, from_location, to_location, max_iterations=None):
+        """Find the cheapest path, None when there is none. The search gives
+        up once more than max_iterations nodes have been expanded, by default
+        it runs until the whole map has been explored."""
+        m = self.m
+        w = self.w
+        h = self.h
+        wrap = self.wrap
+        diagonal = self.diagonal
+        sx, sy = from_location.x, from_location.y
+        ex, ey = to_location.x, to_location.y
+        if sx < 0 or sx >= w or sy < 0 or sy >= h:
+            return None
 
-        for n in nodes:
-            if n.location == end:  # reached the destination
-                return n
-            elif n.lid in self.c:  # already in close, skip this
-                continue
-            elif n.lid in self.o:  # already in open, check if better score
-                i = self.o.index(n.lid)
-                on = self.on[i]
-                if n.mCost < on.mCost:
-                    self.on.pop(i)
-                    self.o.pop(i)
-                    self.on.append(n)
-                    self.o.append(n.lid)
-            else:  # new node, append to open list
-                self.on.append(n)
-                self.o.append(n.lid)
-
-        return None
-
-    def find_path(self, from_location, to_location):
-        end = to_location
-        f_node = self.mh.get_node(from_location)
-        self.on.append(f_node)
-        self.o.append(f_node.lid)
-        next_node = f_node
-
-        counter = 0  # a bail-out counter
-
-        while next_node is not None:
-            if counter > 10000:
-                break  # no path found under limit
-            finish = self._handle_node(next_node, end)
-            if finish:
-                return self._trace_path(finish)
-            next_node = self._get_best_open_node()
-            counter += 1
-
-        return None
+        self._search += 1
+        search = self._search
+        g_score = self._g_score
+        parents = self._parents
+        seen = self._seen
+        closed = self._closed
+        steps = self.steps
+        blocked = self.blocked
+        open_heap = []
+        heappush = heapq.heappush
+        heappop = heapq.heappop
+
+        current = sy * w + sx
+        g_score[current] = m[current]
+        parents[current] = -1
+        seen[current] = search
+        pushed = 0
+        expanded = 0
+        while True:
+            if max_iterations is not None and expanded > max_iterations:
+                return None  # no path found under limit
+            expanded += 1
+
+            closed[current] = search
+            cost = g_score[current]
+            cy, cx = divmod(current, w)
+            for ox, oy in steps:
+                nx = cx + ox
+                ny = cy + oy
+                if wrap:
+                    nx %= w
+                    ny %= h
+                elif nx < 0 or nx >= w or ny < 0 or ny >= h:
+                    continue
+                n = ny * w + nx
+                if blocked is not None and blocked[n]:
+                    continue
+                n_cost = m[n] + cost
+                if nx == ex and ny == ey:  # reached the destination
+                    return self._trace_path(current, (ex, ey), n_cost)
+                if closed[n] == search:
+                    continue
+                if seen[n] != search or n_cost < g_score[n]:
+                    g_score[n] = n_cost
+                    parents[n] = current
+                    seen[n] = search
+                    pushed += 1
+                    # the heuristic: the number of steps left to the destination
+                    dx = nx - ex if nx > ex else ex - nx
+                    dy = ny - ey if ny > ey else ey - ny
+                    if wrap:
+                        dx = min(dx, w - dx)
+                        dy = min(dy, h - dy)
+                    heappush(open_heap, (n_cost + (max(dx, dy) if diagonal else dx + dy), -pushed, n_cost, n))
+
+            # take the best open node, skipping entries that were improved on
+            # or expanded since they were pushed
+            while open_heap:
+                _, _, n_cost, current = heappop(open_heap)
+                if closed[current] != search and n_cost == g_score[current]:
+                    break
+            else:
+                return None
 
 
 class SQLocation:
     """A simple Square Map Location implementation"""
 
+    __slots__ = ("x", "y")
+
     def __init__(self, x, y):
         self.x = x
         self.y = y
@@ -150,56 +208,6 @@ class SQLocation:
             return 0
 
 
-class SQMapHandler:
-    """A simple Square Map implementation"""
-
-    def __init__(self, map_data, width, height):
-        self.m = map_data
-        self.w = width
-        self.h = height
-
-    def get_node(self, location):
-        x = location.x
-        y = location.y
-        if x < 0 or x >= self.w or y < 0 or y >= self.h:
-            return None
-        d = self.m[(y * self.w) + x]
-        return Node(location, d, ((y * self.w) + x))
-
-    def get_adjacent_nodes(self, cur_node, destination):
-        result = []
-
-        cl = cur_node.location
-        dl = destination
-
-        n = self._handle_node(cl.x + 1, cl.y, cur_node, dl.x, dl.y)
-        if n:
-            result.append(n)
-        n = self._handle_node(cl.x - 1, cl.y, cur_node, dl.x, dl.y)
-        if n:
-            result.append(n)
-        n = self._handle_node(cl.x, cl.y + 1, cur_node, dl.x, dl.y)
-        if n:
-            result.append(n)
-        n = self._handle_node(cl.x, cl.y - 1, cur_node, dl.x, dl.y)
-        if n:
-            result.append(n)
-
-        return result
-
-    def _handle_node(self, x, y, from_node, destination_x, destination_y):
-        n = self.get_node(SQLocation(x, y))
-        if n is not None:
-            dx = max(x, destination_x) - min(x, destination_x)
-            dy = max(y, destination_y) - min(y, destination_y)
-            em_cost = dx + dy
-            n.mCost += from_node.mCost
-            n.score = n.mCost + em_cost
-            n.parent = from_node
-            return n
-        return None
-
-
 class PathFinder:
     """Using the a* algorithm we will try to find the best path between two
     points.
@@ -209,18 +217,18 @@ class PathFinder:
         pass
 
     @staticmethod
-    def find(height_map, source, destination):
+    def find(height_map, source, destination, max_iterations=None):
         sx, sy = source
         dx, dy = destination
         path = []
         height, width = height_map.shape
 
-        graph = height_map.flatten("C")  # flatten array (row-major)
+        graph = height_map.ravel().tolist()  # flatten array (row-major)
 
-        pathfinder = AStar(SQMapHandler(graph, width, height))
+        pathfinder = AStar(graph, width, height)
         start = SQLocation(sx, sy)
         end = SQLocation(dx, dy)
-        p = pathfinder.find_path(start, end)
+        p = pathfinder.find_path(start, end, max_iterations)
 
         if not p:
             return path
@@ -229,3 +237,113 @@ class PathFinder:
             path.append([node.location.x, node.location.y])
 
         return path
+
+
+class PathfindingContext:
+    """Answers any number of path queries on the same map.
+
+    The movement costs (the elevation of a world, or any 2D array) are
+    flattened once and the search arrays are shared by all the queries. A
+    path lists the locations [x, y] after the source up to the destination,
+    as PathFinder.find does; the map can wrap around its borders and allow
+    diagonal steps, and the locations where blocked is true are never
+    entered.
+    """
+
+    def __init__(self, world_or_array, wrap=False, diagonal=False, blocked=None):
+        if isinstance(world_or_array, numpy.ndarray):
+            costs = world_or_array
+        else:
+            costs = world_or_array.layers["elevation"].data
+        self.height, self.width = costs.shape
+        self.wrap = wrap
+        self.diagonal = diagonal
+        self.costs = costs.ravel().tolist()  # flatten array (row-major)
+        if blocked is not None:
+            blocked = bytearray(numpy.asarray(blocked, dtype=bool).tobytes())
+        self.blocked = blocked
+        self._astar = AStar(self.costs, self.width, self.height, wrap, diagonal, blocked)
+
+    def set_cost(self, x, y, cost):
+        """Keep the context in step with a change of the map."""
+        self.costs[y * self.width + x] = cost
+
+    def find(self, source, destination, max_iterations=None):
+        sx, sy = source
+        dx, dy = destination
+        p = self._astar.find_path(SQLocation(sx, sy), SQLocation(dx, dy), max_iterations)
+        if not p:
+            return []
+        return [[node.location.x, node.location.y] for node in p.nodes]
+
+    def find_many(self, queries, max_iterations=None):
+        """Find the paths for a list of (source, destination) pairs."""
+        return [self.find(source, destination, max_iterations) for source, destination in queries]
+
+    def cost_field(self, destination):
+        """Run Dijkstra from the destination over the whole map.
+
+        Returns the total cost of the cheapest path from every location to
+        the destination (infinite where it cannot be reached) and for every
+        location the flat index of the next location on that path (-1 at the
+        destination and where it cannot be reached)."""
+        m = self.costs
+        w = self.width
+        h = self.height
+        wrap = self.wrap
+        steps = self._astar.steps
+        blocked = self.blocked
+        size = w * h
+        costs = [float("inf")] * size
+        toward = [-1] * size
+        done = bytearray(size)
+
+        dx, dy = destination
+        target = dy * w + dx
+        costs[target] = m[target]
+        open_heap = [(m[target], target)]
+        while open_heap:
+            cost, current = heapq.heappop(open_heap)
+            if done[current]:
+                continue
+            done[current] = 1
+            cy, cx = divmod(current, w)
+            for ox, oy in steps:
+                nx = cx + ox
+                ny = cy + oy
+                if wrap:
+                    nx %= w
+                    ny %= h
+                elif nx < 0 or nx >= w or ny < 0 or ny >= h:
+                    continue
+                n = ny * w + nx
+                if blocked is not None and blocked[n]:
+                    continue
+                n_cost = m[n] + cost
+                if n_cost < costs[n]:
+                    costs[n] = n_cost
+                    toward[n] = current
+                    heapq.heappush(open_heap, (n_cost, n))
+
+        return (
+            numpy.array(costs).reshape((h, w)),
+            numpy.array(toward, dtype=numpy.int32).reshape((h, w)),
+        )
+
+    def path_from_field(self, toward, source):
+        """Follow a field from cost_field from source to its destination."""
+        sx, sy = source
+        path = []
+        current = toward[sy, sx]
+        while current != -1:
+            y, x = divmod(int(current), self.width)
+            path.append([x, y])
+            current = toward[y, x]
+        return path
+
+    def paths_to(self, destination, sources):
+        """The cheapest paths from many sources to one destination, from a
+        single Dijkstra field. Where several paths are equally cheap these can
+        differ from the ones find returns."""
+        _, toward = self.cost_field(destination)
+        return [self.path_from_field(toward, source) for source in sources]
@@ -10,10 +10,16 @@ def distance(pa, pb):
 def index_of_nearest(p, hot_points, distance_f=distance):
     """Given a point and a set of hot points it found the hot point
     nearest to the given point. An arbitrary distance function can
-    be specified
+    be specified. To ask about many points, build a SpatialIndex of the hot
+    points once (SpatialIndex.of_points) and pass it instead of the list.
     :return the index of the nearest hot points, or None if the list of hot
             points is empty
     """
+    if isinstance(hot_points, SpatialIndex):
+        if distance_f is not distance:
+            raise ValueError("A SpatialIndex only knows about euclidean distances")
+        return hot_points.nearest(p)
+
     min_dist = None
     nearest_hp_i = None
     for i, hp in enumerate(hot_points):
@@ -22,3 +28,115 @@ def index_of_nearest(p, hot_points, distance_f=distance):
             min_dist = dist
             nearest_hp_i = i
     return nearest_hp_i
+
+
+class SpatialIndex:
+    """Points bucketed by the square cell of a grid they fall in, so that
+    only the cells close to a point need to be looked at to find the points
+    near it. Each point can carry a value, e.g. its index in a list.
+    """
+
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.buckets = {}
+        self.size = 0
+        self._min_bucket = None
+        self._max_bucket = None
+
+    @classmethod
+    def of_points(cls, points):
+        """An index of the points with their indexes as values, with cells
+        holding about one point each when the points are spread evenly."""
+        index = cls(1.0)
+        if len(points) > 0:
+            xs = [point[0] for point in points]
+            ys = [point[1] for point in points]
+            extent = max(max(xs) - min(xs), max(ys) - min(ys))
+            index.cell_size = max(extent / math.sqrt(len(points)), 1.0)
+        for i, point in enumerate(points):
+            index.insert(point, i)
+        return index
+
+    def __len__(self):
+        return self.size
+
+    def _bucket(self, x, y):
+        return int(math.floor(x / self.cell_size)), int(math.floor(y / self.cell_size))
+
+    def insert(self, point, value=None):
+        x, y = point
+        bucket = self._bucket(x, y)
+        self.buckets.setdefault(bucket, []).append((x, y, value))
+        self.size += 1
+        if self._min_bucket is None:
+            self._min_bucket = self._max_bucket = bucket
+        else:
+            self._min_bucket = (min(self._min_bucket[0], bucket[0]), min(self._min_bucket[1], bucket[1]))
+            self._max_bucket = (max(self._max_bucket[0], bucket[0]), max(self._max_bucket[1], bucket[1]))
+
+    def within(self, point, radius):
+        """The points within the given radius (inclusive), as (x, y, value) tuples"""
+        px, py = point
+        min_bx, min_by = self._bucket(px - radius, py - radius)
+        max_bx, max_by = self._bucket(px + radius, py + radius)
+        square_radius = radius**2
+        found = []
+        for bx in range(min_bx, max_bx + 1):
+            for by in range(min_by, max_by + 1):
+                for entry in self.buckets.get((bx, by), ()):
+                    if (entry[0] - px) ** 2 + (entry[1] - py) ** 2 <= square_radius:
+                        found.append(entry)
+        return found
+
+    def any_within(self, point, radius):
+        """Whether any point lies within the given radius (inclusive)"""
+        px, py = point
+        min_bx, min_by = self._bucket(px - radius, py - radius)
+        max_bx, max_by = self._bucket(px + radius, py + radius)
+        square_radius = radius**2
+        for bx in range(min_bx, max_bx + 1):
+            for by in range(min_by, max_by + 1):
+                for x, y, _ in self.buckets.get((bx, by), ()):
+                    if (x - px) ** 2 + (y - py) ** 2 <= square_radius:
+                        return True
+        return False
+
+    def nearest(self, point):
+        """The value of the nearest point, None if the index is empty. On ties
+        the smallest value wins (i.e. the first point when the values are
+        indexes), so the values need to be comparable."""
+        if self.size == 0:
+            return None
+        px, py = point
+        cx, cy = self._bucket(px, py)
+        # no point can be further away (in rings of cells) than this
+        last_ring = max(
+            abs(cx - self._min_bucket[0]),
+            abs(cx - self._max_bucket[0]),
+            abs(cy - self._min_bucket[1]),
+            abs(cy - self._max_bucket[1]),
+        )
+        best = None
+
+        def consider(entries):
+            nonlocal best
+            for x, y, value in entries:
+                dist = distance(point, (x, y))
+                if best is None or dist < best[0] or (dist == best[0] and value < best[1]):
+                    best = (dist, value)
+
+        for ring in range(last_ring + 1):
+            # the points in cells further out are more than this far away
+            if best is not None and best[0] <= (ring - 1) * self.cell_size:
+                break
+            if (2 * ring + 1) ** 2 > 2 * len(self.buckets):
+                # cheaper to look at all the remaining cells at once
+                for (bx, by), entries in self.buckets.items():
+                    if max(abs(bx - cx), abs(by - cy)) >= ring:
+                        consider(entries)
+                break
+            for bx in range(cx - ring, cx + ring + 1):
+                on_edge = bx == cx - ring or bx == cx + ring
+                for by in range(cy - ring, cy + ring + 1) if on_edge else (cy - ring, cy + ring):
+                    consider(self.buckets.get((bx, by), ()))
+        return best[1]
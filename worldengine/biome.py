@@ -267,6 +267,10 @@ class TropicalRainForest(Biome, Jungle):
 # Serialization
 # -------------
 
+# The names of all the biomes. The index of a name is what the biome layer of
+# a world holds for it, and what the saved worlds hold.
+BIOME_NAMES = tuple(sorted(_BiomeMetaclass.biomes.keys()))
+
 
 def biome_name_to_index(biome_name):
     names = sorted(_BiomeMetaclass.biomes.keys())
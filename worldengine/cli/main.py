@@ -1,5 +1,6 @@
 import os
 import sys
+import zipfile
 from argparse import ArgumentParser
 
 import numpy
@@ -20,8 +21,10 @@ from worldengine.draw import (
     draw_temperature_levels_on_file,
 )
 from worldengine.imex import export
-from worldengine.model.world import GenerationParameters, Size, World
+from worldengine.model.world import FORMAT_VERSION, GenerationParameters, Size, World
+from worldengine.npy_serialization import load_world_from_npy, save_world_to_npy
 from worldengine.plates import generate_plates_simulation, world_gen
+from worldengine.routes import RouteIndex
 from worldengine.step import Step
 from worldengine.version import __version__
 
@@ -56,6 +59,7 @@ def generate_world(
     fade_borders=True,
     verbose=True,
     black_and_white=False,
+    format_version=FORMAT_VERSION,
 ):
     w = world_gen(
         world_name,
@@ -81,9 +85,11 @@ def generate_world(
     filename = f"{output_dir}/{world_name}.world"
     if world_format == "protobuf":
         with open(filename, "wb") as f:
-            f.write(w.protobuf_serialize())
+            f.write(w.protobuf_serialize(format_version))
     elif world_format == "hdf5":
         save_world_to_hdf5(w, filename)
+    elif world_format == "npy":
+        save_world_to_npy(w, filename, archive=True)
     else:
         print(f"Unknown format '{world_format}', not saving ")
     print(f"* world data saved in '{filename}'")
@@ -139,6 +145,11 @@ def draw_icecaps_map(world, filename):
     print(f"+ icecap map generated in '{filename}'")
 
 
+def generate_route_index(world, filename):
+    RouteIndex(world).save(filename)
+    print(f"+ route index generated in '{filename}'")
+
+
 def generate_plates(seed, world_name, output_dir, width, height, num_plates=10):
     """
     Eventually this method should be invoked when generation is called at
@@ -244,15 +255,22 @@ def __seems_protobuf_worldfile__(world_filename):
     return worldengine_tag == World.worldengine_tag()
 
 
-def load_world(world_filename):
-    pb = __seems_protobuf_worldfile__(world_filename)
-    if pb:
+def load_world(world_filename, lazy=False):
+    # .npy layers, in a directory or in a zip file, are always mapped lazily.
+    # The protobuf tag is checked before the zip file: a protobuf file can
+    # contain the bytes zipfile.is_zipfile looks for
+    npy = os.path.isdir(world_filename)
+    if not npy and __seems_protobuf_worldfile__(world_filename):
         try:
-            return World.open_protobuf(world_filename)
+            return World.open_protobuf(world_filename, lazy=lazy)
         except Exception:
             raise Exception("Unable to load the worldfile as protobuf file")
-    else:
-        raise Exception("The given worldfile does not seem to be a protobuf file")
+    if npy or zipfile.is_zipfile(world_filename):
+        try:
+            return load_world_from_npy(world_filename)
+        except Exception:
+            raise Exception("Unable to load the worldfile as npy world")
+    raise Exception("The given worldfile does not seem to be a protobuf file")
 
 
 def print_world_info(world):
@@ -302,6 +320,24 @@ def main():
         help="Save world file using HDF5 format. " + "Default = store using protobuf format",
         default=False,
     )
+    parser.add_argument(
+        "--world-format-version",
+        dest="world_format_version",
+        type=int,
+        choices=[1, 2],
+        help="Version of the protobuf world format: 1 stores the layers cell by cell, "
+        + "2 packs each of them in one buffer, much faster to save and load but "
+        + "unknown to worldengine before 0.20 and to WorldEngine-Java [default = %(default)s]",
+        default=FORMAT_VERSION,
+    )
+    parser.add_argument(
+        "--npy",
+        dest="npy",
+        action="store_true",
+        help="Save world file as an uncompressed zip of .npy layers, "
+        + "memory mapped when loaded. Default = store using protobuf format",
+        default=False,
+    )
     parser.add_argument(
         "-s",
         "--seed",
@@ -357,9 +393,8 @@ def main():
         "--recursion_limit",
         dest="recursion_limit",
         type=int,
-        help="Set the recursion limit [default = %(default)s]",
+        help="Deprecated and ignored, nothing is computed recursively anymore",
         metavar="N",
-        default="2000",
     )
     parser.add_argument(
         "-v", "--verbose", dest="verbose", action="store_true", help="Enable verbose messages", default=False
@@ -436,6 +471,9 @@ def main():
     g_generate.add_argument("--scatter", dest="scatter_plot", action="store_true", help="generate scatter plot")
     g_generate.add_argument("--sat", dest="satelite_map", action="store_true", help="generate satellite map")
     g_generate.add_argument("--ice", dest="icecaps_map", action="store_true", help="generate ice caps map")
+    g_generate.add_argument(
+        "--routes", dest="route_index", action="store_true", help="build a route index to be saved with the world"
+    )
 
     # -----------------------------------------------------
     g_ancient_map = parser.add_argument_group(
@@ -534,16 +572,15 @@ def main():
         print("Directory does not exist, we are creating it")
         os.makedirs(args.output_dir)
 
-    # it needs to be increased to be able to generate very large maps
-    # the limit is hit when drawing ancient maps
-    sys.setrecursionlimit(args.recursion_limit)
-
     if args.number_of_plates < 1 or args.number_of_plates > 100:
         usage(error="Number of plates should be in [1, 100]")
 
     if args.hdf5 and not HDF5_AVAILABLE:
         usage(error="HDF5 requires the presence of native libraries")
 
+    if args.hdf5 and args.npy:
+        usage(error="Only one world format allowed (--hdf5 or --npy)")
+
     operation = "world"
     if args.OPERATOR is None:
         pass
@@ -579,6 +616,8 @@ def main():
     world_format = "protobuf"
     if args.hdf5:
         world_format = "hdf5"
+    elif args.npy:
+        world_format = "npy"
 
     generation_operation = (operation == "world") or (operation == "plates")
 
@@ -620,6 +659,9 @@ def main():
     if args.scatter_plot and not generation_operation:
         usage(error="Scatter plot can be produced only during world generation")
 
+    if args.route_index and operation != "world":
+        usage(error="Route index can be built only during world generation")
+
     print(f"Worldengine - a world generator (v. {VERSION})")
     print("-----------------------")
     if generation_operation:
@@ -630,6 +672,8 @@ def main():
         print(" height               : %i" % args.height)
         print(" number of plates     : %i" % args.number_of_plates)
         print(f" world format         : {world_format}")
+        if world_format == "protobuf":
+            print(f" world format version : {args.world_format_version}")
         print(f" black and white maps : {args.black_and_white}")
         print(f" step                 : {step.name}")
         print(f" greyscale heightmap  : {args.grayscale_heightmap}")
@@ -637,6 +681,7 @@ def main():
         print(f" rivers map           : {args.rivers_map}")
         print(f" scatter plot         : {args.scatter_plot}")
         print(f" satellite map        : {args.satelite_map}")
+        print(f" route index          : {args.route_index}")
         print(f" fade borders         : {args.fade_borders}")
         if args.temps:
             print(f" temperature ranges   : {args.temps}")
@@ -656,6 +701,8 @@ def main():
 
     # Warning messages
     warnings = []
+    if args.recursion_limit is not None:
+        warnings.append("WARNING: --recursion_limit is deprecated and ignored")
     if temps != sorted(temps, reverse=True):
         warnings.append("WARNING: Temperature array not in ascending order")
     if numpy.amin(temps) < 0:
@@ -697,6 +744,7 @@ def main():
             fade_borders=args.fade_borders,
             verbose=args.verbose,
             black_and_white=args.black_and_white,
+            format_version=args.world_format_version,
         )
         if args.grayscale_heightmap:
             generate_grayscale_heightmap(world, f"{args.output_dir}/{world_name}_grayscale.png")
@@ -708,6 +756,8 @@ def main():
             draw_satellite_map(world, f"{args.output_dir}/{world_name}_satellite.png")
         if args.icecaps_map:
             draw_icecaps_map(world, f"{args.output_dir}/{world_name}_icecaps.png")
+        if args.route_index:
+            generate_route_index(world, f"{args.output_dir}/{world_name}.routes")
 
     elif operation == "plates":
         print("")  # empty line
@@ -744,10 +794,10 @@ def main():
             args.draw_outer_border,
         )
     elif operation == "info":
-        world = load_world(args.FILE)
+        world = load_world(args.FILE, lazy=True)
         print_world_info(world)
     elif operation == "export":
-        world = load_world(args.FILE)
+        world = load_world(args.FILE, lazy=True)
         print_world_info(world)
         export(
             world,
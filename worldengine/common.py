@@ -78,15 +78,44 @@ class Counter:
 #
 #
 # Unless we want to add scipy as a dependency we only have 1D convolution at our hands from numpy.
-# So we take advantage of the kernel being seperable.
+# So we take advantage of the kernel being seperable: every step scales the map,
+# pads it with the opposite border (circular boundary) and sums three shifted
+# views first along the rows and then along the columns, in the same order
+# numpy.convolve would do it.
+#
+# Since every step is linear the whole operation also has a closed form: with
+# a being the filter above in frequency space and b = 2/11,
+#
+# result = a^steps * map + b * (1 + a + ... + a^(steps - 1)) * map
+#        = (a^steps + b * (1 - a^steps) / (1 - a)) * map
+#
+# which the "fft" method applies in a single pass. The 3x3 filter is periodic
+# so this keeps the circular boundary; |a| <= 9/11, hence 1 - a is never zero.
 
 
-def anti_alias(map_in, steps):
+def anti_alias(map_in, steps, out=None, method="convolve"):
     """
     Execute the anti_alias operation steps times on the given map
+    :param out: optional float array of the same shape as map_in to write the result to
+    :param method: "convolve" repeats the filter steps times, "fft" applies all
+                   the steps at once in frequency space which is faster for many
+                   steps; both agree up to rounding errors
+    :return: the anti-aliased map
     """
 
     height, width = map_in.shape
+    if out is None:
+        out = numpy.empty((height, width))
+    elif out.shape != (height, width):
+        raise Exception(
+            "Output buffer has the wrong dimension. Expected %d x %d, "
+            "found %d x %d" % (width, height, out.shape[1], out.shape[0])
+        )
+
+    if method == "fft":
+        return _anti_alias_fft(map_in, steps, out)
+    elif method != "convolve":
+        raise ValueError("Unknown anti-aliasing method %s" % method)
 
     map_part = (2.0 / 11.0) * map_in
 
@@ -96,42 +125,60 @@ def anti_alias(map_in, steps):
     # therefore the kernel is seperable
 
     w = -1.0 / numpy.sqrt(3.0)
-    kernel = [w, w, w]
 
-    def _anti_alias_step(original):
-        # cf. comments above fo the factor
-        # this also makes a copy which might actually be superfluous
-        result = original * (3.0 / 11.0)
+    # buffers reused by all the steps
+    padded = numpy.empty((height + 2, width + 2))
+    rows = numpy.empty((height + 2, width))
+    term = numpy.empty((height + 2, width))
 
-        # we need to handle boundary conditions by hand, unfortunately
-        # there might be a better way but this works (circular boundary)
-        # notice how we'll need to add 2 to width and height later
-        # because of this
-        result = numpy.append(result, [result[0, :]], 0)
-        result = numpy.append(result, numpy.transpose([result[:, 0]]), 1)
+    if steps == 0:
+        out[:] = map_in
 
-        result = numpy.insert(result, [0], [result[-2, :]], 0)
-        result = numpy.insert(result, [0], numpy.transpose([result[:, -2]]), 1)
+    current = map_in
+    for i in range(steps):
+        # cf. comments above fo the factor
+        numpy.multiply(current, 3.0 / 11.0, out=padded[1:-1, 1:-1])
+
+        # circular boundary
+        padded[0, 1:-1] = padded[-2, 1:-1]
+        padded[-1, 1:-1] = padded[1, 1:-1]
+        padded[:, 0] = padded[:, -2]
+        padded[:, -1] = padded[:, 1]
 
         # with a seperable kernel we can convolve the rows first ...
-        for y in range(height + 2):
-            result[y, 1:-1] = numpy.convolve(result[y, :], kernel, "valid")
+        numpy.multiply(padded[:, :-2], w, out=rows)
+        numpy.multiply(padded[:, 1:-1], w, out=term)
+        rows += term
+        numpy.multiply(padded[:, 2:], w, out=term)
+        rows += term
 
         # ... and then the columns
-        for x in range(width + 2):
-            result[1:-1, x] = numpy.convolve(result[:, x], kernel, "valid")
+        column_term = term[:height]
+        numpy.multiply(rows[:-2], w, out=out)
+        numpy.multiply(rows[1:-1], w, out=column_term)
+        out += column_term
+        numpy.multiply(rows[2:], w, out=column_term)
+        out += column_term
 
-        # throw away invalid values at the boundary
-        result = result[1:-1, 1:-1]
+        out += map_part
+        current = out
 
-        result += map_part
+    return out
 
-        return result
 
-    current = map_in
-    for i in range(steps):
-        current = _anti_alias_step(current)
-    return current
+def _anti_alias_fft(map_in, steps, out):
+    height, width = map_in.shape
+
+    # the 3x3 filter in frequency space
+    along_y = 1.0 + 2.0 * numpy.cos(2.0 * numpy.pi * numpy.fft.fftfreq(height))
+    along_x = 1.0 + 2.0 * numpy.cos(2.0 * numpy.pi * numpy.fft.rfftfreq(width))
+    a = numpy.outer(along_y, along_x) / 11.0
+
+    a_steps = a**steps
+    transfer = a_steps + (2.0 / 11.0) * (1.0 - a_steps) / (1.0 - a)
+
+    out[:] = numpy.fft.irfft2(numpy.fft.rfft2(map_in) * transfer, s=(height, width))
+    return out
 
 
 def count_neighbours(mask, radius=1):
@@ -156,6 +203,249 @@ def count_neighbours(mask, radius=1):
     return result - mask
 
 
+# Connected regions are labeled per horizontal run of set cells rather than per cell.
+# Runs on neighbouring rows which touch each other are joined, and the runs are then
+# merged into regions by repeatedly hooking every region onto the smallest touching one.
+# All of this is done with array operations; the number of runs is far smaller than the
+# number of cells, so the whole labeling is linear in the size of the map.
+
+
+def label_regions(mask, diagonal=True, wrap=False):
+    """
+    Label the connected regions of a boolean mask.
+    :param mask: 2d boolean array
+    :param diagonal: if True, cells touching only at a corner are connected (8-connectivity)
+    :param wrap: if True, the map wraps around left to right and top to bottom
+    :return: (labels, count): an int32 array holding 0 for cells not set and 1...count
+             for the regions, numbered in the order they are first met scanning row by row
+    """
+    mask = numpy.asarray(mask, dtype=bool)
+    height, width = mask.shape
+    labels = numpy.zeros((height, width), dtype=numpy.int32)
+    if not mask.any():
+        return labels, 0
+
+    # find the runs, end is exclusive
+    padded = numpy.zeros((height, width + 2), dtype=numpy.int8)
+    padded[:, 1:-1] = mask
+    changes = numpy.diff(padded, axis=1)
+    run_row, run_start = numpy.nonzero(changes == 1)
+    run_end = numpy.nonzero(changes == -1)[1]
+
+    # keys sort runs row by row; a run's neighbours on another row are found by
+    # binary search, (row * stride) + column can never collide with the next row
+    ext = 1 if diagonal else 0
+    stride = width + 3
+    start_key = run_row * stride + run_start
+    end_key = run_row * stride + run_end
+    sources = numpy.arange(len(run_row))
+    if wrap:
+        next_row = (run_row + 1) % height
+    else:
+        sources = sources[run_row < height - 1]
+        next_row = run_row[sources] + 1
+    if height > 1:
+        first = numpy.searchsorted(end_key, next_row * stride + run_start[sources] - ext, "right")
+        last = numpy.searchsorted(start_key, next_row * stride + run_end[sources] + ext, "left")
+        counts = numpy.maximum(last - first, 0)
+        edges_from = numpy.repeat(sources, counts)
+        offsets = numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+        edges_to = numpy.repeat(first, counts) + offsets
+    else:
+        edges_from = edges_to = numpy.zeros(0, dtype=numpy.intp)
+
+    if wrap:
+        # cells on the west and east border touch each other
+        def run_at(rows, columns):
+            return numpy.searchsorted(start_key, rows * stride + columns, "right") - 1
+
+        rows = numpy.arange(height)
+        seam = [(rows, rows)]
+        if diagonal and height > 1:
+            seam.append((rows, (rows + 1) % height))
+            seam.append(((rows + 1) % height, rows))
+        seam_from = [edges_from]
+        seam_to = [edges_to]
+        for east_rows, west_rows in seam:
+            touching = numpy.logical_and(mask[east_rows, width - 1], mask[west_rows, 0])
+            seam_from.append(run_at(east_rows[touching], width - 1))
+            seam_to.append(run_at(west_rows[touching], 0))
+        edges_from = numpy.concatenate(seam_from)
+        edges_to = numpy.concatenate(seam_to)
+
+    # merge the runs: hook each root onto the smallest root it touches, then compress
+    parent = numpy.arange(len(run_row))
+    while True:
+        root_from = parent[edges_from]
+        root_to = parent[edges_to]
+        different = root_from != root_to
+        if not different.any():
+            break
+        root_from = root_from[different]
+        root_to = root_to[different]
+        numpy.minimum.at(parent, numpy.maximum(root_from, root_to), numpy.minimum(root_from, root_to))
+        while True:
+            grandparent = parent[parent]
+            if numpy.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+        edges_from = edges_from[different]
+        edges_to = edges_to[different]
+
+    # every root is the first run of its region, so this numbers regions in scan order
+    roots, run_label = numpy.unique(parent, return_inverse=True)
+    run_label = run_label.astype(numpy.int64) + 1
+
+    # paint the runs
+    painted = numpy.zeros(height * width + 1, dtype=numpy.int64)
+    numpy.add.at(painted, run_row * width + run_start, run_label)
+    numpy.subtract.at(painted, run_row * width + run_end, run_label)
+    labels[:] = numpy.cumsum(painted[:-1]).reshape(height, width)
+    return labels, len(roots)
+
+
+def flood_fill(mask, seeds, diagonal=True, wrap=False):
+    """
+    Find all the cells of mask which are connected to one of the seeds.
+    :param mask: 2d boolean array of the cells the fill can spread over
+    :param seeds: 2d boolean array of the cells to start from, seeds not in mask are ignored
+    :param diagonal: see label_regions
+    :param wrap: see label_regions
+    :return: a boolean array
+    """
+    labels, count = label_regions(mask, diagonal, wrap)
+    reached = numpy.zeros(count + 1, dtype=bool)
+    reached[labels[numpy.asarray(seeds, dtype=bool)]] = True
+    reached[0] = False
+    return reached[labels]
+
+
+def distance_transform(mask, max_radius=None, diagonal=True, wrap=False, metric=None):
+    """
+    Measure, in steps between neighbouring cells, how far each cell is from
+    the nearest cell set in mask. Stepping diagonally counts as one step, as
+    in the chessboard metric, unless diagonal is False (city-block metric).
+    The cells are visited ring by ring outwards from the mask, so each cell
+    is handled once.
+    With metric "chamfer" a straight step counts as 3 and a diagonal one as
+    4 (the 3-4 chamfer metric): the distances, divided by 3, are within 6%
+    of the Euclidean distance before they are rounded to whole steps.
+    :param mask: 2d boolean array of the cells to measure the distance to
+    :param max_radius: stop measuring after that distance, None to measure everything
+    :param diagonal: see above
+    :param wrap: if True, the map wraps around left to right and top to bottom
+    :param metric: "chessboard", "cityblock" or "chamfer", None picks one of
+                   the first two from diagonal
+    :return: an int32 array holding 0 for cells in mask and -1 for cells
+             further than max_radius away (or not reachable at all)
+    """
+    if metric is None:
+        metric = "chessboard" if diagonal else "cityblock"
+    if metric not in ("chessboard", "cityblock", "chamfer"):
+        raise ValueError("Unknown metric %s" % metric)
+
+    mask = numpy.asarray(mask, dtype=bool)
+    height, width = mask.shape
+    distance = numpy.full(height * width, -1, dtype=numpy.int32)
+    ring = numpy.flatnonzero(mask)
+    distance[ring] = 0
+
+    if metric == "cityblock":
+        steps = [(-1, 0), (0, -1), (0, 1), (1, 0)]
+    else:
+        steps = [(dy, dx) for dy in (-1, 0, 1) for dx in (-1, 0, 1) if dy != 0 or dx != 0]
+
+    def neighbours(cells, dy, dx):
+        cells_y, cells_x = numpy.divmod(cells, width)
+        ny = cells_y + dy
+        nx = cells_x + dx
+        if wrap:
+            return (ny % height) * width + nx % width
+        inside = (ny >= 0) & (ny < height) & (nx >= 0) & (nx < width)
+        return ny[inside] * width + nx[inside]
+
+    if metric == "chamfer":
+        return _chamfer_transform(distance, ring, steps, neighbours, max_radius).reshape(height, width)
+
+    radius = 0
+    while ring.size and (max_radius is None or radius < max_radius):
+        radius += 1
+        reached = numpy.concatenate([neighbours(ring, dy, dx) for dy, dx in steps])
+        ring = numpy.unique(reached[distance[reached] == -1])
+        distance[ring] = radius
+
+    return distance.reshape(height, width)
+
+
+def _chamfer_transform(distance, ring, steps, neighbours, max_radius):
+    # Dijkstra with a bucket for each distance: the steps weigh 3 or 4, so
+    # the cells of a bucket are final once the buckets before it are done.
+    # 3 * max_radius + 1 is the furthest that rounds to max_radius
+    limit = None if max_radius is None else 3 * max_radius + 1
+    buckets = {0: [ring]}
+    current = 0
+    while buckets:
+        cells = numpy.unique(numpy.concatenate(buckets.pop(current)))
+        cells = cells[distance[cells] == current]  # not since reached by a shorter way
+        for dy, dx in steps:
+            weight = 4 if dy != 0 and dx != 0 else 3
+            reached_distance = current + weight
+            if limit is not None and reached_distance > limit:
+                continue
+            reached = neighbours(cells, dy, dx)
+            reached = reached[(distance[reached] == -1) | (distance[reached] > reached_distance)]
+            if reached.size:
+                distance[reached] = reached_distance
+                buckets.setdefault(reached_distance, []).append(reached)
+        current += 1
+        while buckets and current not in buckets:
+            current += 1
+
+    found = distance != -1
+    distance[found] = (distance[found] + 1) // 3
+    return distance
+
+
+def neighbour_table(width, height, diagonal=True, wrap=False):
+    """
+    List the neighbours of every cell of a map as a compressed sparse row
+    table: the neighbours of the cell at flat index i (y * width + x) are
+    indices[offsets[i]:offsets[i + 1]], in the order World.tiles_around
+    lists them. A whole neighbourhood can then be gathered with array
+    indexing instead of a call per cell.
+    :param diagonal: include the diagonal neighbours (8-connectivity)
+    :param wrap: if True, the map wraps around left to right and top to
+                 bottom; on very narrow maps a cell is listed only once
+    :return: offsets and indices, two int32 arrays
+    """
+    if diagonal:
+        steps = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1) if dx != 0 or dy != 0]
+    else:
+        steps = [(-1, 0), (0, -1), (0, 1), (1, 0)]
+
+    cells = numpy.arange(width * height)
+    y, x = numpy.divmod(cells, width)
+    candidates = numpy.empty((width * height, len(steps)), dtype=numpy.int64)
+    for slot, (dx, dy) in enumerate(steps):
+        nx = x + dx
+        ny = y + dy
+        if wrap:
+            candidates[:, slot] = (ny % height) * width + nx % width
+        else:
+            inside = (nx >= 0) & (nx < width) & (ny >= 0) & (ny < height)
+            candidates[:, slot] = numpy.where(inside, ny * width + nx, -1)
+
+    valid = candidates >= 0
+    if wrap:  # a neighbour met again across the border, or the cell itself
+        for slot in range(len(steps)):
+            column = candidates[:, slot : slot + 1]
+            valid[:, slot] &= (candidates[:, :slot] != column).all(axis=1) & (column[:, 0] != cells)
+
+    offsets = numpy.zeros(width * height + 1, dtype=numpy.int32)
+    numpy.cumsum(valid.sum(axis=1), out=offsets[1:])
+    return offsets, candidates[valid].astype(numpy.int32)
+
+
 def _equal(a, b):
     # This is probably not a very good idea.
     # TODO: Remove and replace calls with specific comparisons.
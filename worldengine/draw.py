@@ -92,6 +92,11 @@ _biome_colors = {
     "tropical very dry forest": (160, 255, 128),
 }
 
+# The red of the temperature classes and the blue (and green) of the humidity
+# classes, from polar to tropical and from superarid to superhumid
+_temperature_levels = (0, 42, 85, 128, 170, 213, 255)
+_humidity_levels = (32, 64, 96, 128, 160, 192, 224, 255)
+
 # These colors are used when drawing the satellite view map
 # The rgb values were hand-picked from an actual high-resolution
 # satellite map of earth. However, many values are either too similar
@@ -558,24 +563,11 @@ def draw_precipitation(world, target, black_and_white=False):
             for x in range(width):
                 target.set_pixel(x, y, (colors[y, x], colors[y, x], colors[y, x], 255))
     else:
+        colors = [(0, c, c, 255) for c in _humidity_levels]
+        humidity = world.humidity_class_map()
         for y in range(height):
             for x in range(width):
-                if world.is_humidity_superarid((x, y)):
-                    target.set_pixel(x, y, (0, 32, 32, 255))
-                elif world.is_humidity_perarid((x, y)):
-                    target.set_pixel(x, y, (0, 64, 64, 255))
-                elif world.is_humidity_arid((x, y)):
-                    target.set_pixel(x, y, (0, 96, 96, 255))
-                elif world.is_humidity_semiarid((x, y)):
-                    target.set_pixel(x, y, (0, 128, 128, 255))
-                elif world.is_humidity_subhumid((x, y)):
-                    target.set_pixel(x, y, (0, 160, 160, 255))
-                elif world.is_humidity_humid((x, y)):
-                    target.set_pixel(x, y, (0, 192, 192, 255))
-                elif world.is_humidity_perhumid((x, y)):
-                    target.set_pixel(x, y, (0, 224, 224, 255))
-                elif world.is_humidity_superhumid((x, y)):
-                    target.set_pixel(x, y, (0, 255, 255, 255))
+                target.set_pixel(x, y, colors[humidity[y, x]])
 
 
 def draw_world(world, target):
@@ -609,34 +601,23 @@ def draw_temperature_levels(world, target, black_and_white=False):
                 target.set_pixel(x, y, (colors[y, x], colors[y, x], colors[y, x], 255))
 
     else:
+        colors = [(r, 0, b, 255) for r, b in zip(_temperature_levels, reversed(_temperature_levels))]
+        temperature = world.temperature_class_map()
         for y in range(height):
             for x in range(width):
-                if world.is_temperature_polar((x, y)):
-                    target.set_pixel(x, y, (0, 0, 255, 255))
-                elif world.is_temperature_alpine((x, y)):
-                    target.set_pixel(x, y, (42, 0, 213, 255))
-                elif world.is_temperature_boreal((x, y)):
-                    target.set_pixel(x, y, (85, 0, 170, 255))
-                elif world.is_temperature_cool((x, y)):
-                    target.set_pixel(x, y, (128, 0, 128, 255))
-                elif world.is_temperature_warm((x, y)):
-                    target.set_pixel(x, y, (170, 0, 85, 255))
-                elif world.is_temperature_subtropical((x, y)):
-                    target.set_pixel(x, y, (213, 0, 42, 255))
-                elif world.is_temperature_tropical((x, y)):
-                    target.set_pixel(x, y, (255, 0, 0, 255))
+                target.set_pixel(x, y, colors[temperature[y, x]])
 
 
 def draw_biome(world, target):
     width = world.width
     height = world.height
 
-    biome = world.layers["biome"].data
+    biome = world.layers["biome"]
+    colors = [_biome_colors[name] + (255,) for name in biome.names]
 
     for y in range(height):
         for x in range(width):
-            v = biome[y, x]
-            target.set_pixel(x, y, _biome_colors[v])
+            target.set_pixel(x, y, colors[biome.data[y, x]])
 
 
 def draw_scatter_plot(world, size, target):
@@ -710,6 +691,8 @@ def draw_scatter_plot(world, size, target):
 
     # examine all cells in the map and if it is land get the temperature and
     # humidity for the cell.
+    temperature_classes = world.temperature_class_map()
+    humidity_classes = world.humidity_class_map()
     for y in range(world.height):
         for x in range(world.width):
             if world.is_land((x, y)):
@@ -717,36 +700,8 @@ def draw_scatter_plot(world, size, target):
                 p = world.humidity_at((x, y))
 
                 # get red and blue values depending on temperature and humidity
-                if world.is_temperature_polar((x, y)):
-                    r = 0
-                elif world.is_temperature_alpine((x, y)):
-                    r = 42
-                elif world.is_temperature_boreal((x, y)):
-                    r = 85
-                elif world.is_temperature_cool((x, y)):
-                    r = 128
-                elif world.is_temperature_warm((x, y)):
-                    r = 170
-                elif world.is_temperature_subtropical((x, y)):
-                    r = 213
-                elif world.is_temperature_tropical((x, y)):
-                    r = 255
-                if world.is_humidity_superarid((x, y)):
-                    b = 32
-                elif world.is_humidity_perarid((x, y)):
-                    b = 64
-                elif world.is_humidity_arid((x, y)):
-                    b = 96
-                elif world.is_humidity_semiarid((x, y)):
-                    b = 128
-                elif world.is_humidity_subhumid((x, y)):
-                    b = 160
-                elif world.is_humidity_humid((x, y)):
-                    b = 192
-                elif world.is_humidity_perhumid((x, y)):
-                    b = 224
-                elif world.is_humidity_superhumid((x, y)):
-                    b = 255
+                r = _temperature_levels[temperature_classes[y, x]]
+                b = _humidity_levels[humidity_classes[y, x]]
 
                 # calculate x and y position based on normalized temperature and humidity
                 nx = (size - 1) * ((t - min_temperature) / temperature_delta)
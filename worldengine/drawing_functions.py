@@ -80,12 +80,13 @@ def _build_biome_group_masks(world, factor):
     biome_groups = BiomeGroup.__subclasses__()
 
     biome_masks = {}
+    biome = world.layers["biome"]
 
     for group in biome_groups:
         group_mask = numpy.zeros((world.height, world.width), float)
 
-        for biome in group.__subclasses__():
-            group_mask[world.biome == _un_camelize(biome.__name__)] += 1.0
+        indices = [biome.names.index(_un_camelize(b.__name__)) for b in group.__subclasses__()]
+        group_mask[numpy.isin(biome.data, indices)] = 1.0
 
         group_mask[group_mask > 0] = count_neighbours(group_mask)[group_mask > 0]
 
@@ -465,8 +466,9 @@ def draw_ancientmap(
         start_time = time.time()
 
     # don't anti-alias the alpha channel
+    anti_aliased = numpy.empty(channels.shape[1:])
     for c in range(num_channels - 1):
-        channels[c] = anti_alias_channel(channels[c], 1)
+        channels[c] = anti_alias_channel(channels[c], 1, out=anti_aliased)
 
     # switch from channel major storage to pixel major storage
     for c in range(num_channels):
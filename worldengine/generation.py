@@ -1,9 +1,9 @@
 import numpy
-from noise import snoise2
 
-from worldengine.common import anti_alias, get_verbose
+from worldengine.common import anti_alias, distance_transform, flood_fill, get_verbose
 from worldengine.model.world import Step
-from worldengine.simulations.basic import find_threshold_f
+from worldengine.noise_field import snoise2_field
+from worldengine.simulations.basic import find_thresholds
 from worldengine.simulations.biome import BiomeSimulation
 from worldengine.simulations.erosion import ErosionSimulation
 from worldengine.simulations.humidity import HumiditySimulation
@@ -68,36 +68,19 @@ def place_oceans_at_map_borders(world):
 def add_noise_to_elevation(world, seed):
     octaves = 8
     freq = 16.0 * octaves
-    for y in range(world.height):
-        for x in range(world.width):
-            n = snoise2(x / freq * 2, y / freq * 2, octaves, base=seed)
-            world.layers["elevation"].data[y, x] += n
-
-
-def fill_ocean(elevation, sea_level):  # TODO: Make more use of numpy?
-    height, width = elevation.shape
-
-    ocean = numpy.zeros(elevation.shape, dtype=bool)
-    to_expand = []
-    for x in range(width):  # handle top and bottom border of the map
-        if elevation[0, x] <= sea_level:
-            to_expand.append((x, 0))
-        if elevation[height - 1, x] <= sea_level:
-            to_expand.append((x, height - 1))
-    for y in range(height):  # handle left- and rightmost border of the map
-        if elevation[y, 0] <= sea_level:
-            to_expand.append((0, y))
-        if elevation[y, width - 1] <= sea_level:
-            to_expand.append((width - 1, y))
-    for t in to_expand:
-        tx, ty = t
-        if not ocean[ty, tx]:
-            ocean[ty, tx] = True
-            for px, py in _around(tx, ty, width, height):
-                if not ocean[py, px] and elevation[py, px] <= sea_level:
-                    to_expand.append((px, py))
-
-    return ocean
+    xs = numpy.arange(world.width) / freq * 2
+    ys = numpy.arange(world.height) / freq * 2
+    world.layers["elevation"].data += snoise2_field(xs, ys, octaves, base=seed)
+
+
+def fill_ocean(elevation, sea_level):
+    """
+    The ocean is everything at or below sea level which is connected to
+    the border of the map.
+    """
+    border = numpy.ones(elevation.shape, dtype=bool)
+    border[1:-1, 1:-1] = False
+    return flood_fill(elevation <= sea_level, border)
 
 
 def initialize_ocean_and_thresholds(world, ocean_level=1.0):
@@ -109,8 +92,8 @@ def initialize_ocean_and_thresholds(world, ocean_level=1.0):
     """
     e = world.layers["elevation"].data
     ocean = fill_ocean(e, ocean_level)
-    hl = find_threshold_f(e, 0.10)  # the highest 10% of all (!) land are declared hills
-    ml = find_threshold_f(e, 0.03)  # the highest 3% are declared mountains
+    # the highest 10% of all (!) land are declared hills, the highest 3% mountains
+    hl, ml = find_thresholds(e, [0.10, 0.03])
     e_th = [("sea", ocean_level), ("plain", hl), ("hill", ml), ("mountain", None)]
     harmonize_ocean(ocean, e, ocean_level)
     world.ocean = ocean
@@ -142,49 +125,18 @@ def harmonize_ocean(ocean, elevation, ocean_level):
 
 
 def sea_depth(world, sea_level):
-    # a dynamic programming approach to gather how far the next land is
-    # from a given coordinate up to a maximum distance of max_radius
-    # result is 0 for land coordinates and -1 for coordinates further than
-    # max_radius away from land
-    # there might be even faster ways but it does the trick
-
-    def next_land_dynamic(ocean, max_radius=5):
-        next_land = numpy.full(ocean.shape, -1, int)
-
-        # non ocean tiles are zero distance away from next land
-        next_land[numpy.logical_not(ocean)] = 0
-
-        height, width = ocean.shape
-
-        for dist in range(max_radius):
-            indices = numpy.transpose(numpy.where(next_land == dist))
-            for y, x in indices:
-                for dy in range(-1, 2):
-                    ny = y + dy
-                    if 0 <= ny < height:
-                        for dx in range(-1, 2):
-                            nx = x + dx
-                            if 0 <= nx < width:
-                                if next_land[ny, nx] == -1:
-                                    next_land[ny, nx] = dist + 1
-        return next_land
-
     # We want to multiply the raw sea_depth by one of these factors
-    # depending on the distance from the next land
+    # depending on the distance from the next land (1 to 5 tiles away);
+    # land and tiles further away are left as they are
     # possible TODO: make this a parameter
-    factors = [0.0, 0.3, 0.5, 0.7, 0.9]
+    factors = numpy.array([1.0, 0.0, 0.3, 0.5, 0.7, 0.9, 1.0])
 
-    next_land = next_land_dynamic(world.layers["ocean"].data)
+    next_land = distance_transform(numpy.logical_not(world.layers["ocean"].data), max_radius=5)
 
     result = sea_level - world.layers["elevation"].data
+    result *= factors[next_land]  # -1 (too far away) picks the last factor
 
-    for y in range(world.height):
-        for x in range(world.width):
-            dist_to_next_land = next_land[y, x]
-            if dist_to_next_land > 0:
-                result[y, x] *= factors[dist_to_next_land - 1]
-
-    result = anti_alias(result, 10)
+    result = anti_alias(result, 10, method="fft")
 
     min_depth = result.min()
     max_depth = result.max()
@@ -193,16 +145,24 @@ def sea_depth(world, sea_level):
     return result
 
 
-def _around(x, y, width, height):
-    ps = []
-    for dx in range(-1, 2):
-        nx = x + dx
-        if 0 <= nx < width:
-            for dy in range(-1, 2):
-                ny = y + dy
-                if 0 <= ny < height and (dx != 0 or dy != 0):
-                    ps.append((nx, ny))
-    return ps
+def distance_to_coast(world, max_radius=None, metric="chessboard"):
+    """
+    How many tiles each ocean tile is away from the nearest land and each
+    land tile is away from the nearest ocean. Set it on the world to
+    have it saved along with the other layers:
+
+        world.distance_to_coast = distance_to_coast(world)
+
+    A diagonal step counts as one tile; metric "chamfer" measures close to
+    the Euclidean distance instead.
+    :param max_radius: see common.distance_transform
+    :param metric: see common.distance_transform
+    :return: an int32 array, -1 for tiles further than max_radius away from the coast
+    """
+    ocean = world.layers["ocean"].data
+    to_land = distance_transform(numpy.logical_not(ocean), max_radius, metric=metric)
+    to_ocean = distance_transform(ocean, max_radius, metric=metric)
+    return numpy.where(ocean, to_land, to_ocean)
 
 
 def generate_world(w, step):
@@ -1,7 +1,6 @@
 import h5py
 import numpy
 
-from worldengine.biome import biome_index_to_name, biome_name_to_index
 from worldengine.model.world import GenerationParameters, Size, Step, World
 from worldengine.version import __version__
 
@@ -34,9 +33,7 @@ def save_world_to_hdf5(world, filename):
 
     if world.has_biome():
         biome_data = f.create_dataset("biome", (world.height, world.width), dtype=numpy.uint16)
-        for y in range(world.height):
-            for x in range(world.width):
-                biome_data[y, x] = biome_name_to_index(world.layers["biome"].data[y][x])
+        biome_data.write_direct(world.layers["biome"].data.astype(numpy.uint16))
 
     if world.has_humidity():
         humidity_grp = f.create_group("humidity")
@@ -100,6 +97,10 @@ def save_world_to_hdf5(world, filename):
         river_map_data = f.create_dataset("river_map", (world.height, world.width), dtype=numpy.float64)
         river_map_data.write_direct(world.layers["river_map"].data)
 
+    if world.has_distance_to_coast():
+        distance_data = f.create_dataset("distance_to_coast", (world.height, world.width), dtype=numpy.int32)
+        distance_data.write_direct(numpy.ascontiguousarray(world.layers["distance_to_coast"].data, dtype=numpy.int32))
+
     generation_params_grp = f.create_group("generation_params")
     generation_params_grp["seed"] = world.seed
     generation_params_grp["n_plates"] = world.n_plates
@@ -157,15 +158,7 @@ def load_world_to_hdf5(filename):
 
     # Biome
     if "biome" in f.keys():
-        biome_data = []
-        for y in range(w.height):
-            row = []
-            for x in range(w.width):
-                value = f["biome"][y, x]
-                row.append(biome_index_to_name(value))
-            biome_data.append(row)
-        biome = numpy.array(biome_data, dtype=object)
-        w.biome = biome
+        w.biome = numpy.array(f["biome"])
 
     if "humidity" in f.keys():
         data, quantiles = _from_hdf5_matrix_with_quantiles(f["humidity"])
@@ -222,6 +215,9 @@ def load_world_to_hdf5(filename):
     if "river_map" in f.keys():
         w.rivermap = numpy.array(f["river_map"])
 
+    if "distance_to_coast" in f.keys():
+        w.distance_to_coast = numpy.array(f["distance_to_coast"])
+
     f.close()
 
     return w
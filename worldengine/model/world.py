@@ -1,11 +1,64 @@
+import mmap
+import operator
+
 import numpy
 
 import worldengine.protobuf.World_pb2 as Protobuf
-from worldengine.biome import Biome, Iceland, biome_index_to_name, biome_name_to_index
-from worldengine.common import _equal
+from worldengine.biome import BIOME_NAMES, Biome, Iceland, biome_name_to_index
+from worldengine.common import _equal, neighbour_table
 from worldengine.step import Step
 from worldengine.version import __version__
 
+# The classes of the class maps, in the order of their values
+ELEVATION_CLASSES = ("ocean", "plain", "hill", "low mountain", "mountain", "high mountain")
+TEMPERATURE_CLASSES = ("polar", "alpine", "boreal", "cool", "warm", "subtropical", "tropical")
+HUMIDITY_CLASSES = ("superarid", "perarid", "arid", "semiarid", "subhumid", "humid", "perhumid", "superhumid")
+WATERMAP_CLASSES = ("none", "creek", "river", "main river")
+
+# the humidity quantiles between the humidity classes, from the driest
+HUMIDITY_QUANTILES = ("87", "75", "62", "50", "37", "25", "12")
+
+
+def _band_map(data, bounds):
+    """The band of each value, as an if/elif chain over the bands
+    (-inf, bounds[0]), [bounds[0], bounds[1]), ..., [bounds[-1], inf) finds
+    it: the first band holding it. With sorted bounds that is where
+    numpy.digitize puts it, bounds out of order leave some bands empty or
+    overlapping. The bands cover every number, NaN gets the last band."""
+    bounds = list(bounds)
+    if all(a <= b for a, b in zip(bounds, bounds[1:])):
+        return numpy.digitize(data, bounds).astype(numpy.uint8)
+    lower = [-numpy.inf] + bounds
+    upper = bounds + [numpy.inf]
+    bands = [(lo <= data) & (data < hi) for lo, hi in zip(lower, upper)]
+    return numpy.select(bands, range(len(bands)), default=len(bounds)).astype(numpy.uint8)
+
+
+# The protobuf world format written by default: 1 stores the matrices cell by
+# cell, 2 stores each of them as one packed buffer. Both can be read, but
+# older releases and WorldEngine-Java only know format 1 (they would read a
+# format 2 file as a world with empty layers), so format 2 is opt-in.
+FORMAT_VERSION = 1
+
+# The layers of a protobuf world and the fields holding their matrices
+PROTOBUF_LAYERS = (
+    ("elevation", "heightMapData"),
+    ("plates", "plates"),
+    ("ocean", "ocean"),
+    ("sea_depth", "sea_depth"),
+    ("biome", "biome"),
+    ("humidity", "humidity"),
+    ("irrigation", "irrigation"),
+    ("permeability", "permeabilityData"),
+    ("watermap", "watermapData"),
+    ("precipitation", "precipitationData"),
+    ("temperature", "temperatureData"),
+    ("lake_map", "lakemap"),
+    ("river_map", "rivermap"),
+    ("icecap", "icecap"),
+    ("distance_to_coast", "distance_to_coast"),
+)
+
 
 class Size:
     def __init__(self, width, height):
@@ -73,6 +126,97 @@ class LayerWithQuantiles(Layer):
             return False
 
 
+class LayerWithNames(Layer):
+    """A layer of categories: data holds the index of the name of each cell."""
+
+    def __init__(self, data, names):
+        Layer.__init__(self, data)
+        self.names = names
+
+    def __eq__(self, other):
+        if isinstance(other, self.__class__):
+            return _equal(self.data, other.data) and _equal(self.names, other.names)
+        else:
+            return False
+
+    def labels(self):
+        """The names of the cells."""
+        return numpy.array(self.names, dtype=object)[self.data]
+
+
+class LazyLayers(dict):
+    """The layers of a world, some of them decoded only on their first
+    access. loaders maps the names of those layers to functions setting
+    them in the world. Checking whether a layer is there does not decode it,
+    going over all the layers decodes them all."""
+
+    def __init__(self, loaders=None):
+        dict.__init__(self)
+        self._loaders = dict(loaders or {})
+
+    def pending(self):
+        """The names of the layers not decoded yet."""
+        return list(self._loaders)
+
+    def load(self):
+        for name in self.pending():
+            self[name]
+
+    def __missing__(self, name):
+        if name not in self._loaders:
+            raise KeyError(name)
+        self._loaders[name]()
+        return dict.__getitem__(self, name)
+
+    def __setitem__(self, name, layer):
+        self._loaders.pop(name, None)
+        dict.__setitem__(self, name, layer)
+
+    def __delitem__(self, name):
+        if self._loaders.pop(name, None) is None:
+            dict.__delitem__(self, name)
+
+    def __contains__(self, name):
+        return name in self._loaders or dict.__contains__(self, name)
+
+    def __len__(self):
+        return len(self._loaders) + dict.__len__(self)
+
+    def __iter__(self):
+        self.load()
+        return dict.__iter__(self)
+
+    def __eq__(self, other):
+        self.load()
+        return dict.__eq__(self, other)
+
+    def get(self, name, default=None):
+        return self[name] if name in self else default
+
+    def pop(self, name, *default):
+        if name in self:
+            layer = self[name]
+            del self[name]
+            return layer
+        return dict.pop(self, name, *default)
+
+    def keys(self):
+        self.load()
+        return dict.keys(self)
+
+    def values(self):
+        self.load()
+        return dict.values(self)
+
+    def items(self):
+        self.load()
+        return dict.items(self)
+
+    def copy(self):
+        self.load()
+        return dict(self)
+
+
 class World:
     """A world composed by name, dimensions and all the characteristics of
     each cell.
@@ -100,6 +244,8 @@ class World:
         self.generation_params = generation_params
 
         self.layers = {}
+        self._neighbour_tables = {}  # built on demand, see neighbour_table
+        self._class_maps = {}  # built on demand, see elevation_class_map etc.
 
         # Deprecated
         self.width = size.width
@@ -113,7 +259,11 @@ class World:
     #
 
     def __eq__(self, other):
-        return _equal(self.__dict__, other.__dict__)
+        # the cached neighbour tables and class maps are not part of the world
+        cached = ("_neighbour_tables", "_class_maps")
+        mine = {k: v for k, v in self.__dict__.items() if k not in cached}
+        others = {k: v for k, v in other.__dict__.items() if k not in cached}
+        return _equal(mine, others)
 
     #
     # Serialization / Unserialization
@@ -128,28 +278,38 @@ class World:
             instance.__dict__[k] = in_dict[k]
         return instance
 
-    def protobuf_serialize(self):
-        p_world = self._to_protobuf_world()
+    def protobuf_serialize(self, format_version=FORMAT_VERSION):
+        p_world = self._to_protobuf_world(format_version)
         return p_world.SerializeToString()
 
-    def protobuf_to_file(self, filename):
+    def protobuf_to_file(self, filename, format_version=FORMAT_VERSION):
         with open(filename, "wb") as f:
-            f.write(self.protobuf_serialize())
+            f.write(self.protobuf_serialize(format_version))
 
     @staticmethod
-    def open_protobuf(filename):
+    def open_protobuf(filename, lazy=False):
+        """Load a world. A lazy one maps the file into memory and decodes
+        its layers on their first access (see LazyLayers)."""
         with open(filename, "rb") as f:
+            if lazy:
+                return World.protobuf_unserialize(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), lazy=True)
             content = f.read()
             return World.protobuf_unserialize(content)
 
     @classmethod
-    def protobuf_unserialize(cls, serialized):
+    def protobuf_unserialize(cls, serialized, lazy=False):
+        if lazy:
+            return World._from_protobuf_buffer_lazy(serialized)
         p_world = Protobuf.World()
         p_world.ParseFromString(serialized)
         return World._from_protobuf_world(p_world)
 
     @staticmethod
-    def _to_protobuf_matrix(matrix, p_matrix, transformation=None):
+    def _to_protobuf_matrix(matrix, p_matrix, transformation=None, packed=False):
+        if packed:
+            World._to_protobuf_packed(matrix, p_matrix.packed)
+            return
+
         m = matrix
         if transformation is not None:
             t = numpy.vectorize(transformation)
@@ -165,6 +325,17 @@ class World:
             """
             p_row.cells.extend(row.tolist())
 
+    @staticmethod
+    def _to_protobuf_packed(matrix, p_packed):
+        """Store the matrix in one buffer of little-endian values."""
+        m = numpy.asarray(matrix)
+        if m.dtype.kind not in "biuf":
+            raise Exception("Cannot pack a matrix of %s" % m.dtype)
+        m = m.astype(m.dtype.newbyteorder("<"), copy=False)
+        p_packed.dtype = m.dtype.str
+        p_packed.shape.extend(m.shape)
+        p_packed.data = m.tobytes()
+
     @staticmethod
     def _to_protobuf_quantiles(quantiles, p_quantiles):
         for k in quantiles:
@@ -174,9 +345,9 @@ class World:
             entry.value = v
 
     @staticmethod
-    def _to_protobuf_matrix_with_quantiles(matrix, p_matrix):
+    def _to_protobuf_matrix_with_quantiles(matrix, p_matrix, packed=False):
         World._to_protobuf_quantiles(matrix.quantiles, p_matrix.quantiles)
-        World._to_protobuf_matrix(matrix.data, p_matrix)
+        World._to_protobuf_matrix(matrix.data, p_matrix, packed=packed)
 
     @staticmethod
     def _from_protobuf_matrix(p_matrix, transformation=None):
@@ -191,6 +362,20 @@ class World:
             matrix.append(row)
         return matrix
 
+    @staticmethod
+    def _has_protobuf_matrix(p_matrix):
+        return p_matrix.HasField("packed") or len(p_matrix.rows) > 0
+
+    @staticmethod
+    def _from_protobuf_array(p_matrix, dtype=None):
+        """The matrix as a numpy array, whether it is packed or stored row
+        by row. A packed one keeps the dtype it was saved with and is a
+        read-only view of the buffer."""
+        if p_matrix.HasField("packed"):
+            p_packed = p_matrix.packed
+            return numpy.frombuffer(p_packed.data, dtype=numpy.dtype(p_packed.dtype)).reshape(tuple(p_packed.shape))
+        return numpy.array(World._from_protobuf_matrix(p_matrix), dtype=dtype)
+
     @staticmethod
     def _from_protobuf_quantiles(p_quantiles):
         quantiles = {}
@@ -200,7 +385,7 @@ class World:
 
     @staticmethod
     def _from_protobuf_matrix_with_quantiles(p_matrix):
-        data = World._from_protobuf_matrix(p_matrix)
+        data = World._from_protobuf_array(p_matrix)
         quantiles = World._from_protobuf_quantiles(p_matrix.quantiles)
         return data, quantiles
 
@@ -213,11 +398,17 @@ class World:
         parts = __version__.split(".")
         return int(parts[0]) * (256**3) + int(parts[1]) * (256**2) + int(parts[2]) * (256**1)
 
-    def _to_protobuf_world(self):
+    def _to_protobuf_world(self, format_version=FORMAT_VERSION):
+        if format_version not in (1, 2):
+            raise ValueError("Unknown world format %s" % format_version)
+        packed = format_version == 2
+
         p_world = Protobuf.World()
 
         p_world.worldengine_tag = World.worldengine_tag()
         p_world.worldengine_version = self.__version_hashcode__()
+        if packed:
+            p_world.format_version = format_version
 
         p_world.name = self.name
         p_world.width = self.width
@@ -229,51 +420,51 @@ class World:
         p_world.generationData.step = self.step.name
 
         # Elevation
-        self._to_protobuf_matrix(self.layers["elevation"].data, p_world.heightMapData)
+        self._to_protobuf_matrix(self.layers["elevation"].data, p_world.heightMapData, packed=packed)
         p_world.heightMapTh_sea = self.layers["elevation"].thresholds[0][1]
         p_world.heightMapTh_plain = self.layers["elevation"].thresholds[1][1]
         p_world.heightMapTh_hill = self.layers["elevation"].thresholds[2][1]
 
         # Plates
-        self._to_protobuf_matrix(self.layers["plates"].data, p_world.plates)
+        self._to_protobuf_matrix(self.layers["plates"].data, p_world.plates, packed=packed)
 
         # Ocean
-        self._to_protobuf_matrix(self.layers["ocean"].data, p_world.ocean)
-        self._to_protobuf_matrix(self.layers["sea_depth"].data, p_world.sea_depth)
+        self._to_protobuf_matrix(self.layers["ocean"].data, p_world.ocean, packed=packed)
+        self._to_protobuf_matrix(self.layers["sea_depth"].data, p_world.sea_depth, packed=packed)
 
         if self.has_biome():
-            self._to_protobuf_matrix(self.layers["biome"].data, p_world.biome, biome_name_to_index)
+            self._to_protobuf_matrix(self.layers["biome"].data, p_world.biome, packed=packed)
 
         if self.has_humidity():
-            self._to_protobuf_matrix_with_quantiles(self.layers["humidity"], p_world.humidity)
+            self._to_protobuf_matrix_with_quantiles(self.layers["humidity"], p_world.humidity, packed=packed)
 
         if self.has_irrigation():
-            self._to_protobuf_matrix(self.layers["irrigation"].data, p_world.irrigation)
+            self._to_protobuf_matrix(self.layers["irrigation"].data, p_world.irrigation, packed=packed)
 
         if self.has_permeability():
-            self._to_protobuf_matrix(self.layers["permeability"].data, p_world.permeabilityData)
+            self._to_protobuf_matrix(self.layers["permeability"].data, p_world.permeabilityData, packed=packed)
             p_world.permeability_low = self.layers["permeability"].thresholds[0][1]
             p_world.permeability_med = self.layers["permeability"].thresholds[1][1]
 
         if self.has_watermap():
-            self._to_protobuf_matrix(self.layers["watermap"].data, p_world.watermapData)
+            self._to_protobuf_matrix(self.layers["watermap"].data, p_world.watermapData, packed=packed)
             p_world.watermap_creek = self.layers["watermap"].thresholds["creek"]
             p_world.watermap_river = self.layers["watermap"].thresholds["river"]
             p_world.watermap_mainriver = self.layers["watermap"].thresholds["main river"]
 
         if self.has_lakemap():
-            self._to_protobuf_matrix(self.layers["lake_map"].data, p_world.lakemap)
+            self._to_protobuf_matrix(self.layers["lake_map"].data, p_world.lakemap, packed=packed)
 
         if self.has_rivermap():
-            self._to_protobuf_matrix(self.layers["river_map"].data, p_world.rivermap)
+            self._to_protobuf_matrix(self.layers["river_map"].data, p_world.rivermap, packed=packed)
 
         if self.has_precipitations():
-            self._to_protobuf_matrix(self.layers["precipitation"].data, p_world.precipitationData)
+            self._to_protobuf_matrix(self.layers["precipitation"].data, p_world.precipitationData, packed=packed)
             p_world.precipitation_low = self.layers["precipitation"].thresholds[0][1]
             p_world.precipitation_med = self.layers["precipitation"].thresholds[1][1]
 
         if self.has_temperature():
-            self._to_protobuf_matrix(self.layers["temperature"].data, p_world.temperatureData)
+            self._to_protobuf_matrix(self.layers["temperature"].data, p_world.temperatureData, packed=packed)
             p_world.temperature_polar = self.layers["temperature"].thresholds[0][1]
             p_world.temperature_alpine = self.layers["temperature"].thresholds[1][1]
             p_world.temperature_boreal = self.layers["temperature"].thresholds[2][1]
@@ -282,13 +473,17 @@ class World:
             p_world.temperature_subtropical = self.layers["temperature"].thresholds[5][1]
 
         if self.has_icecap():
-            self._to_protobuf_matrix(self.layers["icecap"].data, p_world.icecap)
+            self._to_protobuf_matrix(self.layers["icecap"].data, p_world.icecap, packed=packed)
+
+        if self.has_distance_to_coast():
+            self._to_protobuf_matrix(self.layers["distance_to_coast"].data, p_world.distance_to_coast, packed=packed)
 
         return p_world
 
-    @classmethod
-    def _from_protobuf_world(cls, p_world):
-        w = World(
+    @staticmethod
+    def _from_protobuf_header(p_world):
+        """The world without its layers."""
+        return World(
             p_world.name,
             Size(p_world.width, p_world.height),
             p_world.generationData.seed,
@@ -299,54 +494,48 @@ class World:
             ),
         )
 
-        # Elevation
-        e = numpy.array(World._from_protobuf_matrix(p_world.heightMapData))
-        e_th = [
-            ("sea", p_world.heightMapTh_sea),
-            ("plain", p_world.heightMapTh_plain),
-            ("hill", p_world.heightMapTh_hill),
-            ("mountain", None),
-        ]
-        w.elevation = (e, e_th)
-
-        # Plates
-        w.plates = numpy.array(World._from_protobuf_matrix(p_world.plates))
-
-        # Ocean
-        w.ocean = numpy.array(World._from_protobuf_matrix(p_world.ocean))
-        w.sea_depth = numpy.array(World._from_protobuf_matrix(p_world.sea_depth))
-
-        # Biome
-        if p_world.biome.rows:
-            w.biome = numpy.array(World._from_protobuf_matrix(p_world.biome, biome_index_to_name), dtype=object)
-
-        # Humidity
-        if p_world.humidity.rows:
-            w.humidity = World._from_protobuf_matrix_with_quantiles(p_world.humidity)
-
-        if p_world.irrigation.rows:
-            w.irrigation = numpy.array(World._from_protobuf_matrix(p_world.irrigation))
-
-        if p_world.permeabilityData.rows:
-            p = numpy.array(World._from_protobuf_matrix(p_world.permeabilityData))
+    @staticmethod
+    def _set_protobuf_layer(w, name, p_world, p_matrix):
+        """Set the layer from its matrix, the thresholds and quantiles come
+        from p_world."""
+        if name == "elevation":
+            e = World._from_protobuf_array(p_matrix)
+            e_th = [
+                ("sea", p_world.heightMapTh_sea),
+                ("plain", p_world.heightMapTh_plain),
+                ("hill", p_world.heightMapTh_hill),
+                ("mountain", None),
+            ]
+            w.elevation = (e, e_th)
+        elif name == "plates":
+            w.plates = World._from_protobuf_array(p_matrix)
+        elif name == "ocean":
+            w.ocean = World._from_protobuf_array(p_matrix)
+        elif name == "sea_depth":
+            w.sea_depth = World._from_protobuf_array(p_matrix)
+        elif name == "biome":
+            w.biome = World._from_protobuf_array(p_matrix, dtype=numpy.uint8)
+        elif name == "humidity":
+            w.humidity = World._from_protobuf_matrix_with_quantiles(p_matrix)
+        elif name == "irrigation":
+            w.irrigation = World._from_protobuf_array(p_matrix)
+        elif name == "permeability":
+            p = World._from_protobuf_array(p_matrix)
             p_th = [("low", p_world.permeability_low), ("med", p_world.permeability_med), ("hig", None)]
             w.permeability = (p, p_th)
-
-        if p_world.watermapData.rows:
-            data = numpy.array(World._from_protobuf_matrix(p_world.watermapData))
+        elif name == "watermap":
+            data = World._from_protobuf_array(p_matrix)
             thresholds = {}
             thresholds["creek"] = p_world.watermap_creek
             thresholds["river"] = p_world.watermap_river
             thresholds["main river"] = p_world.watermap_mainriver
             w.watermap = (data, thresholds)
-
-        if p_world.precipitationData.rows:
-            p = numpy.array(World._from_protobuf_matrix(p_world.precipitationData))
+        elif name == "precipitation":
+            p = World._from_protobuf_array(p_matrix)
             p_th = [("low", p_world.precipitation_low), ("med", p_world.precipitation_med), ("hig", None)]
             w.precipitation = (p, p_th)
-
-        if p_world.temperatureData.rows:
-            t = numpy.array(World._from_protobuf_matrix(p_world.temperatureData))
+        elif name == "temperature":
+            t = World._from_protobuf_array(p_matrix)
             t_th = [
                 ("polar", p_world.temperature_polar),
                 ("alpine", p_world.temperature_alpine),
@@ -357,16 +546,96 @@ class World:
                 ("tropical", None),
             ]
             w.temperature = (t, t_th)
+        elif name == "lake_map":
+            w.lakemap = World._from_protobuf_array(p_matrix)
+        elif name == "river_map":
+            w.rivermap = World._from_protobuf_array(p_matrix)
+        elif name == "icecap":
+            w.icecap = World._from_protobuf_array(p_matrix)
+        elif name == "distance_to_coast":
+            w.distance_to_coast = World._from_protobuf_array(p_matrix, dtype=numpy.int32)
+        else:
+            raise ValueError("Unknown layer %s" % name)
 
-        if p_world.lakemap.rows:
-            w.lakemap = numpy.array(World._from_protobuf_matrix(p_world.lakemap))
-
-        if p_world.rivermap.rows:
-            w.rivermap = numpy.array(World._from_protobuf_matrix(p_world.rivermap))
+    @classmethod
+    def _from_protobuf_world(cls, p_world):
+        w = World._from_protobuf_header(p_world)
+        for name, field in PROTOBUF_LAYERS:
+            p_matrix = getattr(p_world, field)
+            if World._has_protobuf_matrix(p_matrix):
+                World._set_protobuf_layer(w, name, p_world, p_matrix)
+        return w
 
-        if p_world.icecap.rows:
-            w.icecap = numpy.array(World._from_protobuf_matrix(p_world.icecap))
+    @staticmethod
+    def _protobuf_fields(buffer):
+        """The top-level fields of a serialized message, without decoding
+        them: (number, start, payload start, end) for each of them."""
+
+        def varint(pos):
+            value, shift = 0, 0
+            while True:
+                byte = buffer[pos]
+                pos += 1
+                value |= (byte & 0x7F) << shift
+                if byte < 128:
+                    return value, pos
+                shift += 7
+
+        fields = []
+        pos = 0
+        while pos < len(buffer):
+            start = pos
+            key, pos = varint(pos)
+            wire_type = key & 7
+            payload = pos
+            if wire_type == 0:
+                _, pos = varint(pos)
+            elif wire_type == 1:
+                pos += 8
+            elif wire_type == 2:
+                length, payload = varint(pos)
+                pos = payload + length
+            elif wire_type == 5:
+                pos += 4
+            else:
+                raise Exception("Unsupported wire type %i" % wire_type)
+            fields.append((key >> 3, start, payload, pos))
+        return fields
 
+    @staticmethod
+    def _from_protobuf_buffer_lazy(buffer):
+        """The world of a serialized message, with the layers decoded on
+        their first access. Only the header fields (name, size, generation
+        data, thresholds and the like) are parsed here."""
+        view = memoryview(buffer)
+        layer_fields = {
+            Protobuf.World.DESCRIPTOR.fields_by_name[field].number: (name, field) for name, field in PROTOBUF_LAYERS
+        }
+
+        p_header = Protobuf.World()
+        payloads = {}
+        for number, start, payload, end in World._protobuf_fields(view):
+            if number in layer_fields:
+                payloads.setdefault(number, []).append(view[payload:end])
+            else:
+                p_header.MergeFromString(view[start:end])
+        w = World._from_protobuf_header(p_header)
+
+        def loader(name, field, chunks):
+            def load():
+                p_matrix = getattr(Protobuf.World(), field)
+                # a message can come in parts, they are merged
+                for chunk in chunks:
+                    p_matrix.MergeFromString(chunk)
+                World._set_protobuf_layer(w, name, p_header, p_matrix)
+
+            return load
+
+        loaders = {}
+        for number, chunks in payloads.items():
+            name, field = layer_fields[number]
+            loaders[name] = loader(name, field, chunks)
+        w.layers = LazyLayers(loaders)
         return w
 
     #
@@ -391,9 +660,10 @@ class World:
 
         result = numpy.zeros(num_samples * 2, dtype=int)
 
-        for i in range(0, num_samples * 2, 2):
-            r_num = numpy.random.randint(0, len(land_indices))  # uses global RNG
-            result[i + 1], result[i] = land_indices[r_num]
+        # draws the same numbers one call per sample would
+        r_nums = numpy.random.randint(0, len(land_indices), size=num_samples)  # uses global RNG
+        result[1::2] = land_indices[r_nums, 0]
+        result[0::2] = land_indices[r_nums, 1]
 
         return result
 
@@ -407,10 +677,106 @@ class World:
     def sea_level(self):
         return self.layers["elevation"].thresholds[0][1]
 
+    #
+    # Class maps
+    #
+
+    def _cached_class_map(self, name, sources):
+        """The class map name if it was computed from these sources (the
+        layers, their data and their thresholds, the same objects), else
+        None. Changes made within them are not noticed, see
+        invalidate_class_maps."""
+        cached = self._class_maps.get(name)
+        if cached is not None and all(map(operator.is_, cached[0], sources)):
+            return cached[1]
+        return None
+
+    def invalidate_class_maps(self):
+        """Forget the class maps, needed after changing the data or the
+        thresholds of a layer in place."""
+        self._class_maps = {}
+
+    def elevation_class_map(self):
+        """The ELEVATION_CLASSES of the cells, as indices."""
+        layer = self.layers["elevation"]
+        ocean = self.layers["ocean"]
+        sources = (layer, layer.data, layer.thresholds, ocean, ocean.data)
+        classes = self._cached_class_map("elevation", sources)
+        if classes is None:
+            e = layer.data
+            hill_level = layer.thresholds[1 if len(layer.thresholds) == 4 else 0][1]
+            mountain_level = self.get_mountain_level()
+            mountains = e > mountain_level
+            classes = numpy.ones(e.shape, dtype=numpy.uint8)
+            classes[(hill_level < e) & (e < mountain_level)] = 2
+            classes[mountains] = 4
+            classes[mountains & (e < mountain_level + 2.0)] = 3
+            classes[mountains & (e > mountain_level + 4.0)] = 5
+            classes[ocean.data] = 0
+            self._class_maps["elevation"] = (sources, classes)
+        return classes
+
+    def _temperature_bounds(self):
+        return [th for _, th in self.layers["temperature"].thresholds[: len(TEMPERATURE_CLASSES) - 1]]
+
+    def _humidity_bounds(self):
+        return [self.layers["humidity"].quantiles[q] for q in HUMIDITY_QUANTILES]
+
+    @staticmethod
+    def _is_in_band(value, bounds, k):
+        """Whether the value is in band k (see _band_map)."""
+        return (k == 0 or value >= bounds[k - 1]) and (k == len(bounds) or value < bounds[k])
+
+    def temperature_class_map(self):
+        """The TEMPERATURE_CLASSES of the cells, as indices. A class starts
+        at its threshold, with thresholds out of order a cell gets the first
+        class it is in."""
+        layer = self.layers["temperature"]
+        sources = (layer, layer.data, layer.thresholds)
+        classes = self._cached_class_map("temperature", sources)
+        if classes is None:
+            classes = _band_map(layer.data, self._temperature_bounds())
+            self._class_maps["temperature"] = (sources, classes)
+        return classes
+
+    def humidity_class_map(self):
+        """The HUMIDITY_CLASSES of the cells, as indices. A class starts at
+        its quantile, with quantiles out of order a cell gets the first class
+        it is in."""
+        layer = self.layers["humidity"]
+        sources = (layer, layer.data, layer.quantiles)
+        classes = self._cached_class_map("humidity", sources)
+        if classes is None:
+            classes = _band_map(layer.data, self._humidity_bounds())
+            self._class_maps["humidity"] = (sources, classes)
+        return classes
+
+    def watermap_class_map(self):
+        """The WATERMAP_CLASSES of the cells, as indices."""
+        layer = self.layers["watermap"]
+        sources = (layer, layer.data, layer.thresholds)
+        classes = self._cached_class_map("watermap", sources)
+        if classes is None:
+            classes = _band_map(layer.data, [layer.thresholds[c] for c in WATERMAP_CLASSES[1:]])
+            self._class_maps["watermap"] = (sources, classes)
+        return classes
+
     #
     # Tiles around
     #
 
+    def neighbour_table(self, diagonal=True, wrap=False):
+        """The neighbours of all the cells as a compressed sparse row table,
+        see common.neighbour_table. Built the first time it is asked for and
+        kept until the size of the world changes."""
+        key = (self.width, self.height, diagonal, wrap)
+        if key not in self._neighbour_tables:
+            self._neighbour_tables = {
+                k: table for k, table in self._neighbour_tables.items() if k[:2] == (self.width, self.height)
+            }
+            self._neighbour_tables[key] = neighbour_table(self.width, self.height, diagonal, wrap)
+        return self._neighbour_tables[key]
+
     def tiles_around(self, pos, radius=1, predicate=None):
         ps = []
         x, y = pos
@@ -439,22 +805,10 @@ class World:
         return self.layers["elevation"].thresholds[mi][1]
 
     def is_mountain(self, pos):
-        if self.is_ocean(pos):
-            return False
-        x, y = pos
-
-        return self.layers["elevation"].data[y][x] > self.get_mountain_level()
+        return self.elevation_class_map().item(pos[1], pos[0]) >= 3
 
     def is_low_mountain(self, pos):
-        if not self.is_mountain(pos):
-            return False
-        if len(self.layers["elevation"].thresholds) == 4:
-            mi = 2
-        else:
-            mi = 1
-        mountain_level = self.layers["elevation"].thresholds[mi][1]
-        x, y = pos
-        return self.layers["elevation"].data[y, x] < mountain_level + 2.0
+        return self.elevation_class_map().item(pos[1], pos[0]) == 3
 
     def level_of_mountain(self, pos):
         mountain_level = self.get_mountain_level()
@@ -465,27 +819,10 @@ class World:
             return self.layers["elevation"].data[y, x] - mountain_level
 
     def is_high_mountain(self, pos):
-        if not self.is_mountain(pos):
-            return False
-        if len(self.layers["elevation"].thresholds) == 4:
-            mi = 2
-        else:
-            mi = 1
-        mountain_level = self.layers["elevation"].thresholds[mi][1]
-        x, y = pos
-        return self.layers["elevation"].data[y, x] > mountain_level + 4.0
+        return self.elevation_class_map().item(pos[1], pos[0]) == 5
 
     def is_hill(self, pos):
-        if self.is_ocean(pos):
-            return False
-        if len(self.layers["elevation"].thresholds) == 4:
-            hi = 1
-        else:
-            hi = 0
-        hill_level = self.layers["elevation"].thresholds[hi][1]
-        mountain_level = self.layers["elevation"].thresholds[hi + 1][1]
-        x, y = pos
-        return hill_level < self.layers["elevation"].data[y, x] < mountain_level
+        return self.elevation_class_map().item(pos[1], pos[0]) == 2
 
     def elevation_at(self, pos):
         return self.layers["elevation"].data[pos[1], pos[0]]
@@ -505,52 +842,33 @@ class World:
     # Temperature
     #
 
+    def _is_temperature_class(self, pos, k):
+        c = self.temperature_class_map().item(pos[1], pos[0])
+        if c >= k:
+            return c == k
+        # an earlier class can overlap class k when the thresholds are out of order
+        return self._is_in_band(self.temperature_at(pos), self._temperature_bounds(), k)
+
     def is_temperature_polar(self, pos):
-        th_max = self.layers["temperature"].thresholds[0][1]
-        x, y = pos
-        t = self.layers["temperature"].data[y, x]
-        return t < th_max
+        return self._is_temperature_class(pos, 0)
 
     def is_temperature_alpine(self, pos):
-        th_min = self.layers["temperature"].thresholds[0][1]
-        th_max = self.layers["temperature"].thresholds[1][1]
-        x, y = pos
-        t = self.layers["temperature"].data[y, x]
-        return th_max > t >= th_min
+        return self._is_temperature_class(pos, 1)
 
     def is_temperature_boreal(self, pos):
-        th_min = self.layers["temperature"].thresholds[1][1]
-        th_max = self.layers["temperature"].thresholds[2][1]
-        x, y = pos
-        t = self.layers["temperature"].data[y, x]
-        return th_max > t >= th_min
+        return self._is_temperature_class(pos, 2)
 
     def is_temperature_cool(self, pos):
-        th_min = self.layers["temperature"].thresholds[2][1]
-        th_max = self.layers["temperature"].thresholds[3][1]
-        x, y = pos
-        t = self.layers["temperature"].data[y, x]
-        return th_max > t >= th_min
+        return self._is_temperature_class(pos, 3)
 
     def is_temperature_warm(self, pos):
-        th_min = self.layers["temperature"].thresholds[3][1]
-        th_max = self.layers["temperature"].thresholds[4][1]
-        x, y = pos
-        t = self.layers["temperature"].data[y, x]
-        return th_max > t >= th_min
+        return self._is_temperature_class(pos, 4)
 
     def is_temperature_subtropical(self, pos):
-        th_min = self.layers["temperature"].thresholds[4][1]
-        th_max = self.layers["temperature"].thresholds[5][1]
-        x, y = pos
-        t = self.layers["temperature"].data[y, x]
-        return th_max > t >= th_min
+        return self._is_temperature_class(pos, 5)
 
     def is_temperature_tropical(self, pos):
-        th_min = self.layers["temperature"].thresholds[5][1]
-        x, y = pos
-        t = self.layers["temperature"].data[y, x]
-        return t >= th_min
+        return self._is_temperature_class(pos, 6)
 
     def temperature_at(self, pos):
         x, y = pos
@@ -573,85 +891,56 @@ class World:
         t = self.layers["humidity"].data[y, x]
         return t >= th
 
+    def _is_humidity_class(self, pos, k):
+        c = self.humidity_class_map().item(pos[1], pos[0])
+        if c >= k:
+            return c == k
+        # an earlier class can overlap class k when the quantiles are out of order
+        return self._is_in_band(self.humidity_at(pos), self._humidity_bounds(), k)
+
     def is_humidity_superarid(self, pos):
-        th_max = self.layers["humidity"].quantiles["87"]
-        x, y = pos
-        t = self.layers["humidity"].data[y, x]
-        return t < th_max
+        return self._is_humidity_class(pos, 0)
 
     def is_humidity_perarid(self, pos):
-        th_min = self.layers["humidity"].quantiles["87"]
-        th_max = self.layers["humidity"].quantiles["75"]
-        x, y = pos
-        t = self.layers["humidity"].data[y, x]
-        return th_max > t >= th_min
+        return self._is_humidity_class(pos, 1)
 
     def is_humidity_arid(self, pos):
-        th_min = self.layers["humidity"].quantiles["75"]
-        th_max = self.layers["humidity"].quantiles["62"]
-        x, y = pos
-        t = self.layers["humidity"].data[y, x]
-        return th_max > t >= th_min
+        return self._is_humidity_class(pos, 2)
 
     def is_humidity_semiarid(self, pos):
-        th_min = self.layers["humidity"].quantiles["62"]
-        th_max = self.layers["humidity"].quantiles["50"]
-        x, y = pos
-        t = self.layers["humidity"].data[y, x]
-        return th_max > t >= th_min
+        return self._is_humidity_class(pos, 3)
 
     def is_humidity_subhumid(self, pos):
-        th_min = self.layers["humidity"].quantiles["50"]
-        th_max = self.layers["humidity"].quantiles["37"]
-        x, y = pos
-        t = self.layers["humidity"].data[y, x]
-        return th_max > t >= th_min
+        return self._is_humidity_class(pos, 4)
 
     def is_humidity_humid(self, pos):
-        th_min = self.layers["humidity"].quantiles["37"]
-        th_max = self.layers["humidity"].quantiles["25"]
-        x, y = pos
-        t = self.layers["humidity"].data[y, x]
-        return th_max > t >= th_min
+        return self._is_humidity_class(pos, 5)
 
     def is_humidity_perhumid(self, pos):
-        th_min = self.layers["humidity"].quantiles["25"]
-        th_max = self.layers["humidity"].quantiles["12"]
-        x, y = pos
-        t = self.layers["humidity"].data[y, x]
-        return th_max > t >= th_min
+        return self._is_humidity_class(pos, 6)
 
     def is_humidity_superhumid(self, pos):
-        th_min = self.layers["humidity"].quantiles["12"]
-        x, y = pos
-        t = self.layers["humidity"].data[y, x]
-        return t >= th_min
+        return self._is_humidity_class(pos, 7)
 
     #
     # Streams
     #
 
     def contains_stream(self, pos):
-        return self.contains_creek(pos) or self.contains_river(pos) or self.contains_main_river(pos)
+        return self.watermap_class_map().item(pos[1], pos[0]) > 0
 
     def contains_creek(self, pos):
-        x, y = pos
-        v = self.watermap["data"][y, x]
-        return self.watermap["thresholds"]["creek"] <= v < self.watermap["thresholds"]["river"]
+        return self.watermap_class_map().item(pos[1], pos[0]) == 1
 
     def contains_river(self, pos):
-        x, y = pos
-        v = self.watermap["data"][y, x]
-        return self.watermap["thresholds"]["river"] <= v < self.watermap["thresholds"]["main river"]
+        return self.watermap_class_map().item(pos[1], pos[0]) == 2
 
     def contains_main_river(self, pos):
-        x, y = pos
-        v = self.watermap["data"][y, x]
-        return v >= self.watermap["thresholds"]["main river"]
+        return self.watermap_class_map().item(pos[1], pos[0]) == 3
 
     def watermap_at(self, pos):
         x, y = pos
-        return self.watermap["data"][y, x]
+        return self.layers["watermap"].data[y, x]
 
     #
     # Biome
@@ -659,7 +948,8 @@ class World:
 
     def biome_at(self, pos):
         x, y = pos
-        b = Biome.by_name(self.layers["biome"].data[y, x])
+        biome = self.layers["biome"]
+        b = Biome.by_name(biome.names[biome.data[y, x]])
         if b is None:
             raise Exception("Not found")
         return b
@@ -715,10 +1005,13 @@ class World:
 
     @property
     def biome(self):
-        return self.layers["biome"].data
+        """The names of the biomes of the cells. The layer itself holds
+        their indices in BIOME_NAMES."""
+        return self.layers["biome"].labels()
 
     @biome.setter
     def biome(self, biome):
+        """Set the biomes by name or by their indices in BIOME_NAMES."""
         if biome.shape[0] != self.height:
             raise Exception(
                 "Setting data with wrong height: biome has height %i while "
@@ -726,7 +1019,15 @@ class World:
             )
         if biome.shape[1] != self.width:
             raise Exception("Setting data with wrong width")
-        self.layers["biome"] = Layer(biome)
+        if biome.dtype.kind in "iu":
+            if biome.size and not 0 <= biome.min() <= biome.max() < len(BIOME_NAMES):
+                raise Exception("Not found")
+            indices = biome.astype(numpy.uint8)
+        else:
+            names, inverse = numpy.unique(biome, return_inverse=True)
+            indices = numpy.array([biome_name_to_index(name) for name in names], dtype=numpy.uint8)[inverse]
+            indices = indices.reshape(biome.shape)
+        self.layers["biome"] = LayerWithNames(indices, BIOME_NAMES)
 
     @property
     def ocean(self):
@@ -877,6 +1178,19 @@ class World:
     def icecap(self, icecap):
         self.layers["icecap"] = Layer(icecap)
 
+    @property
+    def distance_to_coast(self):
+        return self.layers["distance_to_coast"].data
+
+    @distance_to_coast.setter
+    def distance_to_coast(self, data):
+        if (data.shape[0] != self.height) or (data.shape[1] != self.width):
+            raise Exception(
+                "Setting distance to coast map with wrong dimension. Expected %d x %d, "
+                "found %d x %d" % (self.width, self.height, data.shape[1], data.shape[0])
+            )
+        self.layers["distance_to_coast"] = Layer(data)
+
     #
     # Testers
     #
@@ -913,3 +1227,6 @@ class World:
 
     def has_icecap(self):
         return "icecap" in self.layers
+
+    def has_distance_to_coast(self):
+        return "distance_to_coast" in self.layers
@@ -0,0 +1,361 @@
+"""
+Bulk evaluation of fractal simplex noise over whole (height, width) fields.
+
+The noise package only evaluates a single point per call, so filling a map
+through noise.snoise2 costs width * height Python calls. The functions in
+this module evaluate the same algorithm (flat, non-tiled snoise2) on blocks
+of rows at once with numpy, reusing one set of scratch buffers for every
+block and every octave.
+
+The arithmetic mirrors the C implementation of the noise package operation
+by operation in single precision, so the values are bit-identical to the
+ones snoise2 returns on the usual platforms. Should that ever not hold
+(e.g. a build of the C extension which fuses multiply-adds), the
+compatibility mode fills the field through snoise2 itself, so existing
+seeds keep producing exactly the same worlds.
+"""
+
+import numpy
+from noise import snoise2
+
+# ----------------
+# Global variables
+# ----------------
+
+
+compatibility_mode = False
+
+# Ken Perlin's permutation, as used by the noise package (doubled there
+# to avoid index wrapping)
+# fmt: off
+_PERM = numpy.array(
+    [
+        151, 160, 137, 91, 90, 15, 131, 13, 201, 95, 96, 53, 194, 233, 7, 225,
+        140, 36, 103, 30, 69, 142, 8, 99, 37, 240, 21, 10, 23, 190, 6, 148,
+        247, 120, 234, 75, 0, 26, 197, 62, 94, 252, 219, 203, 117, 35, 11, 32,
+        57, 177, 33, 88, 237, 149, 56, 87, 174, 20, 125, 136, 171, 168, 68, 175,
+        74, 165, 71, 134, 139, 48, 27, 166, 77, 146, 158, 231, 83, 111, 229, 122,
+        60, 211, 133, 230, 220, 105, 92, 41, 55, 46, 245, 40, 244, 102, 143, 54,
+        65, 25, 63, 161, 1, 216, 80, 73, 209, 76, 132, 187, 208, 89, 18, 169,
+        200, 196, 135, 130, 116, 188, 159, 86, 164, 100, 109, 198, 173, 186, 3, 64,
+        52, 217, 226, 250, 124, 123, 5, 202, 38, 147, 118, 126, 255, 82, 85, 212,
+        207, 206, 59, 227, 47, 16, 58, 17, 182, 189, 28, 42, 223, 183, 170, 213,
+        119, 248, 152, 2, 44, 154, 163, 70, 221, 153, 101, 155, 167, 43, 172, 9,
+        129, 22, 39, 253, 19, 98, 108, 110, 79, 113, 224, 232, 178, 185, 112, 104,
+        218, 246, 97, 228, 251, 34, 242, 193, 238, 210, 144, 12, 191, 179, 162, 241,
+        81, 51, 145, 235, 249, 14, 239, 107, 49, 192, 214, 31, 181, 199, 106, 157,
+        184, 84, 204, 176, 115, 121, 50, 45, 127, 4, 150, 254, 138, 236, 205, 93,
+        222, 114, 67, 29, 24, 72, 243, 141, 128, 195, 78, 66, 215, 61, 156, 180,
+    ]
+    * 2,
+    dtype=numpy.intp,
+)
+# fmt: on
+_PERM_MOD_12 = _PERM % 12
+
+# x and y components of the 12 gradients used by 2D simplex noise
+_GRAD_X = numpy.array([1, -1, 1, -1, 1, -1, 1, -1, 0, 0, 0, 0], dtype=numpy.float32)
+_GRAD_Y = numpy.array([1, 1, -1, -1, 0, 0, 0, 0, 1, -1, 1, -1], dtype=numpy.float32)
+
+# 2D skew factors, in single precision like the C implementation
+_F2 = numpy.float32(0.3660254037844386)
+_G2 = numpy.float32(0.21132486540518713)
+_2G2 = _G2 * numpy.float32(2.0)
+
+# how many cells a block of rows should roughly contain
+_BLOCK_CELLS = 1 << 16
+
+# All table lookups below use numpy.take(..., mode="wrap"): the indices are
+# always in range by construction and "wrap" skips the (slow) bounds checks.
+
+
+# -------
+# Functions
+# -------
+
+
+def get_compatibility_mode():
+    return compatibility_mode
+
+
+def set_compatibility_mode(value):
+    """
+    When set, noise fields are filled by calling noise.snoise2 once per cell
+    instead of using the vectorized implementation
+    """
+    global compatibility_mode
+    compatibility_mode = value
+
+
+class _Workspace:
+    """Scratch buffers for one block of rows, reused for all blocks and octaves"""
+
+    def __init__(self, shape):
+        f32 = numpy.float32
+        # coordinates of the current octave, broadcast against each other
+        self.x = numpy.empty((1, shape[1]), dtype=f32)
+        self.y = numpy.empty((shape[0], 1), dtype=f32)
+        self.i = numpy.empty(shape, dtype=f32)
+        self.j = numpy.empty(shape, dtype=f32)
+        self.t = numpy.empty(shape, dtype=f32)
+        self.x0 = numpy.empty(shape, dtype=f32)
+        self.y0 = numpy.empty(shape, dtype=f32)
+        self.xx = numpy.empty(shape, dtype=f32)
+        self.yy = numpy.empty(shape, dtype=f32)
+        self.f = numpy.empty(shape, dtype=f32)
+        self.g_f = numpy.empty(shape, dtype=f32)
+        self.noise = numpy.empty(shape, dtype=f32)
+        self.total = numpy.empty(shape, dtype=f32)
+        self.i1 = numpy.empty(shape, dtype=bool)
+        self.outside = numpy.empty(shape, dtype=bool)
+        self.ii = numpy.empty(shape, dtype=numpy.intp)
+        self.jj = numpy.empty(shape, dtype=numpy.intp)
+        self.k = numpy.empty(shape, dtype=numpy.intp)
+        self.g = numpy.empty(shape, dtype=numpy.intp)
+
+    def view(self, rows):
+        """The workspace restricted to the first rows, for the last (shorter) block"""
+        if rows == self.y.shape[0]:
+            return self
+        ws = _Workspace.__new__(_Workspace)
+        for name, buf in self.__dict__.items():
+            ws.__dict__[name] = buf[:rows]
+        return ws
+
+
+def _add_corner(ws, dx, dy):
+    """Add the contribution of the corner at offset (dx, dy), with gradient
+    index in ws.g, to ws.noise"""
+    # f = 0.5 - dx*dx - dy*dy
+    numpy.multiply(dx, dx, out=ws.f)
+    numpy.subtract(numpy.float32(0.5), ws.f, out=ws.f)
+    numpy.multiply(dy, dy, out=ws.g_f)
+    numpy.subtract(ws.f, ws.g_f, out=ws.f)
+    numpy.less_equal(ws.f, 0, out=ws.outside)
+
+    # gradient . (dx, dy)
+    numpy.take(_GRAD_X, ws.g, out=ws.g_f, mode="wrap")
+    numpy.multiply(ws.g_f, dx, out=ws.g_f)
+    numpy.take(_GRAD_Y, ws.g, out=ws.t, mode="wrap")
+    numpy.multiply(ws.t, dy, out=ws.t)
+    numpy.add(ws.g_f, ws.t, out=ws.g_f)
+
+    # f^4 * (gradient . (dx, dy)), zero where f <= 0
+    numpy.multiply(ws.f, ws.f, out=ws.t)
+    numpy.multiply(ws.t, ws.f, out=ws.t)
+    numpy.multiply(ws.t, ws.f, out=ws.t)
+    numpy.multiply(ws.t, ws.g_f, out=ws.t)
+    numpy.copyto(ws.t, 0.0, where=ws.outside)
+    numpy.add(ws.noise, ws.t, out=ws.noise)
+
+
+def _simplex2(ws):
+    """Single octave of 2D simplex noise at the coordinates in ws.x, ws.y,
+    the result is left in ws.noise. Mirrors noise2() in the C extension."""
+    x, y = ws.x, ws.y
+
+    # skew the input space to determine which simplex cell we are in
+    numpy.add(x, y, out=ws.t)
+    numpy.multiply(ws.t, _F2, out=ws.t)
+    numpy.add(x, ws.t, out=ws.i)
+    numpy.floor(ws.i, out=ws.i)
+    numpy.add(y, ws.t, out=ws.j)
+    numpy.floor(ws.j, out=ws.j)
+    numpy.add(ws.i, ws.j, out=ws.t)
+    numpy.multiply(ws.t, _G2, out=ws.t)
+
+    # distances from the cell origin
+    numpy.subtract(ws.i, ws.t, out=ws.x0)
+    numpy.subtract(x, ws.x0, out=ws.x0)
+    numpy.subtract(ws.j, ws.t, out=ws.y0)
+    numpy.subtract(y, ws.y0, out=ws.y0)
+    numpy.greater(ws.x0, ws.y0, out=ws.i1)  # i1 = x0 > y0, j1 = not i1
+
+    # hashed coordinates of the cell
+    numpy.copyto(ws.ii, ws.i, casting="unsafe")
+    numpy.bitwise_and(ws.ii, 255, out=ws.ii)
+    numpy.copyto(ws.jj, ws.j, casting="unsafe")
+    numpy.bitwise_and(ws.jj, 255, out=ws.jj)
+
+    # -0.0 is the identity of addition, also for a sum of zeros
+    ws.noise.fill(-0.0)
+
+    # first corner
+    numpy.take(_PERM, ws.jj, out=ws.k, mode="wrap")
+    numpy.add(ws.k, ws.ii, out=ws.k)
+    numpy.take(_PERM_MOD_12, ws.k, out=ws.g, mode="wrap")
+    _add_corner(ws, ws.x0, ws.y0)
+
+    # middle corner
+    numpy.add(ws.jj, 1, out=ws.k)
+    numpy.subtract(ws.k, ws.i1, out=ws.k, casting="unsafe")
+    numpy.take(_PERM, ws.k, out=ws.k, mode="wrap")
+    numpy.add(ws.k, ws.ii, out=ws.k)
+    numpy.add(ws.k, ws.i1, out=ws.k, casting="unsafe")
+    numpy.take(_PERM_MOD_12, ws.k, out=ws.g, mode="wrap")
+    numpy.subtract(ws.x0, ws.i1, out=ws.xx, casting="unsafe")
+    numpy.add(ws.xx, _G2, out=ws.xx)
+    numpy.logical_not(ws.i1, out=ws.outside)  # j1
+    numpy.subtract(ws.y0, ws.outside, out=ws.yy, casting="unsafe")
+    numpy.add(ws.yy, _G2, out=ws.yy)
+    _add_corner(ws, ws.xx, ws.yy)
+
+    # last corner
+    numpy.add(ws.jj, 1, out=ws.k)
+    numpy.take(_PERM, ws.k, out=ws.k, mode="wrap")
+    numpy.add(ws.k, ws.ii, out=ws.k)
+    numpy.add(ws.k, 1, out=ws.k)
+    numpy.take(_PERM_MOD_12, ws.k, out=ws.g, mode="wrap")
+    numpy.add(ws.x0, _2G2, out=ws.xx)
+    numpy.subtract(ws.xx, numpy.float32(1.0), out=ws.xx)
+    numpy.add(ws.y0, _2G2, out=ws.yy)
+    numpy.subtract(ws.yy, numpy.float32(1.0), out=ws.yy)
+    _add_corner(ws, ws.xx, ws.yy)
+
+    numpy.multiply(ws.noise, numpy.float32(70.0), out=ws.noise)
+
+
+def _snoise2_block(xs, ys, octaves, persistence, lacunarity, base, ws, out):
+    """Fractal noise for the rows ys (column vector) and columns xs (row vector)"""
+    persistence = numpy.float32(persistence)
+    lacunarity = numpy.float32(lacunarity)
+    base = numpy.float32(base)
+
+    freq = numpy.float32(1.0)
+    amp = numpy.float32(1.0)
+    total_amp = numpy.float32(1.0)
+
+    numpy.add(xs, base, out=ws.x)
+    numpy.add(ys, base, out=ws.y)
+    _simplex2(ws)
+    numpy.copyto(ws.total, ws.noise)
+
+    for _ in range(1, octaves):
+        freq *= lacunarity
+        amp *= persistence
+        total_amp += amp
+        numpy.multiply(xs, freq, out=ws.x)
+        numpy.add(ws.x, base, out=ws.x)
+        numpy.multiply(ys, freq, out=ws.y)
+        numpy.add(ws.y, base, out=ws.y)
+        _simplex2(ws)
+        numpy.multiply(ws.noise, amp, out=ws.noise)
+        numpy.add(ws.total, ws.noise, out=ws.total)
+
+    numpy.divide(ws.total, total_amp, out=ws.total)
+    numpy.copyto(out, ws.total)
+
+
+def snoise2_field(xs, ys, octaves=1, persistence=0.5, lacunarity=2.0, base=0.0, out=None, compatible=None):
+    """
+    Fill a (len(ys), len(xs)) field with fractal simplex noise, so that
+    field[r, c] == noise.snoise2(xs[c], ys[r], octaves, persistence, lacunarity, base=base)
+
+    :param xs: noise coordinates of the columns
+    :param ys: noise coordinates of the rows
+    :param out: optional float array of the right shape to write the result to
+    :param compatible: evaluate cell by cell through noise.snoise2; if None
+                       the global compatibility mode is used
+    :return: the filled field
+    """
+    xs = numpy.asarray(xs, dtype=float)
+    ys = numpy.asarray(ys, dtype=float)
+    height, width = len(ys), len(xs)
+
+    if out is None:
+        out = numpy.empty((height, width), dtype=float)
+    elif out.shape != (height, width):
+        raise Exception(
+            "Dimension of out does not match the coordinates. "
+            + "Expected %d x %d, found %d x %d" % (width, height, out.shape[1], out.shape[0])
+        )
+    if octaves <= 0:
+        raise ValueError("Expected octaves value > 0")
+
+    if compatible is None:
+        compatible = get_compatibility_mode()
+
+    if compatible:
+        for r in range(height):
+            y = ys[r]
+            for c in range(width):
+                out[r, c] = snoise2(xs[c], y, octaves, persistence, lacunarity, base=base)
+        return out
+
+    if height == 0 or width == 0:
+        return out
+
+    # the C extension receives its coordinates as single precision floats
+    xs32 = xs.astype(numpy.float32)[numpy.newaxis, :]
+    ys32 = ys.astype(numpy.float32)[:, numpy.newaxis]
+
+    block_rows = max(1, min(height, _BLOCK_CELLS // width))
+    workspace = _Workspace((block_rows, width))
+    for r in range(0, height, block_rows):
+        rows = min(block_rows, height - r)
+        _snoise2_block(
+            xs32, ys32[r : r + rows], octaves, persistence, lacunarity, base, workspace.view(rows), out[r : r + rows]
+        )
+
+    return out
+
+
+def seamless_snoise2_field(
+    width,
+    height,
+    octaves=1,
+    n_scale=1.0,
+    freq=1.0,
+    persistence=0.5,
+    lacunarity=2.0,
+    base=0.0,
+    border=None,
+    inclusive=False,
+    out=None,
+    compatible=None,
+):
+    """
+    Fill a (height, width) field with fractal simplex noise which wraps
+    around left and right. Cell (x, y) samples the noise at
+    ((x * n_scale) / freq, (y * n_scale) / freq); the westmost columns, up to
+    border (width / 4 by default), are blended linearly with the noise one
+    map width further east, so the west edge continues the east edge.
+
+    The primary field and the (narrow) offset field are evaluated once each
+    and blended in place, instead of evaluating the noise three times per
+    border cell.
+
+    :param border: width of the blended seam, width / 4 if None
+    :param inclusive: blend the columns x <= border instead of x < border
+    :param out: optional float array of shape (height, width) to write the result to
+    :param compatible: see snoise2_field
+    :return: the filled field
+    """
+    if border is None:
+        border = width / 4
+
+    xs = (numpy.arange(width) * n_scale) / freq
+    ys = (numpy.arange(height) * n_scale) / freq
+    field = snoise2_field(xs, ys, octaves, persistence, lacunarity, base, out, compatible)
+
+    if inclusive:
+        seam_width = int(numpy.floor(border)) + 1
+    else:
+        seam_width = int(numpy.ceil(border))
+    seam_width = min(max(seam_width, 0), width)
+    if seam_width == 0:
+        return field
+
+    x = numpy.arange(seam_width)
+    xs_offset = ((x * n_scale) + width) / freq
+    offset = snoise2_field(xs_offset, ys, octaves, persistence, lacunarity, base, None, compatible)
+
+    # n * x / border + n_offset * (border - x) / border, in that order of operations
+    seam = field[:, :seam_width]
+    numpy.multiply(seam, x, out=seam)
+    numpy.divide(seam, border, out=seam)
+    numpy.multiply(offset, border - x, out=offset)
+    numpy.divide(offset, border, out=offset)
+    numpy.add(seam, offset, out=seam)
+
+    return field
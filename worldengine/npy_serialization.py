@@ -0,0 +1,153 @@
+"""
+A world as one .npy file per layer plus a manifest.json with everything
+else (name, size, generation parameters, thresholds, quantiles), either in
+a directory or in an uncompressed zip archive. The layers are memory mapped
+when a world is loaded, so only the parts that are used are ever read.
+"""
+
+import json
+import os
+import struct
+import zipfile
+
+import numpy
+
+from worldengine.model.world import (
+    GenerationParameters,
+    Layer,
+    LayerWithNames,
+    LayerWithQuantiles,
+    LayerWithThresholds,
+    Size,
+    Step,
+    World,
+)
+from worldengine.version import __version__
+
+MANIFEST = "manifest.json"
+FORMAT_VERSION = 1
+
+
+def _json_default(value):
+    # numpy scalars, like the thresholds found by numpy
+    if isinstance(value, numpy.generic):
+        return value.item()
+    raise TypeError(f"Cannot store {value!r} in the manifest")
+
+
+def _manifest(world):
+    layers = {}
+    for name, layer in world.layers.items():
+        entry = {"file": f"{name}.npy"}
+        if isinstance(layer, LayerWithThresholds):
+            entry["thresholds"] = layer.thresholds
+        elif isinstance(layer, LayerWithQuantiles):
+            entry["quantiles"] = layer.quantiles
+        elif isinstance(layer, LayerWithNames):
+            entry["names"] = list(layer.names)
+        layers[name] = entry
+    return {
+        "format_version": FORMAT_VERSION,
+        "worldengine_version": __version__,
+        "name": world.name,
+        "width": world.width,
+        "height": world.height,
+        "generation_params": {
+            "seed": world.seed,
+            "n_plates": world.n_plates,
+            "ocean_level": world.ocean_level,
+            "step": world.step.name,
+        },
+        "layers": layers,
+    }
+
+
+def save_world_to_npy(world, path, archive=False):
+    """Save the world in the directory path, or with archive in the
+    uncompressed zip file path."""
+    manifest = _manifest(world)
+    text = json.dumps(manifest, indent=2, default=_json_default)
+    if archive:
+        with zipfile.ZipFile(path, mode="w", compression=zipfile.ZIP_STORED) as z:
+            z.writestr(MANIFEST, text)
+            for name, entry in manifest["layers"].items():
+                with z.open(entry["file"], mode="w", force_zip64=True) as f:
+                    numpy.lib.format.write_array(f, numpy.ascontiguousarray(world.layers[name].data))
+    else:
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, MANIFEST), "w") as f:
+            f.write(text)
+        for name, entry in manifest["layers"].items():
+            numpy.save(os.path.join(path, entry["file"]), numpy.ascontiguousarray(world.layers[name].data))
+
+
+def _map_from_zip(filename, info):
+    """Memory map an .npy file stored (not compressed) in a zip file."""
+    if info.compress_type != zipfile.ZIP_STORED:
+        raise Exception(f"{info.filename} is compressed, it cannot be mapped")
+    with open(filename, "rb") as f:
+        # the data follows the local header, its name and its extra field
+        f.seek(info.header_offset)
+        header = f.read(30)
+        name_length, extra_length = struct.unpack("<2H", header[26:30])
+        f.seek(info.header_offset + 30 + name_length + extra_length)
+        version = numpy.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = numpy.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = numpy.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+    order = "F" if fortran_order else "C"
+    return numpy.memmap(filename, dtype=dtype, mode="r", offset=offset, shape=shape, order=order)
+
+
+def load_world_from_npy(path):
+    """Load a world saved by save_world_to_npy, as a directory or as a zip
+    file. The layers are read-only memory maps of the files."""
+    if os.path.isdir(path):
+        with open(os.path.join(path, MANIFEST)) as f:
+            manifest = json.load(f)
+
+        def layer_data(entry):
+            return numpy.load(os.path.join(path, entry["file"]), mmap_mode="r")
+
+    else:
+        with zipfile.ZipFile(path) as z:
+            manifest = json.loads(z.read(MANIFEST))
+            infos = {info.filename: info for info in z.infolist()}
+
+        def layer_data(entry):
+            return _map_from_zip(path, infos[entry["file"]])
+
+    if manifest["format_version"] > FORMAT_VERSION:
+        raise Exception("Unsupported npy world format %i" % manifest["format_version"])
+
+    params = manifest["generation_params"]
+    w = World(
+        manifest["name"],
+        Size(manifest["width"], manifest["height"]),
+        params["seed"],
+        GenerationParameters(params["n_plates"], params["ocean_level"], Step.get_by_name(params["step"])),
+    )
+
+    for name, entry in manifest["layers"].items():
+        # plain arrays over the maps, the world compares its layers as such
+        data = layer_data(entry).view(numpy.ndarray)
+        if data.shape != (w.height, w.width):
+            raise Exception(
+                "Layer %s with wrong dimension. Expected %d x %d, found %d x %d"
+                % (name, w.width, w.height, data.shape[1], data.shape[0])
+            )
+        if "thresholds" in entry:
+            thresholds = entry["thresholds"]
+            if isinstance(thresholds, list):
+                thresholds = [tuple(th) for th in thresholds]
+            w.layers[name] = LayerWithThresholds(data, thresholds)
+        elif "quantiles" in entry:
+            w.layers[name] = LayerWithQuantiles(data, entry["quantiles"])
+        elif "names" in entry:
+            w.layers[name] = LayerWithNames(data, tuple(entry["names"]))
+        else:
+            w.layers[name] = Layer(data)
+
+    return w
@@ -10,14 +10,14 @@ from google.protobuf import runtime_version as _runtime_version
 from google.protobuf import symbol_database as _symbol_database
 from google.protobuf.internal import builder as _builder
 
-_runtime_version.ValidateProtobufRuntimeVersion(_runtime_version.Domain.PUBLIC, 6, 33, 1, "", "World.proto")
+_runtime_version.ValidateProtobufRuntimeVersion(_runtime_version.Domain.PUBLIC, 6, 31, 1, "", "World.proto")
 # @@protoc_insertion_point(imports)
 
 _sym_db = _symbol_database.Default()
 
 
 DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(
-    b'\n\x0bWorld.proto\x12\x05World"\xf6\r\n\x05World\x12\x17\n\x0fworldengine_tag\x18\x01 \x02(\x05\x12\x1b\n\x13worldengine_version\x18\x02 \x02(\x05\x12\x0c\n\x04name\x18\x03 \x02(\t\x12\r\n\x05width\x18\x04 \x02(\x05\x12\x0e\n\x06height\x18\x05 \x02(\x05\x12\x30\n\rheightMapData\x18\x06 \x02(\x0b\x32\x19.World.World.DoubleMatrix\x12\x17\n\x0fheightMapTh_sea\x18\x07 \x02(\x01\x12\x19\n\x11heightMapTh_plain\x18\x08 \x02(\x01\x12\x18\n\x10heightMapTh_hill\x18\t \x02(\x01\x12*\n\x06plates\x18\n \x02(\x0b\x32\x1a.World.World.IntegerMatrix\x12)\n\x05ocean\x18\x0b \x02(\x0b\x32\x1a.World.World.BooleanMatrix\x12,\n\tsea_depth\x18\x0c \x02(\x0b\x32\x19.World.World.DoubleMatrix\x12)\n\x05\x62iome\x18\r \x01(\x0b\x32\x1a.World.World.IntegerMatrix\x12\x38\n\x08humidity\x18\x0e \x01(\x0b\x32&.World.World.DoubleMatrixWithQuantiles\x12-\n\nirrigation\x18\x0f \x01(\x0b\x32\x19.World.World.DoubleMatrix\x12\x33\n\x10permeabilityData\x18\x10 \x01(\x0b\x32\x19.World.World.DoubleMatrix\x12\x18\n\x10permeability_low\x18\x11 \x01(\x01\x12\x18\n\x10permeability_med\x18\x12 \x01(\x01\x12/\n\x0cwatermapData\x18\x13 \x01(\x0b\x32\x19.World.World.DoubleMatrix\x12\x16\n\x0ewatermap_creek\x18\x14 \x01(\x01\x12\x16\n\x0ewatermap_river\x18\x15 \x01(\x01\x12\x1a\n\x12watermap_mainriver\x18\x16 \x01(\x01\x12\x34\n\x11precipitationData\x18\x17 \x01(\x0b\x32\x19.World.World.DoubleMatrix\x12\x19\n\x11precipitation_low\x18\x18 \x01(\x01\x12\x19\n\x11precipitation_med\x18\x19 \x01(\x01\x12\x32\n\x0ftemperatureData\x18\x1a \x01(\x0b\x32\x19.World.World.DoubleMatrix\x12\x19\n\x11temperature_polar\x18\x1b \x01(\x01\x12\x1a\n\x12temperature_alpine\x18\x1c \x01(\x01\x12\x1a\n\x12temperature_boreal\x18\x1d \x01(\x01\x12\x18\n\x10temperature_cool\x18\x1e \x01(\x01\x12\x18\n\x10temperature_warm\x18\x1f \x01(\x01\x12\x1f\n\x17temperature_subtropical\x18  \x01(\x01\x12\x33\n\x0egenerationData\x18! \x01(\x0b\x32\x1b.World.World.GenerationData\x12*\n\x07lakemap\x18" \x01(\x0b\x32\x19.World.World.DoubleMatrix\x12+\n\x08rivermap\x18# \x01(\x0b\x32\x19.World.World.DoubleMatrix\x12)\n\x06icecap\x18$ \x01(\x0b\x32\x19.World.World.DoubleMatrix\x1a\x1a\n\tDoubleRow\x12\r\n\x05\x63\x65lls\x18\x01 \x03(\x01\x1a\x1b\n\nBooleanRow\x12\r\n\x05\x63\x65lls\x18\x01 \x03(\x08\x1a\x1b\n\nIntegerRow\x12\r\n\x05\x63\x65lls\x18\x01 \x03(\x05\x1a\x18\n\x07\x42yteRow\x12\r\n\x05\x63\x65lls\x18\x01 \x03(\x05\x1a\x34\n\x0c\x44oubleMatrix\x12$\n\x04rows\x18\x01 \x03(\x0b\x32\x16.World.World.DoubleRow\x1a\x36\n\rBooleanMatrix\x12%\n\x04rows\x18\x01 \x03(\x0b\x32\x17.World.World.BooleanRow\x1a\x36\n\rIntegerMatrix\x12%\n\x04rows\x18\x01 \x03(\x0b\x32\x17.World.World.IntegerRow\x1a,\n\x0e\x44oubleQuantile\x12\x0b\n\x03key\x18\x01 \x02(\x05\x12\r\n\x05value\x18\x02 \x02(\x01\x1aq\n\x19\x44oubleMatrixWithQuantiles\x12.\n\tquantiles\x18\x01 \x03(\x0b\x32\x1b.World.World.DoubleQuantile\x12$\n\x04rows\x18\x02 \x03(\x0b\x32\x16.World.World.DoubleRow\x1aS\n\x0eGenerationData\x12\x0c\n\x04seed\x18\x01 \x01(\x05\x12\x10\n\x08n_plates\x18\x02 \x01(\x05\x12\x13\n\x0bocean_level\x18\x03 \x01(\x02\x12\x0c\n\x04step\x18\x04 \x01(\t'
+    b'\n\x0bWorld.proto\x12\x05World"\xae\x10\n\x05World\x12\x17\n\x0fworldengine_tag\x18\x01 \x02(\x05\x12\x1b\n\x13worldengine_version\x18\x02 \x02(\x05\x12\x0c\n\x04name\x18\x03 \x02(\t\x12\r\n\x05width\x18\x04 \x02(\x05\x12\x0e\n\x06height\x18\x05 \x02(\x05\x12\x30\n\rheightMapData\x18\x06 \x02(\x0b\x32\x19.World.World.DoubleMatrix\x12\x17\n\x0fheightMapTh_sea\x18\x07 \x02(\x01\x12\x19\n\x11heightMapTh_plain\x18\x08 \x02(\x01\x12\x18\n\x10heightMapTh_hill\x18\t \x02(\x01\x12*\n\x06plates\x18\n \x02(\x0b\x32\x1a.World.World.IntegerMatrix\x12)\n\x05ocean\x18\x0b \x02(\x0b\x32\x1a.World.World.BooleanMatrix\x12,\n\tsea_depth\x18\x0c \x02(\x0b\x32\x19.World.World.DoubleMatrix\x12)\n\x05\x62iome\x18\r \x01(\x0b\x32\x1a.World.World.IntegerMatrix\x12\x38\n\x08humidity\x18\x0e \x01(\x0b\x32&.World.World.DoubleMatrixWithQuantiles\x12-\n\nirrigation\x18\x0f \x01(\x0b\x32\x19.World.World.DoubleMatrix\x12\x33\n\x10permeabilityData\x18\x10 \x01(\x0b\x32\x19.World.World.DoubleMatrix\x12\x18\n\x10permeability_low\x18\x11 \x01(\x01\x12\x18\n\x10permeability_med\x18\x12 \x01(\x01\x12/\n\x0cwatermapData\x18\x13 \x01(\x0b\x32\x19.World.World.DoubleMatrix\x12\x16\n\x0ewatermap_creek\x18\x14 \x01(\x01\x12\x16\n\x0ewatermap_river\x18\x15 \x01(\x01\x12\x1a\n\x12watermap_mainriver\x18\x16 \x01(\x01\x12\x34\n\x11precipitationData\x18\x17 \x01(\x0b\x32\x19.World.World.DoubleMatrix\x12\x19\n\x11precipitation_low\x18\x18 \x01(\x01\x12\x19\n\x11precipitation_med\x18\x19 \x01(\x01\x12\x32\n\x0ftemperatureData\x18\x1a \x01(\x0b\x32\x19.World.World.DoubleMatrix\x12\x19\n\x11temperature_polar\x18\x1b \x01(\x01\x12\x1a\n\x12temperature_alpine\x18\x1c \x01(\x01\x12\x1a\n\x12temperature_boreal\x18\x1d \x01(\x01\x12\x18\n\x10temperature_cool\x18\x1e \x01(\x01\x12\x18\n\x10temperature_warm\x18\x1f \x01(\x01\x12\x1f\n\x17temperature_subtropical\x18  \x01(\x01\x12\x33\n\x0egenerationData\x18! \x01(\x0b\x32\x1b.World.World.GenerationData\x12*\n\x07lakemap\x18" \x01(\x0b\x32\x19.World.World.DoubleMatrix\x12+\n\x08rivermap\x18# \x01(\x0b\x32\x19.World.World.DoubleMatrix\x12)\n\x06icecap\x18$ \x01(\x0b\x32\x19.World.World.DoubleMatrix\x12\x35\n\x11\x64istance_to_coast\x18% \x01(\x0b\x32\x1a.World.World.IntegerMatrix\x12\x16\n\x0e\x66ormat_version\x18& \x01(\x05\x1a\x1a\n\tDoubleRow\x12\r\n\x05\x63\x65lls\x18\x01 \x03(\x01\x1a\x1b\n\nBooleanRow\x12\r\n\x05\x63\x65lls\x18\x01 \x03(\x08\x1a\x1b\n\nIntegerRow\x12\r\n\x05\x63\x65lls\x18\x01 \x03(\x05\x1a\x18\n\x07\x42yteRow\x12\r\n\x05\x63\x65lls\x18\x01 \x03(\x05\x1a:\n\x0cPackedMatrix\x12\r\n\x05\x64type\x18\x01 \x02(\t\x12\r\n\x05shape\x18\x02 \x03(\x05\x12\x0c\n\x04\x64\x61ta\x18\x03 \x02(\x0c\x1a_\n\x0c\x44oubleMatrix\x12$\n\x04rows\x18\x01 \x03(\x0b\x32\x16.World.World.DoubleRow\x12)\n\x06packed\x18\x02 \x01(\x0b\x32\x19.World.World.PackedMatrix\x1a\x61\n\rBooleanMatrix\x12%\n\x04rows\x18\x01 \x03(\x0b\x32\x17.World.World.BooleanRow\x12)\n\x06packed\x18\x02 \x01(\x0b\x32\x19.World.World.PackedMatrix\x1a\x61\n\rIntegerMatrix\x12%\n\x04rows\x18\x01 \x03(\x0b\x32\x17.World.World.IntegerRow\x12)\n\x06packed\x18\x02 \x01(\x0b\x32\x19.World.World.PackedMatrix\x1a,\n\x0e\x44oubleQuantile\x12\x0b\n\x03key\x18\x01 \x02(\x05\x12\r\n\x05value\x18\x02 \x02(\x01\x1a\x9c\x01\n\x19\x44oubleMatrixWithQuantiles\x12.\n\tquantiles\x18\x01 \x03(\x0b\x32\x1b.World.World.DoubleQuantile\x12$\n\x04rows\x18\x02 \x03(\x0b\x32\x16.World.World.DoubleRow\x12)\n\x06packed\x18\x03 \x01(\x0b\x32\x19.World.World.PackedMatrix\x1aS\n\x0eGenerationData\x12\x0c\n\x04seed\x18\x01 \x01(\x05\x12\x10\n\x08n_plates\x18\x02 \x01(\x05\x12\x13\n\x0bocean_level\x18\x03 \x01(\x02\x12\x0c\n\x04step\x18\x04 \x01(\t'
 )
 
 _globals = globals()
@@ -26,25 +26,27 @@ _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, "World_pb2", _globals)
 if not _descriptor._USE_C_DESCRIPTORS:
     DESCRIPTOR._loaded_options = None
     _globals["_WORLD"]._serialized_start = 23
-    _globals["_WORLD"]._serialized_end = 1805
-    _globals["_WORLD_DOUBLEROW"]._serialized_start = 1283
-    _globals["_WORLD_DOUBLEROW"]._serialized_end = 1309
-    _globals["_WORLD_BOOLEANROW"]._serialized_start = 1311
-    _globals["_WORLD_BOOLEANROW"]._serialized_end = 1338
-    _globals["_WORLD_INTEGERROW"]._serialized_start = 1340
-    _globals["_WORLD_INTEGERROW"]._serialized_end = 1367
-    _globals["_WORLD_BYTEROW"]._serialized_start = 1369
-    _globals["_WORLD_BYTEROW"]._serialized_end = 1393
-    _globals["_WORLD_DOUBLEMATRIX"]._serialized_start = 1395
-    _globals["_WORLD_DOUBLEMATRIX"]._serialized_end = 1447
-    _globals["_WORLD_BOOLEANMATRIX"]._serialized_start = 1449
-    _globals["_WORLD_BOOLEANMATRIX"]._serialized_end = 1503
-    _globals["_WORLD_INTEGERMATRIX"]._serialized_start = 1505
-    _globals["_WORLD_INTEGERMATRIX"]._serialized_end = 1559
-    _globals["_WORLD_DOUBLEQUANTILE"]._serialized_start = 1561
-    _globals["_WORLD_DOUBLEQUANTILE"]._serialized_end = 1605
-    _globals["_WORLD_DOUBLEMATRIXWITHQUANTILES"]._serialized_start = 1607
-    _globals["_WORLD_DOUBLEMATRIXWITHQUANTILES"]._serialized_end = 1720
-    _globals["_WORLD_GENERATIONDATA"]._serialized_start = 1722
-    _globals["_WORLD_GENERATIONDATA"]._serialized_end = 1805
+    _globals["_WORLD"]._serialized_end = 2117
+    _globals["_WORLD_DOUBLEROW"]._serialized_start = 1362
+    _globals["_WORLD_DOUBLEROW"]._serialized_end = 1388
+    _globals["_WORLD_BOOLEANROW"]._serialized_start = 1390
+    _globals["_WORLD_BOOLEANROW"]._serialized_end = 1417
+    _globals["_WORLD_INTEGERROW"]._serialized_start = 1419
+    _globals["_WORLD_INTEGERROW"]._serialized_end = 1446
+    _globals["_WORLD_BYTEROW"]._serialized_start = 1448
+    _globals["_WORLD_BYTEROW"]._serialized_end = 1472
+    _globals["_WORLD_PACKEDMATRIX"]._serialized_start = 1474
+    _globals["_WORLD_PACKEDMATRIX"]._serialized_end = 1532
+    _globals["_WORLD_DOUBLEMATRIX"]._serialized_start = 1534
+    _globals["_WORLD_DOUBLEMATRIX"]._serialized_end = 1629
+    _globals["_WORLD_BOOLEANMATRIX"]._serialized_start = 1631
+    _globals["_WORLD_BOOLEANMATRIX"]._serialized_end = 1728
+    _globals["_WORLD_INTEGERMATRIX"]._serialized_start = 1730
+    _globals["_WORLD_INTEGERMATRIX"]._serialized_end = 1827
+    _globals["_WORLD_DOUBLEQUANTILE"]._serialized_start = 1829
+    _globals["_WORLD_DOUBLEQUANTILE"]._serialized_end = 1873
+    _globals["_WORLD_DOUBLEMATRIXWITHQUANTILES"]._serialized_start = 1876
+    _globals["_WORLD_DOUBLEMATRIXWITHQUANTILES"]._serialized_end = 2032
+    _globals["_WORLD_GENERATIONDATA"]._serialized_start = 2034
+    _globals["_WORLD_GENERATIONDATA"]._serialized_end = 2117
 # @@protoc_insertion_point(module_scope)
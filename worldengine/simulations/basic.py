@@ -45,41 +45,72 @@ def find_threshold(map_data, land_percentage, ocean=None):  # never used anywher
 
 
 def find_threshold_f(map_data, land_perc, ocean=None, max=1000.0, mindist=0.005):
-    height, width = map_data.shape
+    return find_thresholds(map_data, [land_perc], ocean, max, mindist)[0]
+
+
+def find_thresholds(data, percentages, mask=None, max=1000.0, mindist=0.005):
+    """
+    Find the values which the given percentages of the data are above.
+    The data is sorted once, after which each count is a binary search.
+    :param data: 2d array, may be a masked array
+    :param percentages: sequence of fractions in [0, 1]
+    :param mask: optional boolean array, cells set in it are ignored (e.g. the ocean)
+    :param max: the thresholds are searched for in [-max, max]
+    :param mindist: the tolerance of the bisection search; None to pick the
+                    thresholds among the data values instead of bisecting
+    :return: a list with a threshold for each of the percentages
+    """
+    height, width = data.shape
 
     # maybe map was already masked when we got it; if not, this will make sure we operate on a mask
-    mask = numpy.ma.array(map_data, mask=False, keep_mask=True)
+    values = numpy.ma.array(data, mask=False, keep_mask=True)
 
-    if ocean is not None:
-        if ocean.shape != map_data.shape:
+    if mask is not None:
+        if mask.shape != data.shape:
             raise Exception(
                 "Dimension of map_data and ocean do not match. "
-                + "Map is %d x %d, while ocean is %d x%d" % (width, height, ocean.shape[1], ocean.shape[0])
+                + "Map is %d x %d, while ocean is %d x%d" % (width, height, mask.shape[1], mask.shape[0])
             )
-        mask = numpy.ma.array(mask, mask=ocean, keep_mask=True)
+        values = numpy.ma.array(values, mask=mask, keep_mask=True)
+
+    values = numpy.sort(values.compressed())
+    n = len(values)
 
     def count(e):
-        return numpy.ma.masked_less_equal(mask, e).count()
+        # how many values are above e
+        return n - int(numpy.searchsorted(values, e, "right"))
 
     def search(a, b, desired):
-        if a == b:
-            return a
-        if abs(b - a) < mindist:
-            ca = count(a)
-            cb = count(b)
-            dista = abs(desired - ca)
-            distb = abs(desired - cb)
-            if dista < distb:
-                return a
+        while a != b:
+            if abs(b - a) < mindist:
+                ca = count(a)
+                cb = count(b)
+                dista = abs(desired - ca)
+                distb = abs(desired - cb)
+                if dista < distb:
+                    return a
+                else:
+                    return b
+            m = (a + b) / 2.0
+            cm = count(m)
+            if desired < cm:
+                a = m
             else:
-                return b
-        m = (a + b) / 2.0
-        cm = count(m)
-        if desired < cm:
-            return search(m, b, desired)
-        else:
-            return search(a, m, desired)
+                b = m
+        return a
 
-    all_land = mask.count()
-    desired_land = all_land * land_perc
-    return search(-1 * max, max, desired_land)
+    thresholds = []
+    for percentage in percentages:
+        desired = n * percentage
+        if mindist is not None:
+            thresholds.append(search(-1 * max, max, desired))
+        elif n == 0:
+            thresholds.append(0.0)
+        else:
+            # the value which has (as close as ties allow) the desired number of values above it
+            above = int(round(desired))
+            if above == n:
+                thresholds.append(float(numpy.nextafter(values[0], -numpy.inf)))
+            else:
+                thresholds.append(float(values[n - 1 - above]))
+    return thresholds
@@ -1,5 +1,52 @@
 import numpy
 
+from worldengine.biome import BIOME_NAMES, biome_name_to_index
+
+# The biome of a land cell by its temperature band (polar to tropical) and its
+# humidity band (superarid to superhumid). The colder bands tell fewer
+# humidities apart, the wettest biome of a band covers all the wetter ones.
+BIOME_TABLE = (
+    ("polar desert",) + ("ice",) * 7,
+    ("subpolar dry tundra", "subpolar moist tundra", "subpolar wet tundra") + ("subpolar rain tundra",) * 5,
+    ("boreal desert", "boreal dry scrub", "boreal moist forest", "boreal wet forest") + ("boreal rain forest",) * 4,
+    (
+        "cool temperate desert",
+        "cool temperate desert scrub",
+        "cool temperate steppe",
+        "cool temperate moist forest",
+        "cool temperate wet forest",
+    )
+    + ("cool temperate rain forest",) * 3,
+    (
+        "warm temperate desert",
+        "warm temperate desert scrub",
+        "warm temperate thorn scrub",
+        "warm temperate dry forest",
+        "warm temperate moist forest",
+        "warm temperate wet forest",
+    )
+    + ("warm temperate rain forest",) * 2,
+    (
+        "subtropical desert",
+        "subtropical desert scrub",
+        "subtropical thorn woodland",
+        "subtropical dry forest",
+        "subtropical moist forest",
+        "subtropical wet forest",
+    )
+    + ("subtropical rain forest",) * 2,
+    (
+        "tropical desert",
+        "tropical desert scrub",
+        "tropical thorn woodland",
+        "tropical very dry forest",
+        "tropical dry forest",
+        "tropical moist forest",
+        "tropical wet forest",
+        "tropical rain forest",
+    ),
+)
+
 
 class BiomeSimulation:
     @staticmethod
@@ -9,108 +56,15 @@ class BiomeSimulation:
     @staticmethod
     def execute(world, seed):
         assert seed is not None
-        w = world
-        width = world.width
-        height = world.height
         ocean = world.layers["ocean"].data
-        cm = {}
-        biome_cm = {}
-        # this is still kind of expensive memory-wise
-        biome = numpy.zeros((height, width), dtype=object)
-        for y in range(height):
-            for x in range(width):
-                if ocean[y, x]:
-                    biome[y, x] = "ocean"
-                else:
-                    if w.is_temperature_polar((x, y)):
-                        if w.is_humidity_superarid((x, y)):
-                            biome[y, x] = "polar desert"
-                        else:
-                            biome[y, x] = "ice"
-                    elif w.is_temperature_alpine((x, y)):
-                        if w.is_humidity_superarid((x, y)):
-                            biome[y, x] = "subpolar dry tundra"
-                        elif w.is_humidity_perarid((x, y)):
-                            biome[y, x] = "subpolar moist tundra"
-                        elif w.is_humidity_arid((x, y)):
-                            biome[y, x] = "subpolar wet tundra"
-                        else:
-                            biome[y, x] = "subpolar rain tundra"
-                    elif w.is_temperature_boreal((x, y)):
-                        if w.is_humidity_superarid((x, y)):
-                            biome[y, x] = "boreal desert"
-                        elif w.is_humidity_perarid((x, y)):
-                            biome[y, x] = "boreal dry scrub"
-                        elif w.is_humidity_arid((x, y)):
-                            biome[y, x] = "boreal moist forest"
-                        elif w.is_humidity_semiarid((x, y)):
-                            biome[y, x] = "boreal wet forest"
-                        else:
-                            biome[y, x] = "boreal rain forest"
-                    elif w.is_temperature_cool((x, y)):
-                        if w.is_humidity_superarid((x, y)):
-                            biome[y, x] = "cool temperate desert"
-                        elif w.is_humidity_perarid((x, y)):
-                            biome[y, x] = "cool temperate desert scrub"
-                        elif w.is_humidity_arid((x, y)):
-                            biome[y, x] = "cool temperate steppe"
-                        elif w.is_humidity_semiarid((x, y)):
-                            biome[y, x] = "cool temperate moist forest"
-                        elif w.is_humidity_subhumid((x, y)):
-                            biome[y, x] = "cool temperate wet forest"
-                        else:
-                            biome[y, x] = "cool temperate rain forest"
-                    elif w.is_temperature_warm((x, y)):
-                        if w.is_humidity_superarid((x, y)):
-                            biome[y, x] = "warm temperate desert"
-                        elif w.is_humidity_perarid((x, y)):
-                            biome[y, x] = "warm temperate desert scrub"
-                        elif w.is_humidity_arid((x, y)):
-                            biome[y, x] = "warm temperate thorn scrub"
-                        elif w.is_humidity_semiarid((x, y)):
-                            biome[y, x] = "warm temperate dry forest"
-                        elif w.is_humidity_subhumid((x, y)):
-                            biome[y, x] = "warm temperate moist forest"
-                        elif w.is_humidity_humid((x, y)):
-                            biome[y, x] = "warm temperate wet forest"
-                        else:
-                            biome[y, x] = "warm temperate rain forest"
-                    elif w.is_temperature_subtropical((x, y)):
-                        if w.is_humidity_superarid((x, y)):
-                            biome[y, x] = "subtropical desert"
-                        elif w.is_humidity_perarid((x, y)):
-                            biome[y, x] = "subtropical desert scrub"
-                        elif w.is_humidity_arid((x, y)):
-                            biome[y, x] = "subtropical thorn woodland"
-                        elif w.is_humidity_semiarid((x, y)):
-                            biome[y, x] = "subtropical dry forest"
-                        elif w.is_humidity_subhumid((x, y)):
-                            biome[y, x] = "subtropical moist forest"
-                        elif w.is_humidity_humid((x, y)):
-                            biome[y, x] = "subtropical wet forest"
-                        else:
-                            biome[y, x] = "subtropical rain forest"
-                    elif w.is_temperature_tropical((x, y)):
-                        if w.is_humidity_superarid((x, y)):
-                            biome[y, x] = "tropical desert"
-                        elif w.is_humidity_perarid((x, y)):
-                            biome[y, x] = "tropical desert scrub"
-                        elif w.is_humidity_arid((x, y)):
-                            biome[y, x] = "tropical thorn woodland"
-                        elif w.is_humidity_semiarid((x, y)):
-                            biome[y, x] = "tropical very dry forest"
-                        elif w.is_humidity_subhumid((x, y)):
-                            biome[y, x] = "tropical dry forest"
-                        elif w.is_humidity_humid((x, y)):
-                            biome[y, x] = "tropical moist forest"
-                        elif w.is_humidity_perhumid((x, y)):
-                            biome[y, x] = "tropical wet forest"
-                        else:
-                            biome[y, x] = "tropical rain forest"
-                    else:
-                        biome[y, x] = "bare rock"
-                if biome[y, x] not in biome_cm:
-                    biome_cm[biome[y, x]] = 0
-                biome_cm[biome[y, x]] += 1
-        w.biome = biome
-        return cm, biome_cm
+
+        table = numpy.array([[biome_name_to_index(name) for name in row] for row in BIOME_TABLE], dtype=numpy.uint8)
+        # the class maps give a cell the first band it is in, as the if/elif
+        # chains over the bands did, also when the thresholds are out of order
+        biome = table[world.temperature_class_map(), world.humidity_class_map()]
+        biome[ocean] = biome_name_to_index("ocean")
+
+        counts = numpy.bincount(biome.ravel(), minlength=len(BIOME_NAMES))
+        biome_cm = {BIOME_NAMES[i]: int(count) for i, count in enumerate(counts) if count}
+        world.biome = biome
+        return {}, biome_cm
@@ -1,8 +1,11 @@
+import heapq
 import math
+from collections import deque
 
 import numpy
 
-import worldengine.astar
+from worldengine.astar import PathFinder, PathfindingContext
+from worldengine.basic_map_operations import SpatialIndex
 
 # Direction
 NORTH = [0, -1]
@@ -19,6 +22,8 @@ DIR_NEIGHBORS = [NORTH, EAST, SOUTH, WEST]
 DIR_NEIGHBORS_CENTER = [CENTER, NORTH, EAST, SOUTH, WEST]
 
 RIVER_TH = 0.02
+RIVER_SOURCES_SPACING = 9  # river sources are further apart than that
+ASTAR_MAX_ITERATIONS = 10000  # the bail-out of the original A*, keeps the rivers seed-compatible
 
 
 def overflow(value, max_value):
@@ -30,37 +35,223 @@ def in_circle(radius, center_x, center_y, x, y):
     return square_dist <= radius**2
 
 
+def flow_directions(elevation, wrap=True):
+    """
+    Find the direction water flows to from each cell: towards the lowest of
+    the four neighbours that is lower than the cell itself, the first one
+    in the order of DIR_NEIGHBORS on ties.
+    :param elevation: 2d array
+    :param wrap: if True the map wraps around, otherwise neighbours outside the map are ignored
+    :return: an int array holding the index of the direction in
+             DIR_NEIGHBORS_CENTER, 0 (CENTER) for cells without a lower neighbour
+    """
+    lowest = numpy.array(elevation, dtype=float)
+    directions = numpy.zeros(lowest.shape, dtype=int)
+    for key, (dx, dy) in enumerate(DIR_NEIGHBORS, 1):
+        # the elevation of the neighbour in direction (dx, dy) of each cell
+        neighbour = numpy.roll(elevation, (-dy, -dx), axis=(0, 1)).astype(float, copy=False)
+        if not wrap:
+            if dy:
+                neighbour[-1 if dy > 0 else 0, :] = numpy.inf
+            if dx:
+                neighbour[:, -1 if dx > 0 else 0] = numpy.inf
+        lower = neighbour < lowest
+        directions[lower] = key
+        numpy.copyto(lowest, neighbour, where=lower)
+    return directions
+
+
+def flow_accumulation(directions, rain):
+    """
+    Accumulate the rain along the flow: each cell receives its own rain plus
+    everything flowing into it. The cells are handled in waves, each wave
+    being the cells all of whose upstream cells are done, so every cell is
+    handled exactly once.
+    :param directions: int array of DIR_NEIGHBORS_CENTER indices, as returned by flow_directions;
+                       the flow wraps around the borders of the map
+    :param rain: float array of the same shape
+    :return: the accumulated flow
+    """
+    height, width = directions.shape
+    flow = numpy.array(rain, dtype=float).ravel()
+
+    # the downstream cell of each cell, -1 where the water stays
+    offsets = numpy.array(DIR_NEIGHBORS_CENTER)
+    dx = offsets[directions.ravel(), 0]
+    dy = offsets[directions.ravel(), 1]
+    y, x = numpy.divmod(numpy.arange(height * width), width)
+    downstream = ((y + dy) % height) * width + (x + dx) % width
+    downstream[directions.ravel() == 0] = -1
+
+    has_downstream = downstream >= 0
+    upstream_left = numpy.bincount(downstream[has_downstream], minlength=height * width)
+    wave = numpy.flatnonzero(numpy.logical_and(upstream_left == 0, has_downstream))
+    while wave.size:
+        targets = downstream[wave]
+        numpy.add.at(flow, targets, flow[wave])
+        numpy.subtract.at(upstream_left, targets, 1)
+        targets = numpy.unique(targets)
+        wave = targets[numpy.logical_and(upstream_left[targets] == 0, has_downstream[targets])]
+
+    return flow.reshape(height, width)
+
+
+def priority_flood(elevation, outlets, wrap=True):
+    """
+    Fill the depressions of the map, flooding it from the outlets upwards
+    (the Priority-Flood of Barnes et al.: cells are taken from a priority
+    queue lowest first; cells found below the current water level are part
+    of a depression and are filled up to it, taken from a plain queue).
+    Each cell records the neighbour it was flooded from, following those
+    leads from any cell along a path that never rises above its filled
+    elevation down to an outlet, i.e. out of any depression.
+    :param elevation: 2d array
+    :param outlets: boolean array of the cells the water can leave the map
+                    through (e.g. the ocean). If none is set, the border of
+                    the map is used or, when wrapping, the lowest cell.
+    :param wrap: whether the map wraps around
+    :return: (filled, spill): the filled elevation and, for each cell, the
+             flat index (y * width + x) of the cell it drains to, -1 for outlets
+    """
+    height, width = elevation.shape
+    size = height * width
+    flat_elevation = numpy.asarray(elevation, dtype=float).ravel()
+
+    outlets = numpy.asarray(outlets, dtype=bool)
+    if not outlets.any():
+        outlets = numpy.zeros((height, width), dtype=bool)
+        if wrap:
+            outlets.flat[numpy.argmin(flat_elevation)] = True
+        else:
+            outlets[[0, -1], :] = True
+            outlets[:, [0, -1]] = True
+
+    # the four neighbours of each cell, -1 for those outside the map
+    y, x = numpy.divmod(numpy.arange(size), width)
+    neighbour_table = []
+    for dx, dy in DIR_NEIGHBORS:
+        ny, nx = y + dy, x + dx
+        if wrap:
+            neighbours = (ny % height) * width + nx % width
+        else:
+            neighbours = numpy.where((ny >= 0) & (ny < height) & (nx >= 0) & (nx < width), ny * width + nx, -1)
+        neighbour_table.append(neighbours)
+    table = numpy.stack(neighbour_table, axis=1)
+    neighbour_table = table.tolist()
+
+    values = flat_elevation.tolist()
+    filled = list(values)
+    spill = [-1] * size
+    done = bytearray(size)
+
+    # only the outlets next to other cells need to be flooded from
+    flat_outlets = outlets.ravel()
+    inland = numpy.logical_not(flat_outlets)
+    shore = numpy.logical_and(flat_outlets, numpy.logical_and(table >= 0, inland[table]).any(axis=1))
+    for cell in numpy.flatnonzero(flat_outlets).tolist():
+        done[cell] = 1
+    heap = [(values[cell], cell) for cell in numpy.flatnonzero(shore).tolist()]
+    heapq.heapify(heap)
+    pit = deque()
+
+    while pit or heap:
+        cell = pit.popleft() if pit else heapq.heappop(heap)[1]
+        level = filled[cell]
+        for neighbour in neighbour_table[cell]:
+            if neighbour < 0 or done[neighbour]:
+                continue
+            done[neighbour] = 1
+            spill[neighbour] = cell
+            if values[neighbour] <= level:
+                filled[neighbour] = level
+                pit.append(neighbour)
+            else:
+                heapq.heappush(heap, (values[neighbour], neighbour))
+
+    return numpy.array(filled).reshape(height, width), numpy.array(spill).reshape(height, width)
+
+
+class RiverRaster:
+    """Keeps track of the cells the rivers run through: which river (by its
+    index in the list of rivers) each cell belongs to, the first river to reach
+    it if several do, and where in each river each of its cells first occurs.
+    """
+
+    def __init__(self, width, height):
+        self.ids = numpy.full((height, width), -1, dtype=numpy.int32)
+        self.positions = []
+
+    def add(self, river):
+        river_id = len(self.positions)
+        height, width = self.ids.shape
+        positions = {}
+        for i, (x, y) in enumerate(river):
+            if (x, y) not in positions:
+                positions[(x, y)] = i
+                if 0 <= x < width and 0 <= y < height and self.ids[y, x] < 0:
+                    self.ids[y, x] = river_id
+        self.positions.append(positions)
+
+    def river_at(self, x, y):
+        """The index of the (first) river running through the cell, -1 if there is none"""
+        height, width = self.ids.shape
+        if 0 <= x < width and 0 <= y < height:
+            return int(self.ids[y, x])
+        return -1
+
+    def position(self, river_id, x, y):
+        """Where the cell first occurs in the river, None if it does not"""
+        return self.positions[river_id].get((x, y))
+
+
 class ErosionSimulation:
     def __init__(self):
         self.wrap = True
+        # how river sources are found: "walk" follows the flow from every cell
+        # as it always did, "accumulated" picks them on the accumulated flow
+        self.river_sources_mode = "walk"
+        # how rivers get out of depressions: "search" looks for lower ground
+        # around them and finds a path there with A*, "priority_flood" follows
+        # the spill paths of a priority flood of the whole map
+        self.depression_mode = "search"
+        self._spill = None
+        self._pathfinding = None  # shared by the path searches of an execution
 
     def execute(self, world, seed):
         water_flow = numpy.zeros((world.height, world.width))
         water_path = numpy.zeros((world.height, world.width), dtype=int)
         river_list = []
         lake_list = []
+        river_raster = RiverRaster(world.width, world.height)
         river_map = numpy.zeros((world.height, world.width))
         lake_map = numpy.zeros((world.height, world.width))
 
+        self._pathfinding = PathfindingContext(world)
+
         # step one: water flow per cell based on rainfall
         self.find_water_flow(world, water_path)
+        if self.depression_mode == "priority_flood":
+            _, self._spill = priority_flood(world.layers["elevation"].data, world.layers["ocean"].data, self.wrap)
+        elif self.depression_mode != "search":
+            raise ValueError("Unknown depression mode %s" % self.depression_mode)
 
         # step two: find river sources (seeds)
-        river_sources = self.river_sources(world, water_flow, water_path)
+        river_sources = self.river_sources(world, water_flow, water_path, self.river_sources_mode)
 
         # step three: for each source, find a path to sea
         for source in river_sources:
-            river = self.river_flow(source, world, river_list, lake_list)
+            river = self.river_flow(source, world, river_list, lake_list, river_raster)
             if river:
                 river_list.append(river)
+                river_raster.add(river)
                 self.cleanUpFlow(river, world)
                 rx, ry = river[-1]  # find last cell in river
                 if not world.is_ocean((rx, ry)):
                     lake_list.append(river[-1])  # river flowed into a lake
 
         # step four: simulate erosion and updating river map
-        for river in river_list:
-            self.river_erosion(river, world)
+        for river_id, river in enumerate(river_list):
+            self.river_erosion(river, world, river_raster.positions[river_id])
             self.rivermap_update(river, water_flow, river_map, world.layers["precipitation"].data)
 
         # step five: rivers with no paths to sea form lakes
@@ -71,23 +262,26 @@ class ErosionSimulation:
 
         world.rivermap = river_map
         world.lakemap = lake_map
+        world.invalidate_class_maps()  # the elevation was changed in place
+        self._pathfinding = None
 
     def find_water_flow(self, world, water_path):
         """Find the flow direction for each cell in heightmap"""
 
-        # iterate through each cell
-        for x in range(world.width - 1):
-            for y in range(world.height - 1):
-                # search around cell for a direction
-                path = self.find_quick_path([x, y], world)
-                if path:
-                    tx, ty = path
-                    flow_dir = [tx - x, ty - y]
-                    key = 0
-                    for direction in DIR_NEIGHBORS_CENTER:
-                        if direction == flow_dir:
-                            water_path[y, x] = key
-                        key += 1
+        height, width = water_path.shape
+        directions = flow_directions(world.layers["elevation"].data, self.wrap)
+
+        # The flow is not determined for the last row and column. Flowing across
+        # the north or west border was never recognized as a direction either,
+        # except on a map two cells high where north and south are the same
+        # neighbour; keep it that way so the rivers stay where they were.
+        # (On a map two cells wide west always loses to east anyway.)
+        north = DIR_NEIGHBORS_CENTER.index(NORTH)
+        top_row = directions[0, :]
+        top_row[top_row == north] = DIR_NEIGHBORS_CENTER.index(SOUTH) if height == 2 else 0
+        left_column = directions[:, 0]
+        left_column[left_column == DIR_NEIGHBORS_CENTER.index(WEST)] = 0
+        water_path[:-1, :-1] = directions[:-1, :-1]
 
     def find_quick_path(self, river, world):
         # Water flows based on cost, seeking the highest elevation difference
@@ -122,8 +316,17 @@ class ErosionSimulation:
         return new_path
 
     @staticmethod
-    def river_sources(world, water_flow, water_path):
+    def river_sources(world, water_flow, water_path, mode="walk"):
         """Find places on map where sources of river can be found"""
+        if mode == "walk":
+            return ErosionSimulation._river_sources_by_walking(world, water_flow, water_path)
+        elif mode == "accumulated":
+            return ErosionSimulation._river_sources_on_accumulated_flow(world, water_flow, water_path)
+        else:
+            raise ValueError("Unknown river sources mode %s" % mode)
+
+    @staticmethod
+    def _river_sources_by_walking(world, water_flow, water_path):
         river_source_list = []
 
         # Using the wind and rainfall data, create river 'seeds' by
@@ -137,44 +340,87 @@ class ErosionSimulation:
         #     we mark them as rivers. While looking, the cells with no
         #     out-going flow, above water flow threshold and are still
         #     above sea level are marked as 'sources'.
-        for y in range(0, world.height - 1):
-            for x in range(0, world.width - 1):
-                rain_fall = world.layers["precipitation"].data[y, x]
-                water_flow[y, x] = rain_fall
-
-                if water_path[y, x] == 0:
-                    continue  # ignore cells without flow direction
-                cx, cy = x, y  # begin with starting location
-                neighbour_seed_found = False
-                # follow flow path to where it may lead
-                while not neighbour_seed_found:
-                    # have we found a seed?
-                    if world.is_mountain((cx, cy)) and water_flow[cy, cx] >= RIVER_TH:
-                        # try not to create seeds around other seeds
-                        for seed in river_source_list:
-                            sx, sy = seed
-                            if in_circle(9, cx, cy, sx, sy):
-                                neighbour_seed_found = True
-                        if neighbour_seed_found:
-                            break  # we do not want seeds for neighbors
-
-                        river_source_list.append([cx, cy])  # river seed
-                        break
-
-                    # no path means dead end...
-                    if water_path[cy, cx] == 0:
-                        break  # break out of loop
-
-                    # follow path, add water flow from previous cell
-                    dx, dy = DIR_NEIGHBORS_CENTER[water_path[cy, cx]]
-                    nx, ny = cx + dx, cy + dy  # calculate next cell
-                    water_flow[ny, nx] += rain_fall
-                    cx, cy = nx, ny  # set current cell to next cell
+
+        # Seeds are only placed on mountains and water only flows downhill, so
+        # once a path drops to the mountain level it can never lead to a seed
+        # again. Therefore paths are only followed as long as they stay above
+        # it and paths starting below it are skipped altogether. The water flow
+        # is only tracked above the mountain level (which is the only place it is
+        # read at), the sources found are the same as when following every path
+        # to its end.
+        elevation = world.layers["elevation"].data
+        precipitation = world.layers["precipitation"].data
+        mountain_level = world.get_mountain_level()
+        mountain = numpy.logical_and(elevation > mountain_level, numpy.logical_not(world.layers["ocean"].data))
+        above = elevation > mountain_level
+        above[-1, :] = False
+        above[:, -1] = False
+        seeds = SpatialIndex(RIVER_SOURCES_SPACING)
+        for y, x in numpy.argwhere(above):
+            rain_fall = precipitation[y, x]
+            water_flow[y, x] = rain_fall
+
+            if water_path[y, x] == 0:
+                continue  # ignore cells without flow direction
+            cx, cy = x, y  # begin with starting location
+            # follow flow path to where it may lead
+            while True:
+                # have we found a seed?
+                if mountain[cy, cx] and water_flow[cy, cx] >= RIVER_TH:
+                    # try not to create seeds around other seeds
+                    if not seeds.any_within((cx, cy), RIVER_SOURCES_SPACING):
+                        river_source_list.append([int(cx), int(cy)])  # river seed
+                        seeds.insert((cx, cy))
+                    break
+
+                # no path means dead end...
+                if water_path[cy, cx] == 0:
+                    break  # break out of loop
+
+                # follow path, add water flow from previous cell
+                dx, dy = DIR_NEIGHBORS_CENTER[water_path[cy, cx]]
+                nx, ny = cx + dx, cy + dy  # calculate next cell
+                if elevation[ny, nx] <= mountain_level:
+                    break  # no more mountains downstream
+                water_flow[ny, nx] += rain_fall
+                cx, cy = nx, ny  # set current cell to next cell
         return river_source_list
 
-    def river_flow(self, source, world, river_list, lake_list):
+    @staticmethod
+    def _river_sources_on_accumulated_flow(world, water_flow, water_path):
+        # the flow of each cell includes the rain of all the cells upstream;
+        # mountains carrying enough of it are sources, unless too close to
+        # another source found before in row-major order
+        water_flow[:] = flow_accumulation(water_path, world.layers["precipitation"].data)
+        mountain = numpy.logical_and(
+            world.layers["elevation"].data > world.get_mountain_level(),
+            numpy.logical_not(world.layers["ocean"].data),
+        )
+        river_source_list = []
+        seeds = SpatialIndex(RIVER_SOURCES_SPACING)
+        for cy, cx in numpy.argwhere(numpy.logical_and(mountain, water_flow >= RIVER_TH)):
+            if not seeds.any_within((cx, cy), RIVER_SOURCES_SPACING):
+                river_source_list.append([int(cx), int(cy)])
+                seeds.insert((cx, cy))
+        return river_source_list
+
+    @staticmethod
+    def compare_river_sources(world, water_path):
+        """Find the river sources both ways, for regression checks
+        :return: (sources found walking the flow, sources found on the accumulated flow)
+        """
+        walked = ErosionSimulation.river_sources(world, numpy.zeros(water_path.shape), water_path, "walk")
+        accumulated = ErosionSimulation.river_sources(world, numpy.zeros(water_path.shape), water_path, "accumulated")
+        return walked, accumulated
+
+    def river_flow(self, source, world, river_list, lake_list, river_raster=None):
         """simulate fluid dynamics by using starting point and flowing to the
         lowest available point"""
+        if river_raster is None:
+            river_raster = RiverRaster(world.width, world.height)
+            for river in river_list:
+                river_raster.add(river)
+
         current_location = source
         path = [source]
 
@@ -188,16 +434,13 @@ class ErosionSimulation:
                 if self.wrap:
                     ax, ay = overflow(ax, world.width), overflow(ay, world.height)
 
-                for river in river_list:
-                    if [ax, ay] in river:
-                        merge = False
-                        for rx, ry in river:
-                            if [ax, ay] == [rx, ry]:
-                                merge = True
-                                path.append([rx, ry])
-                            elif merge:
-                                path.append([rx, ry])
-                        return path  # skip the rest, return path
+                river_id = river_raster.river_at(ax, ay)
+                if river_id >= 0:
+                    # join the river from where we meet it
+                    river = river_list[river_id]
+                    for rx, ry in river[river_raster.position(river_id, ax, ay) :]:
+                        path.append([rx, ry])
+                    return path  # skip the rest, return path
 
             # found a sea?
             if world.is_ocean((x, y)):
@@ -211,11 +454,18 @@ class ErosionSimulation:
                 current_location = quick_section
                 continue  # stop here and enter back into loop
 
+            if self.depression_mode == "priority_flood":
+                spill_path = self.find_spill_path(current_location, world)
+                if not spill_path:  # can't find any other path, make it a lake
+                    lake_list.append(current_location)
+                    break
+                path += spill_path
+                current_location = path[-1]
+                continue
+
             is_wrapped, lower_elevation = self.findLowerElevation(current_location, world)
             if lower_elevation and not is_wrapped:
-                lower_path = worldengine.astar.PathFinder().find(
-                    world.layers["elevation"].data, current_location, lower_elevation
-                )
+                lower_path = self.find_path(current_location, lower_elevation, world)
                 if lower_path:
                     path += lower_path
                     current_location = path[-1]
@@ -253,7 +503,7 @@ class ErosionSimulation:
                     raise Exception(f"BUG: fix me... we are not in circle: {current_location} {lower_elevation}")
 
                 # find our way to the edge
-                edge_path = worldengine.astar.PathFinder().find(world.layers["elevation"].data, [cx, cy], [lx, ly])
+                edge_path = self.find_path([cx, cy], [lx, ly], world)
                 if not edge_path:
                     # can't find another other path, make it a lake
                     lake_list.append(current_location)
@@ -263,9 +513,7 @@ class ErosionSimulation:
                 current_location = path[-1]
 
                 # find our way to lowest position original found
-                lower_path = worldengine.astar.PathFinder().find(
-                    world.layers["elevation"].data, current_location, lower_elevation
-                )
+                lower_path = self.find_path(current_location, lower_elevation, world)
                 path += lower_path
                 current_location = path[-1]
 
@@ -289,8 +537,34 @@ class ErosionSimulation:
                 celevation = relevation
             elif relevation > celevation:
                 world.layers["elevation"].data[ry, rx] = celevation
+                if self._pathfinding is not None:
+                    self._pathfinding.set_cost(rx, ry, float(celevation))
         return river
 
+    def find_path(self, source, destination, world):
+        """Find a path over the elevation with A*, [] when there is none."""
+        if self._pathfinding is None:
+            return PathFinder().find(world.layers["elevation"].data, source, destination, ASTAR_MAX_ITERATIONS)
+        return self._pathfinding.find(source, destination, ASTAR_MAX_ITERATIONS)
+
+    def find_spill_path(self, source, world):
+        """Follow the spill path of the priority flood from source (excluded)
+        to the first cell lower than source, or to the outlet it ends in."""
+        if self._spill is None:
+            _, self._spill = priority_flood(world.layers["elevation"].data, world.layers["ocean"].data, self.wrap)
+        elevation = world.layers["elevation"].data
+        x, y = source
+        source_elevation = elevation[y, x]
+        path = []
+        cell = self._spill[y, x]
+        while cell >= 0:
+            y, x = divmod(int(cell), world.width)
+            path.append([x, y])
+            if elevation[y, x] < source_elevation:
+                break
+            cell = self._spill[y, x]
+        return path
+
     def findLowerElevation(self, source, world):
         """Try to find a lower elevation with in a range of an increasing
         circle's radius and try to find the best path and return it"""
@@ -337,12 +611,15 @@ class ErosionSimulation:
         # print "Wrapped lower elevation found:", rx, ry, "!"
         return isWrapped, destination
 
-    def river_erosion(self, river, world):
+    def river_erosion(self, river, world, river_cells=None):
         """Simulate erosion in heightmap based on river path.
         * current location must be equal to or less than previous location
         * riverbed is carved out by % of volume/flow
         * sides of river are also eroded to slope into riverbed.
+        river_cells optionally holds the (x, y) tuples of the cells of the river.
         """
+        if river_cells is None:
+            river_cells = {(rx, ry) for rx, ry in river}
 
         # erosion around river, create river valley
         for r in river:
@@ -356,7 +633,7 @@ class ErosionSimulation:
                     curve = 1.0
                     if [x, y] == [0, 0]:  # ignore center
                         continue
-                    if [x, y] in river:  # ignore river itself
+                    if (x, y) in river_cells:  # ignore river itself
                         continue
                     if world.layers["elevation"].data[y, x] <= world.layers["elevation"].data[ry, rx]:
                         # ignore areas lower than river itself
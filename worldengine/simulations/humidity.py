@@ -1,4 +1,4 @@
-from worldengine.simulations.basic import find_threshold_f
+from worldengine.simulations.basic import find_thresholds
 
 
 class HumiditySimulation:
@@ -25,12 +25,7 @@ class HumiditySimulation:
         # These were originally evenly spaced at 12.5% each but changing them
         # to a bell curve produced better results
         ocean = world.layers["ocean"].data
-        quantiles = {}
-        quantiles["12"] = find_threshold_f(data, humids[6], ocean)
-        quantiles["25"] = find_threshold_f(data, humids[5], ocean)
-        quantiles["37"] = find_threshold_f(data, humids[4], ocean)
-        quantiles["50"] = find_threshold_f(data, humids[3], ocean)
-        quantiles["62"] = find_threshold_f(data, humids[2], ocean)
-        quantiles["75"] = find_threshold_f(data, humids[1], ocean)
-        quantiles["87"] = find_threshold_f(data, humids[0], ocean)
+        percentages = [humids[6], humids[5], humids[4], humids[3], humids[2], humids[1], humids[0]]
+        thresholds = find_thresholds(data, percentages, ocean)
+        quantiles = dict(zip(["12", "25", "37", "50", "62", "75", "87"], thresholds))
         return data, quantiles
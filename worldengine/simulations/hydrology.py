@@ -1,33 +1,92 @@
 import numpy
 
-from worldengine.simulations.basic import find_threshold_f
+from worldengine.common import neighbour_table
+from worldengine.simulations.basic import find_thresholds
+
+
+def downhill_weights(elevation, ocean, table=None):
+    """
+    The shares of the water of each cell that flow on to its lower
+    neighbours, split the way the watermap droplets split it: in proportion
+    to int(pos_elev - e) << 2, and at least 1 for a neighbour that is lower
+    than the ones before it. Returns the shares as a compressed sparse row
+    matrix (offsets, targets, weights), leaving out those lost to the ocean,
+    and a mask of the cells without lower neighbours, where the water stays.
+    The neighbours are those of table, by default the 8-neighbour table of
+    the map.
+    """
+    height, width = elevation.shape
+    offsets, indices = table if table is not None else neighbour_table(width, height)
+    counts = numpy.diff(offsets)
+    flat = elevation.ravel()
+
+    # one row of eight slots per cell, the missing neighbours are never lower
+    rows = numpy.repeat(numpy.arange(width * height), counts)
+    slots = numpy.arange(indices.size) - numpy.repeat(offsets[:-1], counts)
+    e = numpy.full((width * height, 8), numpy.inf)
+    e[rows, slots] = flat[indices]
+    neighbours = numpy.full((width * height, 8), -1, dtype=numpy.int32)
+    neighbours[rows, slots] = indices
+
+    pos_elev = flat[:, numpy.newaxis]
+    lower = e < pos_elev
+    dq = numpy.where(lower, pos_elev - e, 0.0).astype(int) << 2
+    running_min = numpy.minimum.accumulate(numpy.where(lower, e, numpy.inf), axis=1)
+    previous_min = numpy.concatenate((numpy.full((width * height, 1), numpy.inf), running_min[:, :-1]), axis=1)
+    dq[lower & (e < previous_min) & (dq == 0)] = 1
+    tot_lowers = dq.sum(axis=1)
+    sinks = tot_lowers == 0
+
+    keep = lower & ~ocean.ravel()[numpy.maximum(neighbours, 0)]
+    weights = dq / numpy.maximum(tot_lowers, 1)[:, numpy.newaxis]
+    offsets = numpy.zeros(width * height + 1, dtype=numpy.int32)
+    numpy.cumsum(keep.sum(axis=1), out=offsets[1:])
+    return (offsets, neighbours[keep], weights[keep]), sinks.reshape(elevation.shape)
 
 
 class WatermapSimulation:
+    def __init__(self):
+        # "droplets" follows the droplets one by one as it always did, "waves"
+        # moves all of them at once, splitting the water over the bare
+        # elevation (the water a droplet meets on its way does not divert it),
+        # "flow" computes the water the droplets bring on average
+        self.mode = "droplets"
+        self.samples = 20000  # the number of droplets
+
     @staticmethod
     def is_applicable(world):
         return world.has_precipitations() and (not world.has_watermap())
 
     def execute(self, world, seed):
         assert seed is not None
-        data, thresholds = self._watermap(world, 20000)
+        if self.mode == "droplets":
+            data, thresholds = self._watermap(world, self.samples)
+        elif self.mode == "waves":
+            data, thresholds = self._watermap_waves(world, self.samples)
+        elif self.mode == "flow":
+            data, thresholds = self._watermap_flow(world, self.samples)
+        else:
+            raise ValueError("Unknown watermap mode %s" % self.mode)
         world.watermap = (data, thresholds)
 
     @staticmethod
     def _watermap(world, n):
-        def droplet(world, pos, q, _watermap):
-            if q < 0:
-                return
-            x, y = pos
-            pos_elev = world.layers["elevation"].data[y, x] + _watermap[y, x]
+        watermap = numpy.zeros(world.width * world.height)
+        neighbours = {}  # the rows of the neighbour table visited so far, as lists
+
+        def spread(i, q):
+            """Split the quantity q of water at cell i over its lower
+            neighbours, proportionally to how much lower they are. Returns the
+            land cells and the quantities they get, on a local minimum the
+            water stays where it is."""
+            if i not in neighbours:
+                neighbours[i] = indices[offsets[i] : offsets[i + 1]].tolist()
+            pos_elev = elevation[i] + watermap[i]
             lowers = []
-            min_higher = None
             min_lower = None
-            # pos_min_higher = None  # TODO: no longer used?
             tot_lowers = 0
-            for p in world.tiles_around((x, y)):  # TODO: switch to numpy
-                px, py = p
-                e = world.layers["elevation"].data[py, px] + _watermap[py, px]
+            for p in neighbours[i]:
+                e = elevation[p] + watermap[p]
                 if e < pos_elev:
                     dq = int(pos_elev - e) << 2
                     if min_lower is None or e < min_lower:
@@ -36,27 +95,24 @@ class WatermapSimulation:
                             dq = 1
                     lowers.append((dq, p))
                     tot_lowers += dq
-
-                else:
-                    if min_higher is None or e > min_higher:
-                        min_higher = e
-                        # pos_min_higher = p
             if lowers:
                 f = q / tot_lowers
-                for lower in lowers:
-                    s, p = lower
-                    if not world.is_ocean(p):
-                        px, py = p
-                        ql = f * s
-                        # ql = q
-                        going = ql > 0.05
-                        _watermap[py, px] += ql
-                        if going:
-                            droplet(world, p, ql, _watermap)
-            else:
-                _watermap[y, x] += q
-
-        _watermap_data = numpy.zeros((world.height, world.width), dtype=float)
+                return [(p, f * s) for s, p in lowers if not ocean[p]]
+            watermap[i] += q
+            return ()
+
+        def droplet(i, q):
+            # Depth first, as a recursion would go: a quantity that is still
+            # going is spread further before the next neighbour gets its share.
+            stack = [iter(spread(i, q))]
+            while stack:
+                for p, ql in stack[-1]:
+                    watermap[p] += ql
+                    if ql > 0.05:
+                        stack.append(iter(spread(p, ql)))
+                        break
+                else:
+                    stack.pop()
 
         # This indirectly calls the global rng.
         # We want different implementations of _watermap
@@ -67,14 +123,113 @@ class WatermapSimulation:
         land_sample = world.random_land(n)
 
         if land_sample[0] is not None:
+            elevation = world.layers["elevation"].data.ravel()
+            ocean = world.layers["ocean"].data.ravel()
+            offsets, indices = world.neighbour_table()
             for i in range(n):
                 x, y = land_sample[2 * i], land_sample[2 * i + 1]
                 if world.precipitations_at((x, y)) > 0:
-                    droplet(world, (x, y), world.precipitations_at((x, y)), _watermap_data)
+                    droplet(int(y * world.width + x), world.precipitations_at((x, y)))
+
+        _watermap_data = watermap.reshape((world.height, world.width))
+        return _watermap_data, WatermapSimulation._thresholds(world, _watermap_data)
+
+    @staticmethod
+    def _watermap_waves(world, n):
+        """The same droplets as _watermap, moved downhill all at once: each
+        wave splits every quantity that is still going over the lower
+        neighbours of its cell."""
+        size = world.width * world.height
+        watermap = numpy.zeros(size)
+
+        land_sample = world.random_land(n)  # the same samples, from the global rng
+        if land_sample[0] is not None:
+            (offsets, targets, weights), sinks = downhill_weights(
+                world.layers["elevation"].data, world.layers["ocean"].data, world.neighbour_table()
+            )
+            sinks = sinks.ravel()
+            counts = numpy.diff(offsets)
+
+            cells = land_sample[1::2] * world.width + land_sample[0::2]
+            q = world.layers["precipitation"].data.ravel()[cells]
+            cells = cells[q > 0]
+            q = q[q > 0]
+            while cells.size:
+                # on a local minimum the water stays where it is
+                stays = sinks[cells]
+                watermap += numpy.bincount(cells[stays], q[stays], minlength=size)
+                cells = cells[~stays]
+                q = q[~stays]
+
+                # every quantity gets a row of the matrix
+                shares = counts[cells]
+                droplet = numpy.repeat(numpy.arange(cells.size), shares)
+                first = numpy.repeat(numpy.cumsum(shares) - shares, shares)
+                entries = offsets[cells][droplet] + numpy.arange(droplet.size) - first
+                cells = targets[entries]
+                q = q[droplet] * weights[entries]
+                watermap += numpy.bincount(cells, q, minlength=size)
+
+                going = q > 0.05
+                cells = cells[going]
+                q = q[going]
 
+        _watermap_data = watermap.reshape((world.height, world.width))
+        return _watermap_data, WatermapSimulation._thresholds(world, _watermap_data)
+
+    @staticmethod
+    def _watermap_flow(world, n):
+        """The water n droplets bring on average, without sampling: a
+        multiple flow direction accumulation over the downhill weights of the
+        droplets, without the cut-off of small quantities. Every land cell
+        gets its share n / (land cells) of the rain and the cells are handled
+        from the top down, each one once all the cells above it are done."""
+        size = world.width * world.height
+        watermap = numpy.zeros(size)
+
+        # drawn and not used, so the global rng is left as the other modes leave it
+        land_sample = world.random_land(n)
+        if land_sample[0] is not None:
+            land = ~world.layers["ocean"].data.ravel()
+            (offsets, targets, weights), sinks = downhill_weights(
+                world.layers["elevation"].data, world.layers["ocean"].data, world.neighbour_table()
+            )
+            sinks = sinks.ravel()
+            counts = numpy.diff(offsets)
+
+            precipitation = world.layers["precipitation"].data.ravel()
+            rain = numpy.where(land & (precipitation > 0), precipitation, 0.0) * (n / numpy.count_nonzero(land))
+            received = numpy.zeros(size)
+
+            # the land cells above each cell that are not done yet
+            sources = numpy.repeat(numpy.arange(size), counts)
+            above = numpy.bincount(targets[land[sources]], minlength=size)
+            cells = numpy.flatnonzero(land & (above == 0))
+            while cells.size:
+                q = rain[cells] + received[cells]
+                shares = counts[cells]
+                cell = numpy.repeat(numpy.arange(cells.size), shares)
+                first = numpy.repeat(numpy.cumsum(shares) - shares, shares)
+                entries = offsets[cells][cell] + numpy.arange(cell.size) - first
+                lower = targets[entries]
+                numpy.add.at(received, lower, q[cell] * weights[entries])
+                numpy.subtract.at(above, lower, 1)
+                lower = numpy.unique(lower)
+                cells = lower[above[lower] == 0]
+
+            # as a droplet does, the water that stays is counted once more
+            watermap = received + numpy.where(sinks & land, rain + received, 0.0)
+
+        _watermap_data = watermap.reshape((world.height, world.width))
+        # without the cut-off the main rivers can carry much more water
+        return _watermap_data, WatermapSimulation._thresholds(world, _watermap_data, max(1000.0, watermap.max()))
+
+    @staticmethod
+    def _thresholds(world, _watermap_data, max_value=1000.0):
         ocean = world.layers["ocean"].data
+        creek, river, main_river = find_thresholds(_watermap_data, [0.05, 0.02, 0.007], ocean, max=max_value)
         thresholds = dict()
-        thresholds["creek"] = find_threshold_f(_watermap_data, 0.05, ocean=ocean)
-        thresholds["river"] = find_threshold_f(_watermap_data, 0.02, ocean=ocean)
-        thresholds["main river"] = find_threshold_f(_watermap_data, 0.007, ocean=ocean)
-        return _watermap_data, thresholds
+        thresholds["creek"] = creek
+        thresholds["river"] = river
+        thresholds["main river"] = main_river
+        return thresholds
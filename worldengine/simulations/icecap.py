@@ -14,19 +14,23 @@ class IcecapSimulation:
     def is_applicable(world):
         return world.has_ocean() and world.has_temperature()
 
+    def __init__(self):
+        # "wavefront" decides whole diagonals of cells at once, "sequential"
+        # goes over the cells one by one; both give the same ice for a seed
+        self.mode = "wavefront"
+
     def execute(self, world, seed):
-        world.icecap = self._calculate(world, seed)
+        if self.mode == "wavefront":
+            world.icecap = self._calculate_wavefront(world, seed)
+        elif self.mode == "sequential":
+            world.icecap = self._calculate(world, seed)
+        else:
+            raise ValueError("Unknown icecap mode %s" % self.mode)
 
     @staticmethod
-    def _calculate(world, seed):
-        # Notes on performance:
-        #  -method is run once per generation
-        #  -iterations        : width * height
-        #  -memory consumption: width * height * sizeof(numpy.float) (permanent)
-        #                       width * height * sizeof(numpy.bool) (temporary)
-
-        # constants for convenience (or performance)
-        ocean = world.layers["ocean"].data
+    def _constants(world):
+        """The coldest temperature, the temperature above it up to which
+        ocean can freeze and the one up to which it surely freezes."""
         temperature = world.layers["temperature"].data
 
         # primary constants (could be used as global variables at some point);
@@ -38,9 +42,6 @@ class IcecapSimulation:
         # the warmest x% of freezable area won't completely freeze (RNG decides)
         freeze_chance_window = 0.20
 
-        # chance-modifier to freeze a slightly warm tile when neighbors are frozen
-        surrounding_tile_influence = 0.5
-
         # secondary constants
         temp_min = temperature.min()  # coldest spot in the world
 
@@ -56,6 +57,26 @@ class IcecapSimulation:
         # calculate freeze threshold above min
         freeze_threshold = (freeze_threshold - temp_min) * max_freeze_percentage
         freeze_chance_threshold = freeze_threshold * (1.0 - freeze_chance_window)
+        return temp_min, freeze_threshold, freeze_chance_threshold
+
+    @staticmethod
+    def _calculate(world, seed):
+        # Notes on performance:
+        #  -method is run once per generation
+        #  -iterations        : width * height
+        #  -memory consumption: width * height * sizeof(numpy.float) (permanent)
+        #                       width * height * sizeof(numpy.bool) (temporary)
+
+        # constants for convenience (or performance)
+        ocean = world.layers["ocean"].data
+        temperature = world.layers["temperature"].data
+
+        # chance-modifier to freeze a slightly warm tile when neighbors are frozen
+        surrounding_tile_influence = 0.5
+
+        # upper temperature-limit for freezing effects above the coldest spot
+        # in the world, and the limit up to which ocean will surely freeze
+        temp_min, freeze_threshold, freeze_chance_threshold = IcecapSimulation._constants(world)
 
         # local variables
         icecap = numpy.zeros((world.height, world.width), dtype=float)
@@ -91,3 +112,73 @@ class IcecapSimulation:
                             icecap[y, x] = freeze_threshold - (t - temp_min)  # thickness of the ice (arbitrary scale)
 
         return icecap
+
+    @staticmethod
+    def _calculate_wavefront(world, seed):
+        # The same ice as _calculate, without going over the cells one by one.
+        # A cell that may freeze draws its random number in raster order, so
+        # all draws can be taken at once. Its chance depends on the 8 cells
+        # around it: the ones after it in raster order (E, SW, S, SE) are
+        # counted as they were at the start, the ones before it (W, NW, N, NE)
+        # as they ended up. The cells on a diagonal x + 2 * y = k depend only
+        # on diagonals before k, so they are decided together, diagonal after
+        # diagonal. Only the cells that may turn solid by freezing matter to
+        # others, all the rest are decided at the end in one pass.
+        #  -iterations        : width + 2 * height (diagonals)
+        #  -memory consumption: a few width * height arrays (temporary)
+
+        ocean = world.layers["ocean"].data
+        temperature = world.layers["temperature"].data
+        height, width = temperature.shape
+        surrounding_tile_influence = 0.5
+        temp_min, freeze_threshold, freeze_chance_threshold = IcecapSimulation._constants(world)
+
+        icecap = numpy.zeros((height, width), dtype=float)
+        rng = numpy.random.RandomState(seed)  # create our own random generator
+
+        solid_map = numpy.logical_or(temperature <= freeze_chance_threshold + temp_min, numpy.logical_not(ocean))
+        candidates = ocean & (temperature - temp_min < freeze_threshold)
+        if not candidates.any():
+            return icecap
+        draws = numpy.zeros((height, width))
+        draws[candidates] = rng.rand(numpy.count_nonzero(candidates))
+        chance = numpy.interp(temperature, [temp_min, freeze_chance_threshold, freeze_threshold], [1.0, 1.0, 0.0])
+
+        # the borders only count the temperature
+        interior = numpy.zeros((height, width), dtype=bool)
+        interior[1:-1, 1:-1] = True
+
+        # the solid cells after each one, as they were at the start
+        padded = numpy.pad(solid_map, 1).astype(numpy.int8)
+        later = (padded[1:-1, 2:].astype(numpy.int64) + padded[2:, :-2] + padded[2:, 1:-1] + padded[2:, 2:]).ravel()
+
+        flat_chance = chance.ravel()
+        flat_draws = draws.ravel()
+        final = solid_map.ravel().astype(numpy.int8)
+
+        def freezes(cells):
+            earlier = final[cells - 1] + final[cells - width - 1] + final[cells - width] + final[cells - width + 1]
+            chance_mod = numpy.interp(earlier + later[cells], [0, 8], [-1.0, 1.0])
+            return flat_draws[cells] <= flat_chance[cells] + chance_mod * surrounding_tile_influence
+
+        # the cells on the borders do not wait for anything
+        border = numpy.flatnonzero(candidates & ~interior)
+        frozen = numpy.zeros(height * width, dtype=bool)
+        frozen[border] = flat_draws[border] <= flat_chance[border]
+        final |= frozen
+
+        # the cells that may turn solid, diagonal after diagonal
+        cells = numpy.flatnonzero(candidates & interior & ~solid_map)
+        diagonals = cells % width + 2 * (cells // width)
+        order = numpy.argsort(diagonals, kind="stable")
+        cells = cells[order]
+        for wave in numpy.split(cells, numpy.flatnonzero(numpy.diff(diagonals[order])) + 1):
+            final[wave] = freezes(wave)
+
+        # and the others, now that everything around them is known
+        cells = numpy.flatnonzero(candidates & interior)
+        frozen[cells] = freezes(cells)
+
+        frozen = frozen.reshape((height, width))
+        icecap[frozen] = freeze_threshold - (temperature[frozen] - temp_min)  # thickness of the ice (arbitrary scale)
+        return icecap
@@ -1,7 +1,7 @@
 import numpy
-from noise import snoise2
 
-from worldengine.simulations.basic import find_threshold_f
+from worldengine.noise_field import snoise2_field
+from worldengine.simulations.basic import find_thresholds
 
 
 class PermeabilitySimulation:
@@ -12,11 +12,8 @@ class PermeabilitySimulation:
     def execute(self, world, seed):
         perm = self._calculate(seed, world.width, world.height)
         ocean = world.layers["ocean"].data
-        perm_th = [
-            ("low", find_threshold_f(perm, 0.75, ocean)),
-            ("med", find_threshold_f(perm, 0.25, ocean)),
-            ("hig", None),
-        ]
+        low, med = find_thresholds(perm, [0.75, 0.25], ocean)
+        perm_th = [("low", low), ("med", med), ("hig", None)]
         world.permeability = (perm, perm_th)
 
     @staticmethod
@@ -24,15 +21,11 @@ class PermeabilitySimulation:
         rng = numpy.random.RandomState(seed)  # create our own random generator
         base = rng.randint(0, 4096)
 
-        perm = numpy.zeros((height, width), dtype=float)
-
         octaves = 6
         freq = 64.0 * octaves
 
-        for y in range(0, height):  # TODO: numpy optimization?
-            # yscaled = float(y) / height  # TODO: what is this?
-            for x in range(0, width):
-                n = snoise2(x / freq, y / freq, octaves, base=base)
-                perm[y, x] = n
+        xs = numpy.arange(width) / freq
+        ys = numpy.arange(height) / freq
+        perm = snoise2_field(xs, ys, octaves, base=base)
 
         return perm
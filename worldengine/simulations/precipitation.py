@@ -1,10 +1,10 @@
 import time
 
 import numpy
-from noise import snoise2
 
 from worldengine.common import get_verbose
-from worldengine.simulations.basic import find_threshold_f
+from worldengine.noise_field import seamless_snoise2_field
+from worldengine.simulations.basic import find_thresholds
 
 
 class PrecipitationSimulation:
@@ -17,11 +17,8 @@ class PrecipitationSimulation:
             start_time = time.time()
         pre_calculated = self._calculate(seed, world)
         ocean = world.layers["ocean"].data
-        ths = [
-            ("low", find_threshold_f(pre_calculated, 0.75, ocean)),
-            ("med", find_threshold_f(pre_calculated, 0.3, ocean)),
-            ("hig", None),
-        ]
+        low, med = find_thresholds(pre_calculated, [0.75, 0.3], ocean)
+        ths = [("low", low), ("med", med), ("hig", None)]
         world.precipitation = (pre_calculated, ths)
         if get_verbose():
             elapsed_time = time.time() - start_time
@@ -38,7 +35,6 @@ class PrecipitationSimulation:
         height = world.height
         width = world.width
         border = width / 4
-        precipitations = numpy.zeros((height, width), dtype=float)
 
         octaves = 6
         freq = 64.0 * octaves
@@ -47,19 +43,10 @@ class PrecipitationSimulation:
         # so that worlds sharing a common seed but
         # different sizes will have similar patterns
 
-        for y in range(height):  # TODO: numpy
-            for x in range(width):
-                n = snoise2((x * n_scale) / freq, (y * n_scale) / freq, octaves, base=base)
-
-                # Added to allow noise pattern to wrap around right and left.
-                if x < border:
-                    n = (snoise2((x * n_scale) / freq, (y * n_scale) / freq, octaves, base=base) * x / border) + (
-                        snoise2(((x * n_scale) + width) / freq, (y * n_scale) / freq, octaves, base=base)
-                        * (border - x)
-                        / border
-                    )
-
-                precipitations[y, x] = n
+        # the noise pattern wraps around right and left
+        precipitations = seamless_snoise2_field(
+            width, height, octaves, n_scale=n_scale, freq=freq, base=base, border=border
+        )
 
         # find ranges
         min_precip = precipitations.min()
@@ -1,7 +1,7 @@
 import numpy
-from noise import snoise2  # http://nullege.com/codes/search/noise.snoise2
 
-from worldengine.simulations.basic import find_threshold_f
+from worldengine.noise_field import seamless_snoise2_field
+from worldengine.simulations.basic import find_thresholds
 
 
 class TemperatureSimulation:
@@ -15,13 +15,14 @@ class TemperatureSimulation:
         ocean = world.layers["ocean"].data
 
         t = self._calculate(world, seed, e, ml)
+        polar, alpine, boreal, cool, warm, subtropical = find_thresholds(t, world.temps[:6], ocean)
         t_th = [
-            ("polar", find_threshold_f(t, world.temps[0], ocean)),
-            ("alpine", find_threshold_f(t, world.temps[1], ocean)),
-            ("boreal", find_threshold_f(t, world.temps[2], ocean)),
-            ("cool", find_threshold_f(t, world.temps[3], ocean)),
-            ("warm", find_threshold_f(t, world.temps[4], ocean)),
-            ("subtropical", find_threshold_f(t, world.temps[5], ocean)),
+            ("polar", polar),
+            ("alpine", alpine),
+            ("boreal", boreal),
+            ("cool", cool),
+            ("warm", warm),
+            ("subtropical", subtropical),
             ("tropical", None),
         ]
         world.temperature = (t, t_th)
@@ -33,7 +34,6 @@ class TemperatureSimulation:
 
         rng = numpy.random.RandomState(seed)  # create our own random generator
         base = rng.randint(0, 4096)
-        temp = numpy.zeros((height, width), dtype=float)
 
         """
         Set up variables to take care of some orbital parameters:
@@ -71,32 +71,26 @@ class TemperatureSimulation:
         freq = 16.0 * octaves
         n_scale = 1024 / float(height)
 
-        for y in range(0, height):  # TODO: Check for possible numpy optimizations.
-            y_scaled = float(y) / height - 0.5  # -0.5...0.5
-
-            # map/linearly interpolate y_scaled to latitude measured from where the most sunlight hits the world:
-            # 1.0 = hottest zone, 0.0 = coldest zone
-            latitude_factor = numpy.interp(
-                y_scaled, [axial_tilt - 0.5, axial_tilt, axial_tilt + 0.5], [0.0, 1.0, 0.0], left=0.0, right=0.0
-            )
-            for x in range(0, width):
-                n = snoise2((x * n_scale) / freq, (y * n_scale) / freq, octaves, base=base)
-
-                # Added to allow noise pattern to wrap around right and left.
-                if x <= border:
-                    n = (snoise2((x * n_scale) / freq, (y * n_scale) / freq, octaves, base=base) * x / border) + (
-                        snoise2(((x * n_scale) + width) / freq, (y * n_scale) / freq, octaves, base=base)
-                        * (border - x)
-                        / border
-                    )
-
-                t = (latitude_factor * 12 + n * 1) / 13.0 / distance_to_sun
-                if elevation[y, x] > mountain_level:  # vary temperature based on height
-                    if elevation[y, x] > (mountain_level + 29):
-                        altitude_factor = 0.033
-                    else:
-                        altitude_factor = 1.00 - (float(elevation[y, x] - mountain_level) / 30)
-                    t *= altitude_factor
-                temp[y, x] = t
+        # the noise pattern wraps around right and left
+        n = seamless_snoise2_field(
+            width, height, octaves, n_scale=n_scale, freq=freq, base=base, border=border, inclusive=True
+        )
+
+        y_scaled = numpy.arange(height) / height - 0.5  # -0.5...0.5
+
+        # map/linearly interpolate y_scaled to latitude measured from where the most sunlight hits the world:
+        # 1.0 = hottest zone, 0.0 = coldest zone
+        latitude_factor = numpy.interp(
+            y_scaled, [axial_tilt - 0.5, axial_tilt, axial_tilt + 0.5], [0.0, 1.0, 0.0], left=0.0, right=0.0
+        )[:, numpy.newaxis]
+
+        temp = (latitude_factor * 12 + n * 1) / 13.0 / distance_to_sun
+
+        # vary temperature based on height
+        mountains = elevation > mountain_level
+        altitude_factor = numpy.where(
+            elevation > (mountain_level + 29), 0.033, 1.00 - (elevation - mountain_level) / 30
+        )
+        temp[mountains] *= altitude_factor[mountains]
 
         return temp